@@ -0,0 +1,310 @@
+# vim: set fileencoding=utf-8 :
+"""Benchmark throughput, latency, size and accuracy of the sketches.
+
+Every benchmark feeds a Zipfian and a uniform key stream into a sketch,
+times every single operation and compares the sketch's answers with the
+exact ones. The results are written as JSON, so runs of different releases
+can be compared with `compare.py`:
+
+    $ python benchmarks/bench.py --output before.json
+    $ python benchmarks/bench.py --output after.json
+    $ python benchmarks/compare.py before.json after.json
+
+The Redis backends are only benchmarked if a server is given with
+`--redis HOST:PORT`, e.g. a throw-away local `redis-server --save ''`. The
+benchmark only touches keys starting with `--redis-prefix`.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import argparse
+from collections import Counter
+import datetime
+import heapq
+import json
+import os
+import platform
+import sys
+from timeit import default_timer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+
+from streamingds import __version__  # noqa
+from streamingds.bloomfilter import BloomFilter  # noqa
+from streamingds.countminsketch import CountMinSketch  # noqa
+from streamingds.cuckoofilter import CuckooFilter  # noqa
+from streamingds.hyperloglog import HyperLogLog  # noqa
+
+from streams import STREAMS  # noqa
+
+
+BLOOMFILTER_PARAMS = [
+    {'capacity': 10000, 'error_rate': 0.01},
+    {'capacity': 10000, 'error_rate': 0.001},
+    {'capacity': 100000, 'error_rate': 0.01},
+]
+
+CUCKOOFILTER_PARAMS = BLOOMFILTER_PARAMS
+
+COUNTMINSKETCH_PARAMS = [
+    {'delta': 10 ** -3, 'epsilon': 0.01, 'k': 50},
+    {'delta': 10 ** -7, 'epsilon': 0.005, 'k': 50},
+    {'delta': 10 ** -7, 'epsilon': 0.005, 'k': 50, 'counter_type': 'uint8'},
+    {'delta': 10 ** -7, 'epsilon': 0.005, 'k': 50, 'counter_type': 'morris'},
+]
+
+HYPERLOGLOG_PARAMS = [
+    {'p': 10},
+    {'p': 12},
+    {'p': 14},
+]
+
+
+def timed(operation, arguments):
+    """Call `operation` with every argument and return its timings."""
+    timer = default_timer
+    latencies = []
+    append = latencies.append
+    for argument in arguments:
+        start = timer()
+        operation(argument)
+        append(timer() - start)
+    return summarize(latencies)
+
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    total = sum(latencies)
+    n = len(latencies)
+
+    def percentile(q):
+        return latencies[min(n - 1, int(n * q))] * 1e6
+
+    return {
+        'ops': n,
+        'seconds': total,
+        'ops_per_sec': n / total if total else None,
+        'p50_us': percentile(0.5),
+        'p99_us': percentile(0.99),
+    }
+
+
+def sketch_size(sketch):
+    """Return the memory used by the sketch in bytes."""
+    return sketch.memory_usage()
+
+
+def redis_size(redis, prefix):
+    """Return the memory used by all redis keys starting with `prefix`."""
+    return sum(redis.execute_command('MEMORY', 'USAGE', key) or 0
+               for key in redis.scan_iter(match=prefix + '*'))
+
+
+def bench_bloomfilter(bf, keys, size):
+    distinct = list(set(keys))
+    absent = ['absent-%d' % i for i in range(len(distinct))]
+    operations = {
+        'add': timed(bf.add, keys),
+        'contains_hit': timed(bf.__contains__, distinct),
+        'contains_miss': timed(bf.__contains__, absent),
+    }
+    false_positives = sum(1 for key in absent if key in bf)
+    false_negatives = sum(1 for key in distinct if key not in bf)
+    size = size(bf)
+    return {
+        'operations': operations,
+        'bytes': size,
+        'bytes_per_element': size / len(distinct),
+        'accuracy': {
+            'false_positive_rate': false_positives / len(absent),
+            'false_negatives': false_negatives,
+            'estimated_elements': len(bf),
+            'distinct_elements': len(distinct),
+        },
+    }
+
+
+def bench_cuckoofilter(cf, keys, size):
+    """Like `bench_bloomfilter`, but every key is added only once. A cuckoo
+    filter stores a fingerprint per `add`, so the repetitions of a hot key
+    would fill both of its buckets."""
+    seen = set()
+    unique = [key for key in keys if not (key in seen or seen.add(key))]
+    return bench_bloomfilter(cf, unique, size)
+
+
+def bench_countminsketch(cms, keys, size):
+    counts = Counter(keys)
+    distinct = list(counts)
+    operations = {
+        'update': timed(cms.update, keys),
+        'get': timed(cms.get, distinct),
+    }
+    errors = [cms.get(key) - count for key, count in counts.items()]
+    bound = cms._epsilon * len(keys)
+
+    true_top = set(key for _, key in heapq.nlargest(
+        cms.k, ((count, key) for key, count in counts.items())))
+    ranked = set(key for _, ranked_keys in cms.get_ranking().values()
+                 for key in ranked_keys)
+    size = size(cms)
+    return {
+        'operations': operations,
+        'bytes': size,
+        'bytes_per_element': size / len(distinct),
+        'accuracy': {
+            'mean_error': sum(errors) / len(errors),
+            'max_error': max(errors),
+            'within_bound': sum(1 for e in errors if e <= bound) / len(errors),
+            'error_bound': bound,
+            'topk_recall': len(true_top & ranked) / len(true_top),
+            'negative_errors': sum(1 for e in errors if e < 0),
+        },
+    }
+
+
+def bench_hyperloglog(hll, keys, size):
+    distinct = len(set(keys))
+    operations = {
+        'add': timed(hll.add, keys),
+        'cardinality': timed(lambda _: hll.cardinality(), range(100)),
+    }
+    estimate = hll.cardinality()
+    size = size(hll)
+    return {
+        'operations': operations,
+        'bytes': size,
+        'bytes_per_element': size / distinct,
+        'accuracy': {
+            'estimate': estimate,
+            'distinct_elements': distinct,
+            'relative_error': (estimate - distinct) / distinct,
+            'expected_error': hll.error_rate,
+        },
+    }
+
+
+def memory_benchmarks(n, stream_names, seed):
+    for stream in stream_names:
+        for params in BLOOMFILTER_PARAMS:
+            keys = STREAMS[stream](n, params['capacity'], seed=seed)
+            yield ('BloomFilter', 'memory', stream, params,
+                   lambda p=params, k=keys: bench_bloomfilter(
+                       BloomFilter(**p), k, sketch_size))
+
+        for params in CUCKOOFILTER_PARAMS:
+            keys = STREAMS[stream](n, params['capacity'], seed=seed)
+            yield ('CuckooFilter', 'memory', stream, params,
+                   lambda p=params, k=keys: bench_cuckoofilter(
+                       CuckooFilter(**p), k, sketch_size))
+
+        for params in COUNTMINSKETCH_PARAMS:
+            keys = STREAMS[stream](n, n // 10, seed=seed)
+            yield ('CountMinSketch', 'memory', stream, params,
+                   lambda p=params, k=keys: bench_countminsketch(
+                       CountMinSketch(**p), k, sketch_size))
+
+        for params in HYPERLOGLOG_PARAMS:
+            keys = STREAMS[stream](n, n, seed=seed)
+            yield ('HyperLogLog', 'memory', stream, params,
+                   lambda p=params, k=keys: bench_hyperloglog(
+                       HyperLogLog(**p), k, sketch_size))
+
+
+def redis_benchmarks(n, stream_names, seed, host, port, prefix):
+    from redis import StrictRedis
+    from streamingds.redis.bloomfilter import RedisBloomFilter
+    from streamingds.redis.countminsketch import RedisCountMinSketch
+
+    redis = StrictRedis(host, port)
+    connection = {'redis_host': host, 'redis_port': port}
+
+    def run(name, factory, bench, keys):
+        key_prefix = '%s:%s' % (prefix, name)
+        for key in redis.scan_iter(match=key_prefix + '*'):
+            redis.delete(key)
+        try:
+            return bench(factory(redis_prefix=key_prefix, **connection), keys,
+                         lambda _: redis_size(redis, key_prefix))
+        finally:
+            for key in redis.scan_iter(match=key_prefix + '*'):
+                redis.delete(key)
+
+    for stream in stream_names:
+        params = BLOOMFILTER_PARAMS[0]
+        keys = STREAMS[stream](n, params['capacity'], seed=seed)
+        yield ('BloomFilter', 'redis', stream, params,
+               lambda p=params, k=keys: run(
+                   'bloomfilter',
+                   lambda **kw: RedisBloomFilter(**dict(p, **kw)),
+                   bench_bloomfilter, k))
+
+        params = COUNTMINSKETCH_PARAMS[0]
+        keys = STREAMS[stream](n, n // 10, seed=seed)
+        yield ('CountMinSketch', 'redis', stream, params,
+               lambda p=params, k=keys: run(
+                   'countminsketch',
+                   lambda **kw: RedisCountMinSketch(**dict(p, **kw)),
+                   bench_countminsketch, k))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--output', '-o', help='write the JSON results to '
+                        'this file instead of stdout')
+    parser.add_argument('--ops', type=int, default=100000,
+                        help='number of keys per in-memory benchmark')
+    parser.add_argument('--redis', metavar='HOST:PORT',
+                        help='also benchmark the Redis backends')
+    parser.add_argument('--redis-ops', type=int, default=5000,
+                        help='number of keys per Redis benchmark')
+    parser.add_argument('--redis-prefix', default='streamingds-benchmark')
+    parser.add_argument('--stream', action='append', choices=sorted(STREAMS),
+                        help='key streams to use, defaults to all')
+    parser.add_argument('--only', action='append', metavar='SKETCH',
+                        help='only run benchmarks of this sketch class')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    streams = args.stream or sorted(STREAMS)
+    benchmarks = list(memory_benchmarks(args.ops, streams, args.seed))
+    if args.redis:
+        host, _, port = args.redis.rpartition(':')
+        benchmarks.extend(redis_benchmarks(args.redis_ops, streams, args.seed,
+                                           host or 'localhost', int(port),
+                                           args.redis_prefix))
+
+    results = []
+    for sketch, backend, stream, params, run in benchmarks:
+        if args.only and sketch not in args.only:
+            continue
+        print('%s (%s) %s %s' % (sketch, backend, stream,
+                                 json.dumps(params, sort_keys=True)),
+              file=sys.stderr)
+        result = {'sketch': sketch, 'backend': backend, 'stream': stream,
+                  'params': params}
+        result.update(run())
+        results.append(result)
+
+    report = {
+        'meta': {
+            'version': '.'.join(str(v) for v in __version__),
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'date': datetime.datetime.utcnow().isoformat(),
+            'seed': args.seed,
+        },
+        'results': results,
+    }
+    output = json.dumps(report, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
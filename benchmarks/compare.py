@@ -0,0 +1,65 @@
+# vim: set fileencoding=utf-8 :
+"""Compare two result files written by `bench.py`.
+
+Prints the relative change of the throughput of every operation and exits
+with status 1 if any operation got slower by more than `--threshold`.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import argparse
+import json
+import sys
+
+
+def _index(report):
+    results = {}
+    for result in report['results']:
+        name = '%s (%s) %s %s' % (result['sketch'], result['backend'],
+                                  result['stream'],
+                                  json.dumps(result['params'],
+                                             sort_keys=True))
+        for operation, timings in result['operations'].items():
+            results[(name, operation)] = timings['ops_per_sec']
+    return results
+
+
+def compare(before, after, threshold):
+    """Return a list of `(benchmark, operation, before, after, change)` and
+    whether any change is a regression worse than `threshold`."""
+    before, after = _index(before), _index(after)
+    rows = []
+    regression = False
+    for key in sorted(set(before) & set(after)):
+        old, new = before[key], after[key]
+        if not old or not new:
+            continue
+        change = new / old - 1
+        regression = regression or change < -threshold
+        rows.append(key + (old, new, change))
+    return rows, regression
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative slowdown reported as a regression')
+    args = parser.parse_args(argv)
+
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    rows, regression = compare(before, after, args.threshold)
+    for name, operation, old, new, change in rows:
+        marker = ' !' if change < -args.threshold else ''
+        print('%-70s %-14s %12.0f %12.0f %+7.1f%%%s' % (
+            name, operation, old, new, change * 100, marker))
+    return 1 if regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
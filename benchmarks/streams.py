@@ -0,0 +1,33 @@
+# vim: set fileencoding=utf-8 :
+"""Reproducible key streams for the benchmarks."""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from bisect import bisect_left
+import random
+
+
+def uniform_stream(n, universe, seed=0):
+    """Return `n` keys drawn uniformly from `universe` distinct keys."""
+    rnd = random.Random(seed)
+    return ['key-%d' % rnd.randrange(universe) for _ in range(n)]
+
+
+def zipf_stream(n, universe, s=1.1, seed=0):
+    """Return `n` keys drawn from `universe` distinct keys where the key of
+    rank `r` occurs with a probability proportional to `1 / r ** s`."""
+    rnd = random.Random(seed)
+    total = 0.0
+    cdf = []
+    for rank in range(1, universe + 1):
+        total += 1.0 / rank ** s
+        cdf.append(total)
+    last = universe - 1
+    return ['key-%d' % min(bisect_left(cdf, rnd.random() * total), last)
+            for _ in range(n)]
+
+
+STREAMS = {
+    'uniform': uniform_stream,
+    'zipf': zipf_stream,
+}
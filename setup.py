@@ -50,7 +50,13 @@ try:
                   extra_compile_args=['-O3', '-Wall',
                                       '-Wno-strict-prototypes'],
                   libraries=['m']
-                  )
+                  ),
+        Extension('streamingds._speedups',
+                  sources=['streamingds/_speedups.pyx'],
+                  extra_compile_args=['-O3', '-Wall',
+                                      '-Wno-strict-prototypes'],
+                  libraries=['m']
+                  ),
     ]
     print('Using Cython to build the optimized version')
 except ImportError:
@@ -77,7 +83,13 @@ if not cython and not PYPY:
                   extra_compile_args=['-O3', '-Wall',
                                       '-Wno-strict-prototypes'],
                   libraries=['m']
-                  )
+                  ),
+        Extension('streamingds._speedups',
+                  sources=['streamingds/_speedups.c'],
+                  extra_compile_args=['-O3', '-Wall',
+                                      '-Wno-strict-prototypes'],
+                  libraries=['m']
+                  ),
     ]
 
     class cmd_class(c_b_ext):
@@ -167,11 +179,13 @@ setup(
     packages=['streamingds', 'streamingds.redis'],
 
     install_requires=[
-        'bitstring',
         'pyhashxx',
-        'cytoolz'
     ],
 
+    entry_points={
+        'console_scripts': ['streamingds = streamingds.cli:main'],
+    },
+
     tests_require=tests_require,
     extras_require=extras_require,
 
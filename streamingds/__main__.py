@@ -0,0 +1,5 @@
+# vim: set fileencoding=utf-8 :
+from streamingds.cli import main
+
+
+main()
@@ -0,0 +1,95 @@
+# vim: set fileencoding=utf-8 :
+"""Pure Python implementations of the kernels in `streamingds.kernels`.
+
+`streamingds/_speedups.pyx` implements the same functions in Cython. Both
+must return identical results for identical input.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from pyhashxx import hashxx
+
+
+_POPCOUNT = [bin(i).count('1') for i in range(256)]
+
+_MASK64 = (1 << 64) - 1
+
+
+def hash_indices(data, seeds, bits):
+    """Return `xxh32(data, seed) % bits` for every seed."""
+    return [hashxx(data, seed=seed) % bits for seed in seeds]
+
+
+def double_hash_indices(h1, h2, count, bits):
+    """Return `(h1 + i * h2) % bits` for `i` in `range(count)`, computed
+    modulo `2 ** 64`."""
+    return [((h1 + i * h2) & _MASK64) % bits for i in range(count)]
+
+
+def set_bits(data, bits):
+    """Set the `bits` of the byte buffer `data`, bit 0 being the most
+    significant bit of the first byte."""
+    for bit in bits:
+        data[bit >> 3] |= 0x80 >> (bit & 7)
+
+
+def clear_bits(data, bits):
+    """Clear the `bits` of the byte buffer `data`."""
+    for bit in bits:
+        data[bit >> 3] &= ~(0x80 >> (bit & 7)) & 0xff
+
+
+def test_bits(data, bits):
+    """Return `True` if all `bits` of the byte buffer `data` are set."""
+    for bit in bits:
+        if not data[bit >> 3] & (0x80 >> (bit & 7)):
+            return False
+    return True
+
+
+def count_bits(data):
+    """Return the number of bits set in the byte buffer `data`."""
+    popcount = _POPCOUNT
+    total = 0
+    for byte in bytearray(data):
+        total += popcount[byte]
+    return total
+
+
+def add_to_rows(rows, indices, increment):
+    """Add `increment` to `rows[i][indices[i]]` for every row and return the
+    minimum of the updated counters."""
+    est = None
+    for row, h in zip(rows, indices):
+        value = row[h] + increment
+        row[h] = value
+        if est is None or value < est:
+            est = value
+    return est
+
+
+def hll_update(registers, hashes, p):
+    """Update the HyperLogLog `registers` with the 64 bit `hashes`.
+
+    The lowest `p` bits of a hash select the register, the position of the
+    leftmost 1-bit of the remaining `64 - p` bits is its value.
+    """
+    mask = (1 << p) - 1
+    width = 64 - p
+    for x in hashes:
+        j = x & mask
+        rho = width - (x >> p).bit_length() + 1
+        if rho > registers[j]:
+            registers[j] = rho
+
+
+def hll_sums(registers):
+    """Return the sum of `2 ** -r` over all registers and the number of
+    registers equal to zero."""
+    total = 0.0
+    zeros = 0
+    for r in bytearray(registers):
+        total += 2.0 ** -r
+        if r == 0:
+            zeros += 1
+    return total, zeros
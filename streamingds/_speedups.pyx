@@ -0,0 +1,178 @@
+# vim: set fileencoding=utf-8 :
+# cython: boundscheck=False, wraparound=False, cdivision=True
+"""Cython implementations of the kernels in `streamingds.kernels`.
+
+`streamingds/_kernels.py` implements the same functions in pure Python.
+Both must return identical results for identical input.
+"""
+from libc.stdint cimport uint32_t, uint64_t
+
+
+cdef uint32_t PRIME1 = 2654435761U
+cdef uint32_t PRIME2 = 2246822519U
+cdef uint32_t PRIME3 = 3266489917U
+cdef uint32_t PRIME4 = 668265263U
+cdef uint32_t PRIME5 = 374761393U
+
+cdef unsigned char POPCOUNT[256]
+for _i in range(256):
+    POPCOUNT[_i] = bin(_i).count('1')
+
+
+cdef inline uint32_t rotl(uint32_t x, int r) nogil:
+    return (x << r) | (x >> (32 - r))
+
+
+cdef inline uint32_t read32(const unsigned char *p) nogil:
+    return (<uint32_t>p[0] | (<uint32_t>p[1] << 8) |
+            (<uint32_t>p[2] << 16) | (<uint32_t>p[3] << 24))
+
+
+cdef inline uint32_t round32(uint32_t acc, uint32_t value) nogil:
+    return rotl(acc + value * PRIME2, 13) * PRIME1
+
+
+cdef uint32_t xxh32(const unsigned char *p, Py_ssize_t n,
+                    uint32_t seed) nogil:
+    """The 32 bit xxHash as implemented by `pyhashxx.hashxx`."""
+    cdef Py_ssize_t i = 0
+    cdef uint32_t h, v1, v2, v3, v4
+    if n >= 16:
+        v1 = seed + PRIME1 + PRIME2
+        v2 = seed + PRIME2
+        v3 = seed
+        v4 = seed - PRIME1
+        while i <= n - 16:
+            v1 = round32(v1, read32(p + i))
+            v2 = round32(v2, read32(p + i + 4))
+            v3 = round32(v3, read32(p + i + 8))
+            v4 = round32(v4, read32(p + i + 12))
+            i += 16
+        h = rotl(v1, 1) + rotl(v2, 7) + rotl(v3, 12) + rotl(v4, 18)
+    else:
+        h = seed + PRIME5
+    h += <uint32_t>n
+    while i + 4 <= n:
+        h = rotl(h + read32(p + i) * PRIME3, 17) * PRIME4
+        i += 4
+    while i < n:
+        h = rotl(h + p[i] * PRIME5, 11) * PRIME1
+        i += 1
+    h ^= h >> 15
+    h *= PRIME2
+    h ^= h >> 13
+    h *= PRIME3
+    h ^= h >> 16
+    return h
+
+
+def hash_indices(bytes data, seeds, uint64_t bits):
+    """Return `xxh32(data, seed) % bits` for every seed."""
+    cdef const unsigned char *p = data
+    cdef Py_ssize_t n = len(data)
+    cdef uint64_t seed
+    cdef Py_ssize_t index
+    result = []
+    for s in seeds:
+        seed = s
+        index = xxh32(p, n, <uint32_t>seed) % bits
+        result.append(index)
+    return result
+
+
+def double_hash_indices(uint64_t h1, uint64_t h2, Py_ssize_t count,
+                        uint64_t bits):
+    """Return `(h1 + i * h2) % bits` for `i` in `range(count)`, computed
+    modulo `2 ** 64`."""
+    cdef Py_ssize_t i, index
+    result = []
+    for i in range(count):
+        index = (h1 + <uint64_t>i * h2) % bits
+        result.append(index)
+    return result
+
+
+def set_bits(unsigned char[:] data, bits):
+    """Set the `bits` of the byte buffer `data`, bit 0 being the most
+    significant bit of the first byte."""
+    cdef uint64_t bit
+    for b in bits:
+        bit = b
+        data[bit >> 3] |= 0x80 >> (bit & 7)
+
+
+def clear_bits(unsigned char[:] data, bits):
+    """Clear the `bits` of the byte buffer `data`."""
+    cdef uint64_t bit
+    for b in bits:
+        bit = b
+        data[bit >> 3] &= ~(0x80 >> (bit & 7))
+
+
+def test_bits(unsigned char[:] data, bits):
+    """Return `True` if all `bits` of the byte buffer `data` are set."""
+    cdef uint64_t bit
+    for b in bits:
+        bit = b
+        if not data[bit >> 3] & (0x80 >> (bit & 7)):
+            return False
+    return True
+
+
+def count_bits(unsigned char[:] data):
+    """Return the number of bits set in the byte buffer `data`."""
+    cdef Py_ssize_t i, total = 0
+    with nogil:
+        for i in range(data.shape[0]):
+            total += POPCOUNT[data[i]]
+    return total
+
+
+def add_to_rows(rows, indices, increment):
+    """Add `increment` to `rows[i][indices[i]]` for every row and return the
+    minimum of the updated counters."""
+    est = None
+    for row, h in zip(rows, indices):
+        value = row[h] + increment
+        row[h] = value
+        if est is None or value < est:
+            est = value
+    return est
+
+
+cdef inline int bit_length(uint64_t w) nogil:
+    cdef int n = 0
+    while w:
+        w >>= 1
+        n += 1
+    return n
+
+
+def hll_update(unsigned char[:] registers, hashes, int p):
+    """Update the HyperLogLog `registers` with the 64 bit `hashes`.
+
+    The lowest `p` bits of a hash select the register, the position of the
+    leftmost 1-bit of the remaining `64 - p` bits is its value.
+    """
+    cdef uint64_t mask = (<uint64_t>1 << p) - 1
+    cdef int width = 64 - p
+    cdef uint64_t x
+    cdef int rho
+    for h in hashes:
+        x = h
+        rho = width - bit_length(x >> p) + 1
+        if rho > registers[x & mask]:
+            registers[x & mask] = rho
+
+
+def hll_sums(unsigned char[:] registers):
+    """Return the sum of `2 ** -r` over all registers and the number of
+    registers equal to zero."""
+    cdef double total = 0.0
+    cdef Py_ssize_t i, zeros = 0
+    with nogil:
+        for i in range(registers.shape[0]):
+            total += 1.0 / (<uint64_t>1 << registers[i])
+            if registers[i] == 0:
+                zeros += 1
+    return total, zeros
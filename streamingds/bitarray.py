@@ -0,0 +1,70 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from streamingds.kernels import clear_bits, count_bits, set_bits, test_bits
+
+
+class BitArray(object):
+    """A fixed size array of bits stored in a byte buffer.
+
+    `data` may be any mutable buffer of bytes like a `bytearray` or a shared
+    `ctypes` array, by default a new `bytearray` is allocated. Bits are
+    numbered starting at the most significant bit of the first byte.
+
+    If a `StripedLock` is given as `locks`, every byte is a slot of it and
+    all updates are guarded by the lock of the bytes they touch. Without
+    locks the array is not safe for concurrent updates.
+    """
+
+    def __init__(self, length, data=None, locks=None):
+        self.length = length
+        if data is None:
+            data = bytearray((length + 7) // 8)
+        self._bytes = data
+        self._locks = locks
+
+    def __len__(self):
+        return self.length
+
+    def set(self, value, bits):
+        """Set all `bits` to `value`."""
+        update = set_bits if value else clear_bits
+        if self._locks is None:
+            update(self._bytes, bits)
+            return
+        for lock, group in self._locks.group(bits, shift=3):
+            with lock:
+                update(self._bytes, group)
+
+    def all(self, value, bits):
+        """Return `True` if all `bits` are set to `value`."""
+        if value:
+            return test_bits(self._bytes, bits)
+        return not any(test_bits(self._bytes, (bit,)) for bit in bits)
+
+    def count(self, value):
+        """Return the number of bits set to `value`."""
+        ones = count_bits(self._bytes)
+        return ones if value else self.length - ones
+
+    def tobytes(self):
+        return bytes(bytearray(self._bytes))
+
+    def _combine(self, other, op):
+        if len(other) != self.length:
+            raise ValueError('Bit arrays must have the same length')
+        data = self._bytes
+        other_bytes = bytearray(other.tobytes())
+        if self._locks is None:
+            data[:] = list(map(op, bytearray(data), other_bytes))
+            return self
+        with self._locks.all():
+            data[:] = list(map(op, bytearray(data), other_bytes))
+        return self
+
+    def __ior__(self, other):
+        return self._combine(other, int.__or__)
+
+    def __iand__(self, other):
+        return self._combine(other, int.__and__)
@@ -4,9 +4,11 @@ from __future__ import (absolute_import, division, print_function,
 
 import math
 
-from bitstring import BitArray
-
+from streamingds.bitarray import BitArray
+from streamingds.frozen import FrozenBloomFilter
 from streamingds.hashing import Hashing
+from streamingds.kernels import count_bits
+from streamingds.memory import smallest_fitting
 
 
 class BloomFilter(Hashing):
@@ -14,7 +16,7 @@ class BloomFilter(Hashing):
     membership in a large amount of data.
     """
 
-    def __init__(self, capacity, error_rate=0.001):
+    def __init__(self, capacity, error_rate=0.001, seeds=None, cache_size=0):
         """Initialize the filter.
 
         `capacity` and `error_rate` define the probabilities for false
@@ -27,6 +29,12 @@ class BloomFilter(Hashing):
         :type capacity: int
         :param error_rate: error rate for false positives
         :type error_rate: float
+        :param seeds: optional hash function seeds, filters with the same
+                      `capacity`, `error_rate` and `seeds` can be merged
+        :type seeds: list
+        :param cache_size: number of keys whose hash values are cached, see
+                           `Hashing`
+        :type cache_size: int
         """
         if not (0 < error_rate < 1):
             raise ValueError('error_rate must be 0 and 1.')
@@ -40,7 +48,28 @@ class BloomFilter(Hashing):
             (capacity * math.log(1/error_rate) / math.log(2) ** 2)))
         num_hash_fns = int(round(bits * math.log(2) / capacity))
 
-        super(BloomFilter, self).__init__(num_hash_fns, bits)
+        super(BloomFilter, self).__init__(num_hash_fns, bits, seeds,
+                                          cache_size)
+
+    @classmethod
+    def for_memory(cls, nbytes, capacity, **kwargs):
+        """Return the filter for `capacity` keys with the lowest error rate
+        that uses at most `nbytes` bytes.
+
+        Further keyword arguments are passed to the constructor. Error
+        rates below `1e-15` are not considered, a hash cache is not included
+        in the memory usage.
+        """
+        def make(error_rate):
+            bf = cls(capacity, error_rate, **kwargs)
+            bf._allocate()
+            return bf
+
+        return make(smallest_fitting(nbytes, make, 1e-15, 0.5))
+
+    def _allocate(self):
+        """Set up the lazily created storage, e.g. to measure it."""
+        self.bitarray
 
     @property
     def bitarray(self):
@@ -50,14 +79,94 @@ class BloomFilter(Hashing):
 
     def __contains__(self, key):
         """Check membership of a key in this filter."""
-        return self.bitarray.all(1, self.hash_values(key))
+        return self._contains(self.hash_values(key))
+
+    def _contains(self, hashes):
+        return self.bitarray.all(1, hashes)
 
     def add(self, key):
         """Add a key to this filter."""
-        self.bitarray.set(1, self.hash_values(key))
+        self._add(self.hash_values(key))
+
+    def _add(self, hashes):
+        """Set the bits of a key, or of many keys at once."""
+        self.bitarray.set(1, hashes)
+
+    def add_many(self, keys):
+        """Add all keys to this filter setting the bits in one go."""
+        hash_values = self.hash_values
+        self._add([h for key in keys for h in hash_values(key)])
+
+    def fill_ratio(self):
+        """Return the fraction of bits that are set."""
+        return self.bitarray.count(1) / self.bits
+
+    def estimated_error_rate(self):
+        """Return the false positive rate expected from the current fill
+        ratio."""
+        return self.fill_ratio() ** self.num_hash_fns
 
     def __len__(self):
         """Get the number of elements in the filter."""
-        m = self.bitarray.count(1)
-        a = (self.bits * math.log(1 - (float(m) / self.bits)))
+        return self._length(self.bitarray.count(1))
+
+    def _length(self, ones):
+        """Return the number of elements estimated from the number of set
+        bits."""
+        a = (self.bits * math.log(1 - (float(ones) / self.bits)))
         return - a / self.num_hash_fns
+
+    def copy(self):
+        """Return an in-memory copy of this filter."""
+        bf = BloomFilter(self._capacity, self._error_rate, seeds=self.seeds,
+                         cache_size=self.cache_size)
+        bf._bitarray = BitArray(self.bits,
+                                bytearray(self.bitarray.tobytes()))
+        return bf
+
+    def freeze(self):
+        """Return a read-only snapshot of this filter, see
+        `streamingds.frozen`."""
+        return self._freeze(self.bitarray.tobytes())
+
+    def _freeze(self, data):
+        """Return a frozen filter with the packed bits `data`."""
+        # the compiled kernel needs a writable buffer
+        ones = count_bits(bytearray(data))
+        length = self._length(ones) if ones < self.bits else float('inf')
+        header = {'bits': self.bits, 'num_hash_fns': self.num_hash_fns,
+                  'seeds': list(self.seeds), 'capacity': self._capacity,
+                  'error_rate': self._error_rate, 'ones': ones,
+                  'length': length}
+        return FrozenBloomFilter(header, data)
+
+    def merge(self, other):
+        """Merge the other filter into this one, i.e. build the union.
+
+        Both filters must have been created with the same parameters and
+        seeds.
+        """
+        self._check_compatible(other)
+        bitarray = self.bitarray
+        bitarray |= other.bitarray
+
+    def intersect(self, other):
+        """Only keep the bits that are set in both filters.
+
+        The result may have more bits set than a filter built from the
+        intersection of both key sets, so its false positive rate can be
+        higher than the configured `error_rate`.
+        """
+        self._check_compatible(other)
+        bitarray = self.bitarray
+        bitarray &= other.bitarray
+
+    def __or__(self, other):
+        bf = self.copy()
+        bf.merge(other)
+        return bf
+
+    def __and__(self, other):
+        bf = self.copy()
+        bf.intersect(other)
+        return bf
@@ -0,0 +1,290 @@
+# vim: set fileencoding=utf-8 :
+"""Incremental checkpoints of in-memory sketches on local disk.
+
+A `Checkpointer` periodically writes the state of a bloom filter, counting
+bloom filter, count-min sketch or HyperLogLog to a directory from a
+background thread. The data of the sketch, i.e. its bits, counters or
+registers, is split into blocks of `block_size` bytes. The first checkpoint
+is a base holding all blocks, the following ones are deltas holding only the
+blocks that changed, together with a bitmap of these dirty blocks:
+
+    >>> checkpointer = Checkpointer(cms, '/var/lib/sketches/clicks',
+    ...                             interval=10.0)
+    >>> checkpointer.start()
+    >>> cms.update('www.google.com')
+    >>> checkpointer.stop()
+
+After a crash `restore` replays the latest base and the deltas written after
+it:
+
+    >>> cms = restore('/var/lib/sketches/clicks')
+
+Changed blocks are found by comparing the SHA-1 digests of all blocks with
+the ones of the previous checkpoint, so updating a sketch costs nothing
+extra. The small rest of the state, like the top k of a count-min sketch, is
+written with every checkpoint. After `max_deltas` deltas a new base is
+written and the older files are removed.
+
+Checkpoints copy the data of the sketch while it may be updated by other
+threads. Pass the lock guarding the updates as `lock` to checkpoint a
+consistent state, otherwise a checkpoint may contain parts of concurrent
+updates.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from hashlib import sha1
+import os
+import pickle
+import struct
+import threading
+
+from streamingds.bitarray import BitArray
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countingbloomfilter import CountingBloomFilter, NibbleArray
+from streamingds.countminsketch import CountMinSketch
+from streamingds.frozen import pack_counters
+from streamingds.heap import Heap
+from streamingds.hyperloglog import HyperLogLog
+
+
+_BASE = '.base'
+_DELTA = '.delta'
+
+
+def _dump(sketch):
+    """Return the parameters and small state of `sketch` and its data."""
+    if getattr(sketch, 'redis', None) is not None:
+        raise ValueError('Redis backed sketches are durable already')
+    if isinstance(sketch, CountingBloomFilter):
+        return (('counting', sketch._capacity, sketch._error_rate,
+                 list(sketch.seeds)), sketch.counters.tobytes())
+    if isinstance(sketch, BloomFilter):
+        return (('bloom', sketch._capacity, sketch._error_rate,
+                 list(sketch.seeds)), sketch.bitarray.tobytes())
+    if isinstance(sketch, CountMinSketch):
+        meta = ('countmin', sketch._delta, sketch._epsilon, sketch.k,
+                list(sketch.seeds), sketch.counter_type, list(sketch.heap),
+                dict(sketch.known_keys),
+                dict((est, list(keys))
+                     for est, keys in sketch.top_est.items()))
+        return meta, pack_counters(list(row) for row in sketch.count)
+    if isinstance(sketch, HyperLogLog):
+        return ('hyperloglog', sketch._p), bytes(sketch._registers)
+    raise ValueError('Cannot checkpoint %s' % type(sketch).__name__)
+
+
+def _load(meta, data):
+    """Return a new sketch from the results of `_dump`."""
+    kind = meta[0]
+    if kind in ('bloom', 'counting'):
+        _, capacity, error_rate, seeds = meta
+        if kind == 'bloom':
+            sketch = BloomFilter(capacity, error_rate, seeds=seeds)
+            sketch._bitarray = BitArray(sketch.bits, bytearray(data))
+        else:
+            sketch = CountingBloomFilter(capacity, error_rate, seeds=seeds)
+            sketch._counters = NibbleArray(sketch.bits, bytearray(data))
+    elif kind == 'countmin':
+        (_, delta, epsilon, k, seeds, counter_type, heap, known_keys,
+         top_est) = meta
+        sketch = CountMinSketch(delta, epsilon, k, seeds=seeds,
+                                counter_type=counter_type)
+        width = sketch.bits
+        for i, row in enumerate(sketch.count):
+            row[:] = list(struct.unpack_from('<%dq' % width, data,
+                                             8 * width * i))
+        sketch._heap = Heap(heap)
+        sketch.known_keys = known_keys
+        sketch.top_est = top_est
+    else:
+        sketch = HyperLogLog(meta[1])
+        sketch._registers[:] = bytearray(data)
+    return sketch
+
+
+def _digests(data, block_size):
+    return [sha1(data[start:start + block_size]).digest()
+            for start in range(0, len(data), block_size)]
+
+
+def _files(directory):
+    """Return the sequence numbers and names of all checkpoint files."""
+    files = []
+    for filename in os.listdir(directory):
+        name, ext = os.path.splitext(filename)
+        if ext in (_BASE, _DELTA) and name.isdigit():
+            files.append((int(name), filename))
+    return sorted(files)
+
+
+class Checkpointer(object):
+    """Write incremental checkpoints of `sketch` to `directory`."""
+
+    def __init__(self, sketch, directory, interval=60.0, block_size=4096,
+                 max_deltas=16, lock=None):
+        """Setup the checkpoints, nothing is written until `checkpoint` or
+        `start` is called.
+
+        :param sketch: a `BloomFilter`, `CountingBloomFilter`,
+                       `CountMinSketch` or `HyperLogLog` kept in memory
+        :param directory: the directory of the checkpoint files, created if
+                          necessary. Existing checkpoints are continued with
+                          a new base
+        :type directory: str
+        :param interval: the seconds between checkpoints written by the
+                         background thread
+        :type interval: float
+        :param block_size: the number of bytes per block
+        :type block_size: int
+        :param max_deltas: the number of deltas after which a new base is
+                           written
+        :type max_deltas: int
+        :param lock: a lock held while the data of the sketch is copied
+        """
+        if interval <= 0:
+            raise ValueError('interval must be positive')
+        if block_size < 1:
+            raise ValueError('block_size must be positive')
+        if max_deltas < 0:
+            raise ValueError('max_deltas must not be negative')
+        _dump(sketch)
+        self.sketch = sketch
+        self.interval = interval
+        self.block_size = block_size
+        self.max_deltas = max_deltas
+        self.lock = lock
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.directory = directory
+
+        files = _files(directory)
+        self._sequence = files[-1][0] if files else 0
+        self._digests = None
+        self._meta = None
+        self._deltas = 0
+        self._thread = None
+        self._stopped = threading.Event()
+        self.checkpoints = 0
+        self.bytes_written = 0
+        self.error = None
+
+    def checkpoint(self):
+        """Write a checkpoint if the sketch changed since the last one.
+
+        Returns the path of the new file or `None`.
+        """
+        if self.lock is None:
+            meta, data = _dump(self.sketch)
+        else:
+            with self.lock:
+                meta, data = _dump(self.sketch)
+        digests = _digests(data, self.block_size)
+
+        base = self._digests is None or self._deltas >= self.max_deltas
+        if base:
+            dirty = list(range(len(digests)))
+        else:
+            dirty = [i for i, (old, new) in
+                     enumerate(zip(self._digests, digests)) if old != new]
+            if not dirty and meta == self._meta:
+                return None
+
+        bitmap = BitArray(len(digests))
+        bitmap.set(1, dirty)
+        blocks = b''.join(data[i * self.block_size:
+                               (i + 1) * self.block_size] for i in dirty)
+        self._sequence += 1
+        path = os.path.join(self.directory, '%010d%s' % (
+            self._sequence, _BASE if base else _DELTA))
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump({'meta': meta, 'size': len(data),
+                         'block_size': self.block_size,
+                         'dirty': bitmap.tobytes(), 'blocks': blocks},
+                        f, pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+            self.bytes_written += f.tell()
+        os.rename(path + '.tmp', path)
+
+        if base:
+            # older files are not needed anymore once the base is written
+            for sequence, filename in _files(self.directory):
+                if sequence < self._sequence:
+                    os.remove(os.path.join(self.directory, filename))
+            self._deltas = 0
+        else:
+            self._deltas += 1
+        self._digests = digests
+        self._meta = meta
+        self.checkpoints += 1
+        return path
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                # keep going, e.g. after the disk was full for a while
+                self.error = e
+
+    def start(self):
+        """Write checkpoints every `interval` seconds in a background
+        thread."""
+        if self._thread is not None:
+            raise ValueError('Checkpoints are already running')
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run,
+                                        name='streamingds-checkpoint')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and write a final checkpoint."""
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        return self.checkpoint()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def restore(directory):
+    """Return the sketch of the latest checkpoint in `directory`.
+
+    The sketch is restored as a plain `BloomFilter`, `CountingBloomFilter`,
+    `CountMinSketch` or `HyperLogLog`. Raises a `ValueError` if the
+    directory holds no base.
+    """
+    files = _files(directory)
+    bases = [i for i, (_, filename) in enumerate(files)
+             if filename.endswith(_BASE)]
+    if not bases:
+        raise ValueError('No checkpoint in %s' % directory)
+
+    data = None
+    for _, filename in files[bases[-1]:]:
+        with open(os.path.join(directory, filename), 'rb') as f:
+            checkpoint = pickle.load(f)
+        size = checkpoint['size']
+        block_size = checkpoint['block_size']
+        if data is None:
+            data = bytearray(size)
+        elif len(data) != size:
+            raise ValueError('%s does not match the base' % filename)
+        dirty = bytearray(checkpoint['dirty'])
+        blocks = checkpoint['blocks']
+        offset = 0
+        for i in range(0, (size + block_size - 1) // block_size):
+            if dirty[i >> 3] >> (7 - (i & 7)) & 1:
+                block = blocks[offset:offset + block_size]
+                data[i * block_size:i * block_size + len(block)] = block
+                offset += len(block)
+        meta = checkpoint['meta']
+    return _load(meta, bytes(data))
@@ -0,0 +1,304 @@
+# vim: set fileencoding=utf-8 :
+"""Feed the lines of log files into a sketch from the command line.
+
+    $ streamingds countmin access.log.gz --field 7 --top 20 \\
+    >     --output urls.pickle
+    $ zcat access.log.*.gz | streamingds hyperloglog --field 1
+
+Files are read in large blocks, uncompressed files through `mmap`, stdin
+(`-`) through a buffered reader, and gzip and bzip2 files are decompressed
+block by block. The key is the `--field`-th field of a line split by
+`--delimiter`, or the whole line, and lines without that field are skipped.
+Keys are fed into the sketch with its batch method, with `--processes`
+larger than one by a pool of processes, see `streamingds.parallel`.
+
+Throughput is reported on stderr while reading. At the end the sketch is
+written as a pickle (`--output`) or as a frozen snapshot (`--frozen`, see
+`streamingds.frozen`) and a JSON summary is printed, e.g. the top k of a
+count-min sketch or the cardinality of a HyperLogLog.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import argparse
+import bz2
+from functools import partial
+import gzip
+import io
+import json
+import mmap
+import pickle
+import sys
+from timeit import default_timer
+
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.kll import KLLSketch
+from streamingds.parallel import batch_method, ingest
+
+
+_STDIN = '-'
+
+
+def read_blocks(f, block_size=1 << 22):
+    """Yield the content of the file object `f` in blocks of about
+    `block_size` bytes ending with a complete line."""
+    rest = b''
+    while True:
+        block = f.read(block_size)
+        if not block:
+            break
+        end = block.rfind(b'\n') + 1
+        if end:
+            yield rest + block[:end]
+            rest = block[end:]
+        else:
+            rest += block
+    if rest:
+        yield rest + b'\n'
+
+
+def open_input(path, buffer_size=1 << 22):
+    """Return a readable file object for `path`, `-` being stdin."""
+    if path == _STDIN:
+        stdin = getattr(sys.stdin, 'buffer', sys.stdin)
+        return io.BufferedReader(io.FileIO(stdin.fileno(), closefd=False),
+                                 buffer_size)
+    # compressed files are decompressed in blocks by `read_blocks`
+    if path.endswith('.gz'):
+        return gzip.GzipFile(path, 'rb')
+    if path.endswith('.bz2'):
+        return bz2.BZ2File(path, 'rb')
+    with open(path, 'rb') as f:
+        try:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return io.BytesIO()
+
+
+class FieldExtractor(object):
+    """Return the keys of the lines in a block, the `field`-th field
+    (counting from 1) split by `delimiter` or the whole line if `field` is
+    `None`. Line endings are stripped.
+
+    Lines without the field are skipped. With `numeric` the keys are
+    converted to floats and lines that are not numbers are skipped.
+    """
+
+    def __init__(self, field=None, delimiter=None, numeric=False):
+        if field is not None and field < 1:
+            raise ValueError('field must be positive')
+        if delimiter is not None and not isinstance(delimiter, bytes):
+            delimiter = delimiter.encode('utf-8')
+        self.field = field
+        self.delimiter = delimiter
+        self.numeric = numeric
+
+    def __call__(self, block):
+        lines = block.split(b'\n')
+        lines.pop()
+        if b'\r' in block:
+            lines = [line.rstrip(b'\r') for line in lines]
+        if self.field is not None:
+            index = self.field - 1
+            delimiter = self.delimiter
+            keys = []
+            for line in lines:
+                parts = line.split(delimiter, index + 1)
+                if len(parts) > index:
+                    keys.append(parts[index])
+        else:
+            keys = lines
+        if self.numeric:
+            return _floats(keys)
+        if str is not bytes:
+            return [key.decode('utf-8', 'replace') for key in keys]
+        return keys
+
+
+def _floats(keys):
+    values = []
+    for key in keys:
+        try:
+            values.append(float(key))
+        except ValueError:
+            pass
+    return values
+
+
+class Progress(object):
+    """Count the lines and bytes of blocks and report the throughput to
+    `stream` every `interval` seconds."""
+
+    def __init__(self, interval=5.0, stream=None):
+        self.interval = interval
+        self.stream = sys.stderr if stream is None else stream
+        self.lines = 0
+        self.bytes = 0
+        self.start = self._reported = default_timer()
+
+    def add(self, block):
+        self.lines += block.count(b'\n')
+        self.bytes += len(block)
+        now = default_timer()
+        if self.interval and now - self._reported >= self.interval:
+            self._reported = now
+            self.report()
+
+    @property
+    def seconds(self):
+        return default_timer() - self.start
+
+    def report(self):
+        seconds = max(self.seconds, 1e-9)
+        print('%d lines, %.1f MB in %.1f s: %d lines/s, %.1f MB/s' % (
+            self.lines, self.bytes / 1e6, seconds, self.lines / seconds,
+            self.bytes / 1e6 / seconds), file=self.stream)
+
+
+def make_factory(args):
+    """Return a picklable factory of empty, mergeable sketches."""
+    if args.sketch == 'bloom':
+        seeds = BloomFilter(args.capacity, args.error_rate).seeds
+        return partial(BloomFilter, args.capacity, args.error_rate,
+                       seeds=list(seeds))
+    if args.sketch == 'countmin':
+        seeds = CountMinSketch(args.delta, args.epsilon, args.top).seeds
+        return partial(CountMinSketch, args.delta, args.epsilon, args.top,
+                       seeds=list(seeds), counter_type=args.counter_type)
+    if args.sketch == 'hyperloglog':
+        return partial(HyperLogLog, args.precision)
+    return partial(KLLSketch, args.kll_k)
+
+
+def summarize(sketch):
+    """Return a JSON serializable summary of the sketch."""
+    if isinstance(sketch, CountMinSketch):
+        return {'top': [[est, sorted(_text(key) for key in keys)]
+                        for est, keys in sorted(sketch.top_est.items(),
+                                                reverse=True)]}
+    if isinstance(sketch, BloomFilter):
+        return {'estimated_keys': len(sketch),
+                'fill_ratio': sketch.fill_ratio(),
+                'estimated_error_rate': sketch.estimated_error_rate()}
+    if isinstance(sketch, HyperLogLog):
+        return {'cardinality': sketch.cardinality(),
+                'error_rate': sketch.error_rate}
+    if not len(sketch):
+        return {'count': 0}
+    qs = [0, 0.5, 0.9, 0.99, 1]
+    return {'count': len(sketch),
+            'quantiles': dict(('%g' % q, value) for q, value in
+                              zip(qs, sketch.quantiles(qs)))}
+
+
+def _text(key):
+    return key.decode('utf-8', 'replace') if isinstance(key, bytes) else key
+
+
+def _blocks(paths, progress, block_size):
+    """Yield the blocks of lines of all files in `paths`."""
+    for path in paths:
+        f = open_input(path, block_size)
+        try:
+            for block in read_blocks(f, block_size):
+                progress.add(block)
+                yield block
+        finally:
+            f.close()
+
+
+def run(args, stream=None):
+    """Build the sketch described by the parsed `args` and return it with
+    its summary."""
+    factory = make_factory(args)
+    extract = FieldExtractor(args.field, args.delimiter,
+                             numeric=args.sketch == 'kll')
+    progress = Progress(args.progress_interval, stream)
+    blocks = _blocks(args.files or [_STDIN], progress, args.block_size)
+
+    if args.processes > 1:
+        # the workers split the blocks, the parent only reads them
+        sketch = ingest(factory, blocks, processes=args.processes,
+                        chunk_size=1, expand=extract)
+    else:
+        sketch = factory()
+        add = batch_method(sketch)
+        for block in blocks:
+            add(extract(block))
+    if progress.interval:
+        progress.report()
+
+    summary = {'sketch': args.sketch, 'lines': progress.lines,
+               'bytes': progress.bytes, 'seconds': progress.seconds}
+    summary.update(summarize(sketch))
+    return sketch, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='streamingds',
+                                     description=__doc__.split('\n')[0])
+    parser.add_argument('sketch',
+                        choices=['bloom', 'countmin', 'hyperloglog', 'kll'])
+    parser.add_argument('files', nargs='*', metavar='FILE',
+                        help='files to read, .gz and .bz2 files are '
+                        'decompressed, - or none read stdin')
+    parser.add_argument('--field', '-f', type=int,
+                        help='use this field of every line as the key, '
+                        'counting from 1, instead of the whole line')
+    parser.add_argument('--delimiter', '-d',
+                        help='the field delimiter, defaults to whitespace')
+    parser.add_argument('--output', '-o',
+                        help='write the sketch as a pickle to this file')
+    parser.add_argument('--frozen',
+                        help='write a frozen snapshot of the sketch to this '
+                        'file')
+    parser.add_argument('--processes', '-p', type=int, default=1,
+                        help='number of worker processes')
+    parser.add_argument('--block-size', type=int, default=1 << 22,
+                        help='number of bytes read at once')
+    parser.add_argument('--progress-interval', type=float, default=5.0,
+                        help='seconds between throughput reports, 0 '
+                        'disables them')
+
+    group = parser.add_argument_group('sketch parameters')
+    group.add_argument('--capacity', type=int, default=1000000,
+                       help='bloom filter capacity')
+    group.add_argument('--error-rate', type=float, default=0.001,
+                       help='bloom filter false positive rate')
+    group.add_argument('--delta', type=float, default=0.001,
+                       help='count-min sketch delta')
+    group.add_argument('--epsilon', type=float, default=0.001,
+                       help='count-min sketch epsilon')
+    group.add_argument('--top', type=int, default=10,
+                       help='number of top keys of a count-min sketch')
+    group.add_argument('--counter-type', default='int',
+                       choices=['int', 'uint8', 'uint16', 'morris'],
+                       help='count-min sketch counters')
+    group.add_argument('--precision', type=int, default=14,
+                       help='HyperLogLog precision p')
+    group.add_argument('--kll-k', type=int, default=200,
+                       help='KLL sketch accuracy parameter k')
+    args = parser.parse_args(argv)
+    if args.processes < 1:
+        parser.error('--processes must be positive')
+    if args.field is not None and args.field < 1:
+        parser.error('--field must be positive')
+
+    try:
+        sketch, summary = run(args)
+    except (IOError, OSError, ValueError) as e:
+        parser.exit(1, '%s: error: %s\n' % (parser.prog, e))
+
+    if args.output:
+        with open(args.output, 'wb') as f:
+            pickle.dump(sketch, f, pickle.HIGHEST_PROTOCOL)
+    if args.frozen:
+        sketch.freeze().save(args.frozen)
+    print(json.dumps(summary, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
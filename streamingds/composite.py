@@ -0,0 +1,124 @@
+# vim: set fileencoding=utf-8 :
+"""Feed every key into several sketches hashing it only once.
+
+A `CompositeSketch` wraps a bloom filter (has the key been seen?), a
+count-min sketch (how often?) and a HyperLogLog (how many distinct keys?):
+
+    >>> sketch = CompositeSketch(BloomFilter(10 ** 6, 0.001),
+    ...                          CountMinSketch(10 ** -7, 0.005, 50),
+    ...                          HyperLogLog(12))
+    >>> sketch.add('www.google.com')
+    >>> 'www.google.com' in sketch
+    True
+    >>> sketch.get('www.google.com')
+    1
+    >>> sketch.cardinality()
+    1.0001220901843502
+
+Every key is hashed once with the 128 bit MD5 digest. Its two 64 bit halves
+`h1` and `h2` derive the `i`-th bloom filter bit and count-min sketch column
+by double hashing, `(h1 + i * h2) % bits`, and `h1` is the HyperLogLog
+hash. The seeds of the wrapped sketches are not used, so they must only be
+updated and queried through the composite sketch. Read-only methods that do
+not hash keys, like `fill_ratio` or `get_ranking`, can be called on them
+directly.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from collections import defaultdict
+from hashlib import md5
+import struct
+
+from streamingds.kernels import double_hash_indices
+from streamingds.memory import sizeof
+
+
+def _digest(key):
+    key = str(key)
+    if not isinstance(key, bytes):
+        key = key.encode('utf-8')
+    return struct.unpack('<QQ', md5(key).digest())
+
+
+class CompositeSketch(object):
+    """A bloom filter, count-min sketch and HyperLogLog sharing one hash
+    per key. Any of the sketches may be omitted.
+    """
+
+    def __init__(self, bloomfilter=None, countminsketch=None,
+                 hyperloglog=None):
+        if bloomfilter is None and countminsketch is None and \
+                hyperloglog is None:
+            raise ValueError('At least one sketch is required')
+        self.bloomfilter = bloomfilter
+        self.countminsketch = countminsketch
+        self.hyperloglog = hyperloglog
+
+    def add(self, key, increment=1):
+        """Add the key to all sketches, counting it `increment` times."""
+        h1, h2 = _digest(key)
+        bf = self.bloomfilter
+        if bf is not None:
+            bf._add(double_hash_indices(h1, h2, bf.num_hash_fns, bf.bits))
+        cms = self.countminsketch
+        if cms is not None:
+            cms._update(key, double_hash_indices(h1, h2, cms.num_hash_fns,
+                                                 cms.bits), increment)
+        if self.hyperloglog is not None:
+            self.hyperloglog._add_hashes((h1,))
+
+    def add_many(self, keys, increment=1):
+        """Add all keys to the sketches.
+
+        Repeated keys are aggregated and hashed once per batch, the bloom
+        filter bits are set in one go.
+        """
+        counts = defaultdict(int)
+        for key in keys:
+            counts[key] += increment
+        digests = dict((key, _digest(key)) for key in counts)
+
+        bf = self.bloomfilter
+        if bf is not None:
+            bf._add([h for h1, h2 in digests.values()
+                     for h in double_hash_indices(h1, h2, bf.num_hash_fns,
+                                                  bf.bits)])
+        cms = self.countminsketch
+        if cms is not None:
+            for key, n in counts.items():
+                h1, h2 = digests[key]
+                cms._update(key, double_hash_indices(h1, h2, cms.num_hash_fns,
+                                                     cms.bits), n)
+        if self.hyperloglog is not None:
+            self.hyperloglog._add_hashes([h1 for h1, _ in digests.values()])
+
+    def __contains__(self, key):
+        """Check membership of the key in the bloom filter."""
+        bf = self._sketch('bloomfilter')
+        h1, h2 = _digest(key)
+        return bf._contains(double_hash_indices(h1, h2, bf.num_hash_fns,
+                                                bf.bits))
+
+    def get(self, key):
+        """Return the count-min sketch estimate for the key."""
+        cms = self._sketch('countminsketch')
+        h1, h2 = _digest(key)
+        return cms._get(double_hash_indices(h1, h2, cms.num_hash_fns,
+                                            cms.bits))
+
+    def cardinality(self):
+        """Return the HyperLogLog estimate of the number of distinct
+        keys."""
+        return self._sketch('hyperloglog').cardinality()
+
+    def memory_usage(self):
+        """Return the number of bytes used by the wrapped sketches, see
+        `streamingds.memory.sizeof`."""
+        return sizeof(self)
+
+    def _sketch(self, name):
+        sketch = getattr(self, name)
+        if sketch is None:
+            raise ValueError('This sketch has no %s' % name)
+        return sketch
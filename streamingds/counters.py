@@ -0,0 +1,170 @@
+# vim: set fileencoding=utf-8 :
+"""Compact rows of counters for the count-min sketch.
+
+A row of a `CountMinSketch` is by default a list of Python integers, which
+costs 8 bytes per counter for the list alone and 24 more for every counter
+larger than 256. Most counters of a sketch stay small, so the rows below
+store them in fewer bytes:
+
+`'uint8'` and `'uint16'`
+    Counters are stored in an `array` of 1 or 2 bytes per counter. Counters
+    reaching the largest value of the type escalate to an overflow `dict`
+    holding their exact value. Counts are exact, the memory grows with the
+    number of large counters: a `dict` entry costs about 100 bytes.
+
+`'morris'`
+    Probabilistic log counters (Morris 1978) stored in one byte each. A
+    counter stores an index into the levels 0, 1, 2, 3, 5, 6, ..., which
+    grow by about 8% each, up to about 4 * 10 ** 9. Values between two
+    levels are randomly rounded to one of them, such that the expected value
+    is exact. The relative standard error of a large counter is about 20%,
+    and as counters can be rounded down, the estimates of the sketch are no
+    longer guaranteed to be upper bounds of the true counts. Counters
+    saturate at the largest level.
+
+    Rounding every row independently would bias the minimum over the rows
+    downwards by more than the error of a single counter. Sketches with
+    Morris counters therefore use the conservative update of Estan and
+    Varghese 2002, like the count-min-log sketch of Pitel and Fouquier 2015:
+    an update rounds `min + increment` once and raises only the counters
+    below the result.
+
+Rows support indexing, assigning a whole row with `row[:] = values`,
+iteration and `len`, like the lists they replace.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from array import array
+from bisect import bisect_right
+import random
+
+
+def _morris_levels(base=1.08, states=256):
+    levels = [0]
+    for state in range(1, states):
+        levels.append(max(levels[-1] + 1,
+                          int(round((base ** state - 1) / (base - 1)))))
+    return levels
+
+
+class _Row(object):
+    """The list methods used by `CountMinSketch`."""
+
+    def __getstate__(self):
+        # arrays are pickled as lists of integers on Python 2
+        state = dict(self.__dict__)
+        cells = state.pop('_cells')
+        state['typecode'] = cells.typecode
+        state['cells'] = (cells.tobytes() if hasattr(cells, 'tobytes')
+                          else cells.tostring())
+        return state
+
+    def __setstate__(self, state):
+        state = dict(state)
+        cells = array(str(state.pop('typecode')))
+        data = state.pop('cells')
+        if hasattr(cells, 'frombytes'):
+            cells.frombytes(data)
+        else:
+            cells.fromstring(data)
+        self.__dict__.update(state)
+        self._cells = cells
+
+    def __len__(self):
+        return len(self._cells)
+
+    def __iter__(self):
+        for i in range(len(self._cells)):
+            yield self[i]
+
+    def __setitem__(self, index, value):
+        if not isinstance(index, slice):
+            self._set(index, value)
+            return
+        values = list(value)
+        if index != slice(None) or len(values) != len(self):
+            raise ValueError('Only whole rows can be assigned')
+        for i, value in enumerate(values):
+            self._set(i, value)
+
+
+class CompactRow(_Row):
+    """A row of exact counters stored in `typecode` sized cells with an
+    overflow table for the large ones."""
+
+    _MAX = {'B': 2 ** 8 - 1, 'H': 2 ** 16 - 1}
+
+    def __init__(self, width, typecode='B'):
+        self._cells = array(typecode, [0]) * width
+        self._max = self._MAX[typecode]
+        self._overflow = {}
+
+    def __getitem__(self, index):
+        value = self._cells[index]
+        if value == self._max:
+            return self._overflow[index % len(self._cells)]
+        return value
+
+    def _set(self, index, value):
+        if value < 0:
+            raise ValueError('Compact counters cannot be negative')
+        if value < self._max:
+            if self._cells[index] == self._max:
+                del self._overflow[index % len(self._cells)]
+            self._cells[index] = value
+        else:
+            self._cells[index] = self._max
+            self._overflow[index % len(self._cells)] = value
+
+
+class MorrisRow(_Row):
+    """A row of probabilistic log counters stored in one byte each."""
+
+    # the values represented by the counter states
+    _LEVELS = _morris_levels()
+
+    def __init__(self, width):
+        self._cells = array('B', [0]) * width
+
+    def __getitem__(self, index):
+        return self._LEVELS[self._cells[index]]
+
+    def _set(self, index, value):
+        self._cells[index] = self._state(value)
+
+    @classmethod
+    def _state(cls, value):
+        """Return the state representing `value`, rounding randomly so the
+        expected value is `value`."""
+        levels = cls._LEVELS
+        if value <= 0:
+            return 0
+        if value >= levels[-1]:
+            return len(levels) - 1
+        state = bisect_right(levels, value) - 1
+        low, high = levels[state], levels[state + 1]
+        if random.random() * (high - low) < value - low:
+            state += 1
+        return state
+
+
+def conservative_update(rows, indices, increment):
+    """Raise the Morris counters at `indices` to their minimum plus
+    `increment` and return the new minimum."""
+    cells = [(row._cells, h) for row, h in zip(rows, indices)]
+    levels = MorrisRow._LEVELS
+    low = min(c[h] for c, h in cells)
+    state = MorrisRow._state(levels[low] + increment)
+    for c, h in cells:
+        if c[h] < state:
+            c[h] = state
+    return levels[max(low, state)]
+
+
+COUNTER_TYPES = {
+    'int': lambda width: [0] * width,
+    'uint8': lambda width: CompactRow(width, 'B'),
+    'uint16': lambda width: CompactRow(width, 'H'),
+    'morris': MorrisRow,
+}
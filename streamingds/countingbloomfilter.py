@@ -0,0 +1,171 @@
+# vim: set fileencoding=utf-8 :
+"""A counting bloom filter, i.e. a bloom filter supporting `remove`.
+
+Instead of one bit every position holds a 4 bit counter, two counters are
+packed into one byte. A filter therefore needs four times the memory of a
+`BloomFilter` with the same `capacity` and `error_rate`.
+
+Counters saturate at 15. A saturated counter is never decremented again, as
+its true value is unknown, so removing keys never causes false negatives.
+With the usual parameters the probability of a counter reaching 15 is
+negligible.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from streamingds.bitarray import BitArray
+from streamingds.bloomfilter import BloomFilter
+
+
+_MAX_COUNT = 15
+
+
+class NibbleArray(object):
+    """A fixed size array of saturating 4 bit counters stored in a byte
+    buffer, counter 0 being the high nibble of the first byte."""
+
+    def __init__(self, length, data=None):
+        self.length = length
+        if data is None:
+            data = bytearray((length + 1) // 2)
+        self._bytes = data
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        byte = self._bytes[index >> 1]
+        return byte & 0x0f if index & 1 else byte >> 4
+
+    def __setitem__(self, index, value):
+        byte = self._bytes[index >> 1]
+        if index & 1:
+            self._bytes[index >> 1] = (byte & 0xf0) | value
+        else:
+            self._bytes[index >> 1] = (byte & 0x0f) | (value << 4)
+
+    def increment(self, indices):
+        """Increment the counters at `indices` up to 15."""
+        for index in indices:
+            value = self[index]
+            if value < _MAX_COUNT:
+                self[index] = value + 1
+
+    def decrement(self, indices):
+        """Decrement the counters at `indices` if none of them is zero.
+
+        Saturated counters are left alone. Returns whether the counters were
+        decremented.
+        """
+        if not self.all(indices):
+            return False
+        for index in indices:
+            value = self[index]
+            if 0 < value < _MAX_COUNT:
+                self[index] = value - 1
+        return True
+
+    def all(self, indices):
+        """Return `True` if none of the counters at `indices` is zero."""
+        for index in indices:
+            if not self[index]:
+                return False
+        return True
+
+    def count(self):
+        """Return the number of counters that are not zero."""
+        return sum((byte >> 4 != 0) + (byte & 0x0f != 0)
+                   for byte in bytearray(self._bytes))
+
+    def tobytes(self):
+        return bytes(bytearray(self._bytes))
+
+    def _combine(self, other, op):
+        if len(other) != self.length:
+            raise ValueError('Counter arrays must have the same length')
+        other = NibbleArray(self.length, bytearray(other.tobytes()))
+        for index in range(self.length):
+            self[index] = op(self[index], other[index])
+        return self
+
+    def add(self, other):
+        """Add the counters of `other`, saturating at 15."""
+        return self._combine(other,
+                             lambda a, b: min(a + b, _MAX_COUNT))
+
+    def minimum(self, other):
+        """Keep the minimum of both counters."""
+        return self._combine(other, min)
+
+
+class CountingBloomFilter(BloomFilter):
+    """A bloom filter with 4 bit counters supporting `remove`."""
+
+    @property
+    def bitarray(self):
+        raise AttributeError('A CountingBloomFilter stores counters, '
+                             'not bits')
+
+    @property
+    def counters(self):
+        if not hasattr(self, '_counters'):
+            self._counters = NibbleArray(self.bits)
+        return self._counters
+
+    def _allocate(self):
+        self.counters
+
+    def _contains(self, hashes):
+        return self.counters.all(hashes)
+
+    def _add(self, hashes):
+        self.counters.increment(hashes)
+
+    def remove(self, key):
+        """Remove a key from this filter.
+
+        Returns `False` if the key is not in the filter. Only remove keys
+        that have been added, removing a false positive decrements the
+        counters of other keys.
+        """
+        return self.counters.decrement(self.hash_values(key))
+
+    def fill_ratio(self):
+        """Return the fraction of counters that are not zero."""
+        return self.counters.count() / self.bits
+
+    def __len__(self):
+        """Get the number of elements in the filter."""
+        return self._length(self.counters.count())
+
+    def copy(self):
+        """Return an in-memory copy of this filter."""
+        cbf = CountingBloomFilter(self._capacity, self._error_rate,
+                                  seeds=self.seeds,
+                                  cache_size=self.cache_size)
+        cbf._counters = NibbleArray(self.bits,
+                                    bytearray(self.counters.tobytes()))
+        return cbf
+
+    def freeze(self):
+        """Return a read-only bloom filter with the bits of all counters that
+        are not zero set, see `streamingds.frozen`. Keys cannot be removed
+        from it."""
+        counters = NibbleArray(self.bits, bytearray(self.counters.tobytes()))
+        bits = BitArray(self.bits)
+        bits.set(1, [i for i in range(self.bits) if counters[i]])
+        return self._freeze(bits.tobytes())
+
+    def merge(self, other):
+        """Add the counters of the other filter to this one.
+
+        Both filters must have been created with the same parameters and
+        seeds.
+        """
+        self._check_compatible(other)
+        self.counters.add(other.counters)
+
+    def intersect(self, other):
+        """Keep the minimum of the counters of both filters."""
+        self._check_compatible(other)
+        self.counters.minimum(other.counters)
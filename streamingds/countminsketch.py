@@ -10,11 +10,17 @@ http://www.nightmare.com/rushing/python/countmin.py
 from __future__ import (absolute_import, division, print_function,
                         with_statement)
 
+from collections import defaultdict
 import math
+from operator import add
 import sys
 
+from streamingds.counters import COUNTER_TYPES, conservative_update
+from streamingds.frozen import FrozenCountMinSketch, pack_counters
 from streamingds.hashing import Hashing
 from streamingds.heap import Heap
+from streamingds.kernels import add_to_rows
+from streamingds.memory import smallest_fitting
 
 
 int_ceil = lambda x: int(math.ceil(x))
@@ -25,7 +31,11 @@ class CountMinSketch(Hashing):
     """A count-min sketch to track counts of keys in a stream.
     """
 
-    def __init__(self, delta, epsilon, k):
+    # sketches pickled before counter types existed
+    counter_type = 'int'
+
+    def __init__(self, delta, epsilon, k, seeds=None, cache_size=0,
+                 counter_type='int'):
         """Setup a new count-min sketch with parameters delta, epsilon and k
 
         The parameters delta and epsilon control the accuracy of the
@@ -47,6 +57,15 @@ class CountMinSketch(Hashing):
             A value in the unit interval that sets the precision of the sketch
         k : int
             A positive integer that sets the number of top items counted
+        seeds : list, optional
+            The seeds of the hash functions. Sketches with the same delta,
+            epsilon and seeds can be merged
+        cache_size : int, optional
+            The number of keys whose hash values are cached, see `Hashing`
+        counter_type : {'int', 'uint8', 'uint16', 'morris'}, optional
+            How the counters are stored. `'uint8'` and `'uint16'` store
+            exact counters in 1 or 2 bytes, `'morris'` stores approximate
+            counters in one byte, see `streamingds.counters`
 
         Examples
         --------
@@ -55,8 +74,8 @@ class CountMinSketch(Hashing):
         Raises
         ------
         ValueError
-            If delta or epsilon are not in the unit interval, or if k is
-            not a positive integer
+            If delta or epsilon are not in the unit interval, if k is
+            not a positive integer or if counter_type is unknown
         """
         if not 0 <= delta <= 1:
             raise ValueError('delta must be betweet 0 and 1')
@@ -64,16 +83,55 @@ class CountMinSketch(Hashing):
             raise ValueError('epsilon must be between 0.001 and 1')
         if k < 1 or k != int(k):
             raise ValueError('k must be a positive integer')
+        if counter_type not in COUNTER_TYPES:
+            raise ValueError('counter_type must be one of %s' %
+                             ', '.join(sorted(COUNTER_TYPES)))
 
         self.k = k
+        self.counter_type = counter_type
+        self._delta = delta
+        self._epsilon = epsilon
         w = int(math.ceil(math.e / epsilon))
         d = int(math.ceil(math.log(1.0 / delta)))
 
-        super(CountMinSketch, self).__init__(d, w)
+        super(CountMinSketch, self).__init__(d, w, seeds, cache_size)
 
         self.known_keys = {}
         self.top_est = {}
 
+    @classmethod
+    def for_memory(cls, nbytes, k, delta=0.001, **kwargs):
+        """Return the sketch with the smallest epsilon whose counters use at
+        most `nbytes` bytes
+
+        Parameters
+        ----------
+        nbytes : int
+            The memory budget in bytes
+        k : int
+            The number of top items counted
+        delta : float, optional
+            The probability of an estimate exceeding the error bound
+        **kwargs
+            Further arguments of the constructor, e.g. `counter_type`
+
+        Notes
+        -----
+        The budget covers the empty sketch. The top k and, with the default
+        `counter_type`, every counter larger than 256 need additional memory
+        as keys are counted. Epsilon is at least 0.001.
+
+        Examples
+        --------
+        >>> s = CountMinSketch.for_memory(2 ** 20, 50, counter_type='uint16')
+        """
+        def make(epsilon):
+            cms = cls(delta, epsilon, k, **kwargs)
+            cms.count
+            return cms
+
+        return make(smallest_fitting(nbytes, make, 0.001, 1))
+
     @property
     def count(self):
         """A simple property that can be changed in more specific
@@ -83,8 +141,8 @@ class CountMinSketch(Hashing):
         function.
         """
         if not hasattr(self, '_count'):
-            self._count = [[0] * self.bits
-                           for _ in range(self.num_hash_fns)]
+            row = COUNTER_TYPES[self.counter_type]
+            self._count = [row(self.bits) for _ in range(self.num_hash_fns)]
         return self._count
 
     @property
@@ -110,12 +168,42 @@ class CountMinSketch(Hashing):
         >>> s = CountMinSketch(10**-7, 0.005, 40)
         >>> s.update('http://www.cnn.com/', 1)
         """
-        hashes = self.hash_values(key)
-        est = sys.maxint
-        for i, h in enumerate(hashes):
-            self.count[i][h] = self.count[i][h] + increment
-            est = min(est, self.count[i][h])
-        self.update_heap(key, self.get(key))
+        self._update(key, self.hash_values(key), increment)
+
+    def _update(self, key, hashes, increment):
+        """Updates the counters at `hashes` and the heap for the key."""
+        if self.counter_type == 'morris':
+            est = conservative_update(self.count, hashes, increment)
+        else:
+            est = add_to_rows(self.count, hashes, increment)
+        self.update_heap(key, est)
+
+    def update_many(self, keys, increment=1):
+        """Updates the sketch for every item in keys by the amount specified
+        in increment
+
+        Repeated keys are aggregated first, so the counters and the top k
+        heap are only touched once per distinct key of the batch.
+
+        Parameters
+        ----------
+        keys : iterable
+            The items to update the value of in the sketch
+        increment : integer
+            The amount to update the sketch by for each occurrence of a key
+
+        Examples
+        --------
+        >>> s = CountMinSketch(10**-7, 0.005, 40)
+        >>> s.update_many(['http://www.cnn.com/', 'http://www.cnn.com/'])
+        >>> s.get('http://www.cnn.com/')
+        2
+        """
+        counts = defaultdict(int)
+        for key in keys:
+            counts[key] += increment
+        for key, n in counts.items():
+            self.update(key, n)
 
     def get(self, key):
         """Fetches the sketch estimate for the given key
@@ -138,7 +226,10 @@ class CountMinSketch(Hashing):
         >>> s.get('http://www.cnn.com/')
         1
         """
-        hashes = self.hash_values(key)
+        return self._get(self.hash_values(key))
+
+    def _get(self, hashes):
+        """Returns the minimum of the counters at `hashes`."""
         r = sys.maxint
         for i, h in enumerate(hashes):
             r = min(r, self.count[i][h])
@@ -189,6 +280,69 @@ class CountMinSketch(Hashing):
                     self.top_est[est] = [key]
                     self.known_keys[key] = est
 
+    def merge(self, other):
+        """Add the counts of the other sketch to this one
+
+        Both sketches must have been created with the same delta, epsilon and
+        seeds. The top k items are recomputed from the keys tracked by both
+        sketches.
+
+        Parameters
+        ----------
+        other : CountMinSketch
+            The sketch to merge into this one
+
+        Raises
+        ------
+        ValueError
+            If the sketches use different dimensions or seeds
+        """
+        self._check_compatible(other)
+        count = self.count
+        for i, other_row in enumerate(other.count):
+            count[i][:] = list(map(add, count[i], other_row))
+
+        for key in set(self.known_keys) | set(other.known_keys):
+            self.update_heap(key, self.get(key))
+
+    def copy(self):
+        """Return an in-memory copy of this sketch including its top k."""
+        cms = CountMinSketch(self._delta, self._epsilon, self.k,
+                             seeds=self.seeds, cache_size=self.cache_size,
+                             counter_type=self.counter_type)
+        for row, other_row in zip(cms.count, self.count):
+            row[:] = other_row
+        cms._heap = Heap(self.heap)
+        cms.known_keys = dict(self.known_keys)
+        cms.top_est = dict((est, list(keys))
+                           for est, keys in self.top_est.items())
+        return cms
+
+    def freeze(self):
+        """Return a read-only snapshot of this sketch
+
+        The counters are stored in one contiguous buffer and the top k are
+        ranked once, see `streamingds.frozen`.
+
+        Returns
+        -------
+        FrozenCountMinSketch
+            The snapshot answering `get`, `get_many` and `get_ranking`
+        """
+        header = {'bits': self.bits, 'num_hash_fns': self.num_hash_fns,
+                  'seeds': list(self.seeds), 'k': self.k,
+                  'delta': self._delta, 'epsilon': self._epsilon,
+                  'top': sorted(((est, list(keys))
+                                 for est, keys in self.top_est.items()),
+                                reverse=True)}
+        return FrozenCountMinSketch(
+            header, pack_counters(list(row) for row in self.count))
+
+    def __or__(self, other):
+        cms = self.copy()
+        cms.merge(other)
+        return cms
+
     def get_ranking(self):
         """Convinience method to return a dictionary with the ranking and
         estimations.
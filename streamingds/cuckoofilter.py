@@ -0,0 +1,259 @@
+# vim: set fileencoding=utf-8 :
+"""A cuckoo filter as described in Fan et al., "Cuckoo Filter: Practically
+Better Than Bloom", CoNEXT 2014.
+
+https://www.cs.cmu.edu/~dga/papers/cuckoo-conext2014.pdf
+
+Like a bloom filter, a cuckoo filter tests for membership with a configurable
+false positive rate, but keys can also be removed again. Instead of bits it
+stores a short fingerprint of every key in one of two buckets. If both
+buckets are full, a fingerprint of one of them is moved to its alternative
+bucket, possibly kicking out further fingerprints.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import math
+import random
+
+from streamingds.frozen import FrozenCuckooFilter, pack_fingerprints
+from streamingds.hashing import Hashing
+from streamingds.memory import smallest_fitting
+
+
+# the load factor a filter with four slots per bucket reliably reaches
+_MAX_LOAD = 0.95
+
+
+def _get_field(data, bit, width):
+    """Return the `width` bit integer starting at `bit` of `data`."""
+    start = bit >> 3
+    end = (bit + width + 7) >> 3
+    value = 0
+    for byte in data[start:end]:
+        value = (value << 8) | byte
+    return (value >> ((end << 3) - bit - width)) & ((1 << width) - 1)
+
+
+def _set_field(data, bit, width, value):
+    """Store the `width` bit integer `value` starting at `bit` of `data`."""
+    start = bit >> 3
+    end = (bit + width + 7) >> 3
+    shift = (end << 3) - bit - width
+    mask = ((1 << width) - 1) << shift
+    current = 0
+    for byte in data[start:end]:
+        current = (current << 8) | byte
+    current = (current & ~mask) | (value << shift)
+    for i in range(end - 1, start - 1, -1):
+        data[i] = current & 0xff
+        current >>= 8
+
+
+class CuckooFilter(Hashing):
+    """A cuckoo filter supporting `add`, `in`, `remove` and `len`.
+
+    The fingerprints are packed into one `bytearray` with `fingerprint_bits`
+    bits per fingerprint and `bucket_size` fingerprints per bucket, so the
+    filter needs about `fingerprint_bits / 0.95` bits per key. With the
+    default four slots per bucket this is less than a bloom filter with the
+    same error rate needs for error rates below about 0.2%.
+    """
+
+    def __init__(self, capacity, error_rate=0.001, bucket_size=4,
+                 max_kicks=500, seeds=None, cache_size=0):
+        """Initialize the filter.
+
+        :param capacity: number of keys the filter can hold with the given
+                         `error_rate`
+        :type capacity: int
+        :param error_rate: error rate for false positives
+        :type error_rate: float
+        :param bucket_size: number of fingerprints per bucket
+        :type bucket_size: int
+        :param max_kicks: maximum number of fingerprints relocated by one
+                          insert before the filter is considered full
+        :type max_kicks: int
+        :param seeds: optional seeds of the two hash functions
+        :type seeds: list
+        :param cache_size: number of keys whose hash values are cached, see
+                           `Hashing`
+        :type cache_size: int
+        """
+        if not (0 < error_rate < 1):
+            raise ValueError('error_rate must be 0 and 1.')
+        if capacity <= 0:
+            raise ValueError('capacity must be greater than 1')
+        if bucket_size < 1 or bucket_size != int(bucket_size):
+            raise ValueError('bucket_size must be a positive integer')
+        if max_kicks < 0:
+            raise ValueError('max_kicks must not be negative')
+
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self.bucket_size = bucket_size
+        self.max_kicks = max_kicks
+
+        # a lookup compares 2 * bucket_size fingerprints, each matching with
+        # probability 2 ** -fingerprint_bits
+        self.fingerprint_bits = int(math.ceil(
+            math.log(2 * bucket_size / error_rate, 2)))
+        if self.fingerprint_bits > 32:
+            raise ValueError('error_rate too small for 32 bit fingerprints')
+        self.num_buckets = int(math.ceil(
+            capacity / (bucket_size * _MAX_LOAD)))
+
+        self._data = bytearray((self.num_buckets * bucket_size *
+                                self.fingerprint_bits + 7) // 8)
+        self._count = 0
+        # the fingerprint evicted by an insert that found no free slot
+        self._victim = None
+
+        super(CuckooFilter, self).__init__(2, 2 ** 32, seeds, cache_size)
+
+    @classmethod
+    def for_memory(cls, nbytes, capacity, bucket_size=4, **kwargs):
+        """Return the filter for `capacity` keys with the lowest error rate
+        that uses at most `nbytes` bytes.
+
+        Further keyword arguments are passed to the constructor.
+        """
+        return cls(capacity, smallest_fitting(
+            nbytes,
+            lambda error_rate: cls(capacity, error_rate, bucket_size,
+                                   **kwargs),
+            2 * bucket_size / 2 ** 31, 0.5), bucket_size, **kwargs)
+
+    def _fingerprint(self, key):
+        """Return the non-zero fingerprint and the first bucket of a key."""
+        h, f = self.hash_values(key)
+        fingerprint = f % ((1 << self.fingerprint_bits) - 1) + 1
+        return fingerprint, h % self.num_buckets
+
+    def _alternative(self, bucket, fingerprint):
+        """Return the other bucket of a fingerprint stored in `bucket`."""
+        h = (fingerprint * 0x5bd1e995) & 0xffffffff
+        return (h - bucket) % self.num_buckets
+
+    def _slots(self, bucket):
+        start = bucket * self.bucket_size
+        return range(start, start + self.bucket_size)
+
+    def _find(self, bucket, fingerprint):
+        """Return the slot of `fingerprint` in `bucket` or `None`."""
+        data = self._data
+        width = self.fingerprint_bits
+        for slot in self._slots(bucket):
+            if _get_field(data, slot * width, width) == fingerprint:
+                return slot
+        return None
+
+    def _insert(self, bucket, fingerprint):
+        """Store the fingerprint in a free slot of `bucket` if there is
+        one."""
+        slot = self._find(bucket, 0)
+        if slot is None:
+            return False
+        _set_field(self._data, slot * self.fingerprint_bits,
+                   self.fingerprint_bits, fingerprint)
+        return True
+
+    def _place(self, bucket, fingerprint):
+        """Store the fingerprint in `bucket` or its alternative, relocating
+        other fingerprints if both are full."""
+        if self._insert(bucket, fingerprint) or \
+                self._insert(self._alternative(bucket, fingerprint),
+                             fingerprint):
+            return
+        data = self._data
+        width = self.fingerprint_bits
+        for _ in range(self.max_kicks):
+            slot = random.choice(self._slots(bucket))
+            evicted = _get_field(data, slot * width, width)
+            _set_field(data, slot * width, width, fingerprint)
+            fingerprint = evicted
+            bucket = self._alternative(bucket, fingerprint)
+            if self._insert(bucket, fingerprint):
+                return
+        self._victim = (bucket, fingerprint)
+
+    def add(self, key):
+        """Add a key to this filter.
+
+        Raises a `ValueError` if the filter is full. The key that filled it
+        up is still stored.
+        """
+        if self._victim is not None:
+            raise ValueError('Cuckoo filter is full')
+        fingerprint, bucket = self._fingerprint(key)
+        self._count += 1
+        self._place(bucket, fingerprint)
+
+    def add_many(self, keys):
+        """Add all keys to this filter."""
+        add = self.add
+        for key in keys:
+            add(key)
+
+    def __contains__(self, key):
+        """Check membership of a key in this filter."""
+        fingerprint, bucket = self._fingerprint(key)
+        alternative = self._alternative(bucket, fingerprint)
+        if self._find(bucket, fingerprint) is not None or \
+                self._find(alternative, fingerprint) is not None:
+            return True
+        return self._victim in ((bucket, fingerprint),
+                                (alternative, fingerprint))
+
+    def remove(self, key):
+        """Remove a key from this filter.
+
+        Returns `False` if the key is not in the filter. Only remove keys
+        that have been added, removing a false positive deletes the
+        fingerprint of another key.
+        """
+        fingerprint, bucket = self._fingerprint(key)
+        alternative = self._alternative(bucket, fingerprint)
+        if self._victim in ((bucket, fingerprint),
+                            (alternative, fingerprint)):
+            self._victim = None
+            self._count -= 1
+            return True
+
+        slot = self._find(bucket, fingerprint)
+        if slot is None:
+            slot = self._find(alternative, fingerprint)
+        if slot is None:
+            return False
+        _set_field(self._data, slot * self.fingerprint_bits,
+                   self.fingerprint_bits, 0)
+        self._count -= 1
+
+        if self._victim is not None:
+            victim, self._victim = self._victim, None
+            self._place(*victim)
+        return True
+
+    def freeze(self):
+        """Return a read-only snapshot of this filter, see
+        `streamingds.frozen`."""
+        data = self._data
+        width = self.fingerprint_bits
+        fingerprints = [_get_field(data, slot * width, width) for slot in
+                        range(self.num_buckets * self.bucket_size)]
+        header = {'fingerprint_bits': width,
+                  'bucket_size': self.bucket_size,
+                  'num_buckets': self.num_buckets,
+                  'seeds': list(self.seeds), 'capacity': self._capacity,
+                  'error_rate': self._error_rate, 'count': self._count,
+                  'victim': self._victim}
+        return FrozenCuckooFilter(header,
+                                  pack_fingerprints(fingerprints, width))
+
+    def __len__(self):
+        """Get the number of keys in the filter."""
+        return self._count
+
+    def load_factor(self):
+        """Return the fraction of occupied slots."""
+        return self._count / (self.num_buckets * self.bucket_size)
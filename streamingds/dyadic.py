@@ -0,0 +1,232 @@
+# vim: set fileencoding=utf-8 :
+"""A hierarchical count-min sketch over dyadic ranges of integer keys.
+
+Integer keys from the universe `[0, 2 ** universe_bits)`, e.g. ports, user
+ids or timestamps, are counted on `universe_bits + 1` levels. Level `l`
+counts the prefixes `key >> l`, i.e. the dyadic ranges
+`[p * 2 ** l, (p + 1) * 2 ** l)`. Every range `[lo, hi]` is the union of at
+most `2 * universe_bits` dyadic ranges, so `range_count` needs
+`O(universe_bits)` lookups, and heavy hitters are found by descending into
+the heavy ranges only, without tracking a heap of the top keys.
+
+The upper levels have fewer prefixes than a count matrix has counters.
+They are counted exactly in a single row indexed by the prefix.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import math
+from operator import add
+
+from streamingds.counters import COUNTER_TYPES, conservative_update
+from streamingds.frozen import FrozenDyadicCountMinSketch, pack_counters
+from streamingds.hashing import Hashing
+from streamingds.kernels import add_to_rows
+
+
+class DyadicCountMinSketch(Hashing):
+    """Count-min sketches for all dyadic ranges of integer keys supporting
+    point queries, range queries and heavy hitters."""
+
+    def __init__(self, delta, epsilon, universe_bits=32, seeds=None,
+                 cache_size=0, counter_type='int'):
+        """Setup a new dyadic sketch.
+
+        Every level is a count-min sketch with the given `delta` and
+        `epsilon`. A range query sums up to `2 * universe_bits` of their
+        estimates, so its error is at most `2 * universe_bits * epsilon`
+        times the total count.
+
+        :param delta: probability of a point estimate exceeding the error
+                      bound
+        :type delta: float
+        :param epsilon: error bound of a point estimate relative to the total
+                        count
+        :type epsilon: float
+        :param universe_bits: keys must be integers below
+                              `2 ** universe_bits`
+        :type universe_bits: int
+        :param seeds: optional seeds of the hash functions
+        :type seeds: list
+        :param cache_size: number of prefixes whose hash values are cached,
+                           see `Hashing`
+        :type cache_size: int
+        :param counter_type: how the counters are stored, see
+                             `streamingds.counters`
+        :type counter_type: str
+        """
+        if not 0 < delta <= 1:
+            raise ValueError('delta must be between 0 and 1')
+        if not 0.001 <= epsilon <= 1:
+            raise ValueError('epsilon must be between 0.001 and 1')
+        if not 1 <= universe_bits <= 64 or \
+                universe_bits != int(universe_bits):
+            raise ValueError('universe_bits must be an integer between 1 '
+                             'and 64')
+        if counter_type not in COUNTER_TYPES:
+            raise ValueError('counter_type must be one of %s' %
+                             ', '.join(sorted(COUNTER_TYPES)))
+
+        self._delta = delta
+        self._epsilon = epsilon
+        self.universe_bits = int(universe_bits)
+        self.counter_type = counter_type
+        w = int(math.ceil(math.e / epsilon))
+        d = int(math.ceil(math.log(1.0 / delta)))
+
+        super(DyadicCountMinSketch, self).__init__(d, w, seeds, cache_size)
+
+        # the levels from here on have at most `w * d` prefixes
+        self._exact_from = max(0, self.universe_bits -
+                               (w * d).bit_length() + 1)
+
+    def _is_exact(self, level):
+        """Whether `level` is counted exactly in a single row."""
+        return level >= self._exact_from
+
+    def _matrix(self, level, width, depth):
+        """Return a new count matrix of `depth` rows of `width` counters."""
+        row = COUNTER_TYPES[self.counter_type]
+        return [row(width) for _ in range(depth)]
+
+    @property
+    def count(self):
+        """The count matrices of all levels, level `l` counting the prefixes
+        `key >> l`."""
+        if not hasattr(self, '_count'):
+            self._count = [
+                self._matrix(level, 2 ** (self.universe_bits - level), 1)
+                if self._is_exact(level)
+                else self._matrix(level, self.bits, self.num_hash_fns)
+                for level in range(self.universe_bits + 1)]
+        return self._count
+
+    def _check_key(self, key):
+        if not 0 <= key < 2 ** self.universe_bits or key != int(key):
+            raise ValueError('keys must be integers between 0 and '
+                             '2 ** %d - 1' % self.universe_bits)
+        return int(key)
+
+    def _hashes(self, level, prefix):
+        return self.hash_values('%d:%d' % (level, prefix))
+
+    def update(self, key, increment=1):
+        """Add `increment` to the count of the integer `key`."""
+        key = self._check_key(key)
+        morris = self.counter_type == 'morris'
+        for level, matrix in enumerate(self.count):
+            prefix = key >> level
+            if self._is_exact(level):
+                matrix[0][prefix] += increment
+            elif morris:
+                conservative_update(matrix, self._hashes(level, prefix),
+                                    increment)
+            else:
+                add_to_rows(matrix, self._hashes(level, prefix), increment)
+
+    def update_many(self, keys, increment=1):
+        """Add `increment` to the count of every key in `keys`."""
+        update = self.update
+        for key in keys:
+            update(key, increment)
+
+    def _estimate(self, level, prefix):
+        matrix = self.count[level]
+        if self._is_exact(level):
+            return matrix[0][prefix]
+        return min(row[h]
+                   for row, h in zip(matrix, self._hashes(level, prefix)))
+
+    def get(self, key):
+        """Return the estimated count of `key`."""
+        return self._estimate(0, self._check_key(key))
+
+    @property
+    def total(self):
+        """The sum of all increments."""
+        return self._estimate(self.universe_bits, 0)
+
+    def range_count(self, lo, hi):
+        """Return the estimated sum of the counts of all keys in
+        `[lo, hi]`, both inclusive."""
+        lo = max(int(lo), 0)
+        hi = min(int(hi), 2 ** self.universe_bits - 1)
+        result = 0
+        level = 0
+        while lo <= hi:
+            if lo & 1:
+                result += self._estimate(level, lo)
+                lo += 1
+            if not hi & 1:
+                result += self._estimate(level, hi)
+                hi -= 1
+            lo >>= 1
+            hi >>= 1
+            level += 1
+        return result
+
+    def heavy_hitters(self, phi):
+        """Return the keys whose estimated count is at least `phi` times the
+        total count as a list of `(key, estimate)` pairs, largest first.
+
+        Only the children of heavy ranges are estimated, at most `2 / phi`
+        per level. As the estimates never underestimate with exact counters,
+        no heavy hitter is missed.
+        """
+        if not 0 < phi <= 1:
+            raise ValueError('phi must be between 0 and 1')
+        threshold = phi * self.total
+        if not threshold:
+            return []
+        heavy = [0]
+        for level in range(self.universe_bits - 1, -1, -1):
+            heavy = [child for prefix in heavy
+                     for child in (2 * prefix, 2 * prefix + 1)
+                     if self._estimate(level, child) >= threshold]
+        return sorted(((key, self._estimate(0, key)) for key in heavy),
+                      key=lambda item: (-item[1], item[0]))
+
+    def _check_compatible(self, other):
+        super(DyadicCountMinSketch, self)._check_compatible(other)
+        if self.universe_bits != other.universe_bits:
+            raise ValueError("Can't merge sketches with different "
+                             "universe_bits.")
+
+    def merge(self, other):
+        """Add the counts of the other sketch to this one.
+
+        Both sketches must have been created with the same delta, epsilon,
+        universe_bits and seeds.
+        """
+        self._check_compatible(other)
+        for matrix, other_matrix in zip(self.count, other.count):
+            for row, other_row in zip(matrix, other_matrix):
+                row[:] = list(map(add, row, other_row))
+
+    def freeze(self):
+        """Return a read-only snapshot with the counters of all levels in one
+        buffer, see `streamingds.frozen`."""
+        header = {'universe_bits': self.universe_bits, 'bits': self.bits,
+                  'num_hash_fns': self.num_hash_fns,
+                  'seeds': list(self.seeds), 'delta': self._delta,
+                  'epsilon': self._epsilon, 'exact_from': self._exact_from,
+                  'total': self.total}
+        return FrozenDyadicCountMinSketch(
+            header, pack_counters(list(row) for matrix in self.count
+                                  for row in matrix))
+
+    def copy(self):
+        """Return an in-memory copy of this sketch."""
+        sketch = DyadicCountMinSketch(self._delta, self._epsilon,
+                                      self.universe_bits, seeds=self.seeds,
+                                      cache_size=self.cache_size,
+                                      counter_type=self.counter_type)
+        for matrix, other_matrix in zip(sketch.count, self.count):
+            for row, other_row in zip(matrix, other_matrix):
+                row[:] = other_row
+        return sketch
+
+    def __or__(self, other):
+        sketch = self.copy()
+        sketch.merge(other)
+        return sketch
@@ -0,0 +1,512 @@
+# vim: set fileencoding=utf-8 :
+"""Read-only snapshots of sketches for serving queries.
+
+`freeze()` turns a bloom filter, cuckoo filter, count-min sketch, dyadic
+count-min sketch, HyperLogLog, KLL sketch or MinHash into a frozen sketch
+answering the same queries. A frozen sketch keeps its data in one contiguous
+buffer and precomputes everything that does not change anymore, like the top
+k of a count-min sketch or the cardinality of a HyperLogLog:
+
+    >>> frozen = cms.freeze()
+    >>> frozen.get_many(['www.google.com', 'www.yahoo.com'])
+    [13, 20]
+    >>> frozen.save('/var/lib/sketches/clicks.frozen')
+
+`load` maps a saved snapshot into memory instead of reading it. The data is
+read directly from the mapped file, so any number of processes share one
+copy through the page cache and loading takes constant time:
+
+    >>> frozen = load('/var/lib/sketches/clicks.frozen')
+    >>> frozen.get('www.google.com')
+    13
+
+A snapshot file starts with a magic string, the length of a pickled header
+holding the parameters, the header and the data aligned to 8 bytes. Counters
+are stored as little endian 64 bit integers, and the fingerprints of a cuckoo
+filter as the smallest unsigned integers holding them instead of bit fields.
+If NumPy is installed, `get_many`, `contains_many` and `jaccard_many` look up
+all keys with vectorized operations.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from bisect import bisect_left, bisect_right
+import mmap
+import pickle
+import struct
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from streamingds.kernels import hash_indices
+from streamingds.memory import sizeof
+
+
+_MAGIC = b'SDSFRZ01'
+_PREFIX = struct.Struct('<8sQ')
+_BYTE = struct.Struct('B')
+_COUNTER = struct.Struct('<q')
+
+
+def _align(n):
+    return (n + 7) & ~7
+
+
+class FrozenSketch(object):
+    """A read-only sketch whose data is `data[offset:]`, e.g. of a mapped
+    file."""
+
+    def __init__(self, header, data, offset=0):
+        self._header = header
+        self._data = data
+        self._offset = offset
+
+    @property
+    def nbytes(self):
+        return len(self._data) - self._offset
+
+    def dumps(self):
+        """Return the snapshot as bytes."""
+        header = pickle.dumps((type(self).__name__, self._header), 2)
+        start = _align(_PREFIX.size + len(header))
+        return b''.join([
+            _PREFIX.pack(_MAGIC, len(header)), header,
+            b'\0' * (start - _PREFIX.size - len(header)),
+            bytes(self._data[self._offset:])])
+
+    def save(self, path):
+        """Write the snapshot to the file `path`."""
+        with open(path, 'wb') as f:
+            f.write(self.dumps())
+
+    def __reduce__(self):
+        return loads, (self.dumps(), )
+
+    def memory_usage(self):
+        """Return the number of bytes used by this sketch. The pages of a
+        mapped file are not included, they are shared with other
+        processes."""
+        return sizeof(self)
+
+    def _numpy(self, dtype, count):
+        """Return the data as a NumPy array without copying it."""
+        if not hasattr(self, '_array'):
+            self._array = numpy.frombuffer(self._data, dtype=dtype,
+                                           count=count, offset=self._offset)
+        return self._array
+
+
+class FrozenBloomFilter(FrozenSketch):
+    """A read-only bloom filter."""
+
+    def __init__(self, header, data, offset=0):
+        super(FrozenBloomFilter, self).__init__(header, data, offset)
+        self.bits = header['bits']
+        self.num_hash_fns = header['num_hash_fns']
+        self.seeds = header['seeds']
+
+    def __contains__(self, key):
+        data = self._data
+        offset = self._offset
+        for bit in hash_indices(str(key), self.seeds, self.bits):
+            byte = _BYTE.unpack_from(data, offset + (bit >> 3))[0]
+            if not (byte >> (7 - (bit & 7))) & 1:
+                return False
+        return True
+
+    def contains_many(self, keys):
+        """Return for every key whether it is in the filter."""
+        if numpy is None:
+            return [key in self for key in keys]
+        bits = self._indices(keys)
+        data = self._numpy(numpy.uint8, (self.bits + 7) // 8)
+        values = (data[bits >> 3] >> (7 - (bits & 7))) & 1
+        return values.all(axis=1).tolist()
+
+    def _indices(self, keys):
+        seeds = self.seeds
+        bits = self.bits
+        return numpy.array([hash_indices(str(key), seeds, bits)
+                            for key in keys],
+                           dtype=numpy.int64).reshape(-1, self.num_hash_fns)
+
+    def fill_ratio(self):
+        """Return the fraction of bits that are set."""
+        return self._header['ones'] / self.bits
+
+    def __len__(self):
+        """Get the estimated number of elements in the filter."""
+        return self._header['length']
+
+
+def _fingerprint_type(fingerprint_bits):
+    """Return the struct format of the smallest unsigned integer holding a
+    fingerprint."""
+    for code in 'BHI':
+        if fingerprint_bits <= 8 * struct.calcsize(code):
+            return code
+    raise ValueError('fingerprints must have at most 32 bits')
+
+
+class FrozenCuckooFilter(FrozenSketch):
+    """A read-only cuckoo filter whose buckets are rows of fingerprints."""
+
+    def __init__(self, header, data, offset=0):
+        super(FrozenCuckooFilter, self).__init__(header, data, offset)
+        self.fingerprint_bits = header['fingerprint_bits']
+        self.bucket_size = header['bucket_size']
+        self.num_buckets = header['num_buckets']
+        self.seeds = header['seeds']
+        self._victim = header['victim']
+        self._type = _fingerprint_type(self.fingerprint_bits)
+        self._bucket = struct.Struct('<%d%s' % (self.bucket_size, self._type))
+
+    def _lookup(self, key):
+        """Return the fingerprint and both buckets of a key, the same as
+        `CuckooFilter`."""
+        h, f = hash_indices(str(key), self.seeds, 2 ** 32)
+        fingerprint = f % ((1 << self.fingerprint_bits) - 1) + 1
+        bucket = h % self.num_buckets
+        alternative = (((fingerprint * 0x5bd1e995) & 0xffffffff) - bucket) \
+            % self.num_buckets
+        return fingerprint, bucket, alternative
+
+    def __contains__(self, key):
+        fingerprint, bucket, alternative = self._lookup(key)
+        data = self._data
+        offset = self._offset
+        size = self._bucket.size
+        if fingerprint in self._bucket.unpack_from(data, offset +
+                                                   bucket * size) or \
+                fingerprint in self._bucket.unpack_from(data, offset +
+                                                        alternative * size):
+            return True
+        return self._victim in ((bucket, fingerprint),
+                                (alternative, fingerprint))
+
+    def contains_many(self, keys):
+        """Return for every key whether it is in the filter."""
+        if numpy is None:
+            return [key in self for key in keys]
+        seeds = self.seeds
+        n = self.num_buckets
+        hashes = numpy.array([hash_indices(str(key), seeds, 2 ** 32)
+                              for key in keys],
+                             dtype=numpy.int64).reshape(-1, 2)
+        fingerprints = hashes[:, 1] % ((1 << self.fingerprint_bits) - 1) + 1
+        buckets = hashes[:, 0] % n
+        alternatives = (((fingerprints * 0x5bd1e995) & 0xffffffff) -
+                        buckets) % n
+        table = self._numpy('<' + self._type,
+                            n * self.bucket_size).reshape(n, -1)
+        column = fingerprints[:, numpy.newaxis]
+        found = ((table[buckets] == column).any(axis=1) |
+                 (table[alternatives] == column).any(axis=1))
+        if self._victim is not None:
+            bucket, fingerprint = self._victim
+            found |= (fingerprints == fingerprint) & (
+                (buckets == bucket) | (alternatives == bucket))
+        return found.tolist()
+
+    def load_factor(self):
+        """Return the fraction of occupied slots."""
+        return self._header['count'] / (self.num_buckets * self.bucket_size)
+
+    def __len__(self):
+        """Get the number of keys in the filter."""
+        return self._header['count']
+
+
+class FrozenCountMinSketch(FrozenSketch):
+    """A read-only count-min sketch with a precomputed top k."""
+
+    def __init__(self, header, data, offset=0):
+        super(FrozenCountMinSketch, self).__init__(header, data, offset)
+        self.bits = header['bits']
+        self.num_hash_fns = header['num_hash_fns']
+        self.seeds = header['seeds']
+        self.k = header['k']
+        # pairs of estimates and keys, largest first
+        self.top = header['top']
+
+    def get(self, key):
+        """Return the estimated count of the key."""
+        data = self._data
+        offset = self._offset
+        bits = self.bits
+        return min(
+            _COUNTER.unpack_from(data, offset + 8 * (i * bits + h))[0]
+            for i, h in enumerate(hash_indices(str(key), self.seeds, bits)))
+
+    def get_many(self, keys):
+        """Return the estimated counts of all keys."""
+        if numpy is None:
+            return [self.get(key) for key in keys]
+        seeds = self.seeds
+        bits = self.bits
+        rows = self.num_hash_fns
+        counts = self._numpy('<i8', rows * bits).reshape(rows, bits)
+        indices = numpy.array([hash_indices(str(key), seeds, bits)
+                               for key in keys],
+                              dtype=numpy.int64).reshape(-1, rows)
+        return counts[numpy.arange(rows), indices].min(axis=1).tolist()
+
+    def get_ranking(self):
+        """Return the top k like `CountMinSketch.get_ranking`."""
+        return dict(enumerate(self.top))
+
+
+class FrozenDyadicCountMinSketch(FrozenSketch):
+    """A read-only dyadic count-min sketch storing the counters of all
+    levels one after another."""
+
+    def __init__(self, header, data, offset=0):
+        super(FrozenDyadicCountMinSketch, self).__init__(header, data, offset)
+        self.universe_bits = header['universe_bits']
+        self.bits = header['bits']
+        self.num_hash_fns = header['num_hash_fns']
+        self.seeds = header['seeds']
+        self.total = header['total']
+        self._exact_from = header['exact_from']
+        # the offset of the counters of every level
+        self._starts = []
+        start = offset
+        for level in range(self.universe_bits + 1):
+            self._starts.append(start)
+            if level >= self._exact_from:
+                start += 8 * 2 ** (self.universe_bits - level)
+            else:
+                start += 8 * self.bits * self.num_hash_fns
+
+    def _check_key(self, key):
+        if not 0 <= key < 2 ** self.universe_bits or key != int(key):
+            raise ValueError('keys must be integers between 0 and '
+                             '2 ** %d - 1' % self.universe_bits)
+        return int(key)
+
+    def _estimate(self, level, prefix):
+        data = self._data
+        start = self._starts[level]
+        if level >= self._exact_from:
+            return _COUNTER.unpack_from(data, start + 8 * prefix)[0]
+        bits = self.bits
+        return min(
+            _COUNTER.unpack_from(data, start + 8 * (i * bits + h))[0]
+            for i, h in enumerate(hash_indices('%d:%d' % (level, prefix),
+                                               self.seeds, bits)))
+
+    def get(self, key):
+        """Return the estimated count of `key`."""
+        return self._estimate(0, self._check_key(key))
+
+    def get_many(self, keys):
+        """Return the estimated counts of all keys."""
+        keys = [self._check_key(key) for key in keys]
+        if numpy is None:
+            return [self._estimate(0, key) for key in keys]
+        if self._exact_from == 0:
+            counts = self._numpy('<i8', 2 ** self.universe_bits)
+            return counts[numpy.array(keys, dtype=numpy.int64)].tolist()
+        seeds = self.seeds
+        bits = self.bits
+        rows = self.num_hash_fns
+        counts = self._numpy('<i8', rows * bits).reshape(rows, bits)
+        indices = numpy.array([hash_indices('0:%d' % key, seeds, bits)
+                               for key in keys],
+                              dtype=numpy.int64).reshape(-1, rows)
+        return counts[numpy.arange(rows), indices].min(axis=1).tolist()
+
+    def range_count(self, lo, hi):
+        """Return the estimated sum of the counts of all keys in
+        `[lo, hi]`, both inclusive."""
+        lo = max(int(lo), 0)
+        hi = min(int(hi), 2 ** self.universe_bits - 1)
+        result = 0
+        level = 0
+        while lo <= hi:
+            if lo & 1:
+                result += self._estimate(level, lo)
+                lo += 1
+            if not hi & 1:
+                result += self._estimate(level, hi)
+                hi -= 1
+            lo >>= 1
+            hi >>= 1
+            level += 1
+        return result
+
+    def heavy_hitters(self, phi):
+        """Return the keys whose estimated count is at least `phi` times the
+        total count as a list of `(key, estimate)` pairs, largest first."""
+        if not 0 < phi <= 1:
+            raise ValueError('phi must be between 0 and 1')
+        threshold = phi * self.total
+        if not threshold:
+            return []
+        heavy = [0]
+        for level in range(self.universe_bits - 1, -1, -1):
+            heavy = [child for prefix in heavy
+                     for child in (2 * prefix, 2 * prefix + 1)
+                     if self._estimate(level, child) >= threshold]
+        return sorted(((key, self._estimate(0, key)) for key in heavy),
+                      key=lambda item: (-item[1], item[0]))
+
+
+class FrozenHyperLogLog(FrozenSketch):
+    """A read-only HyperLogLog with a precomputed cardinality."""
+
+    def __init__(self, header, data, offset=0):
+        super(FrozenHyperLogLog, self).__init__(header, data, offset)
+        self._cardinality = header['cardinality']
+        self.error_rate = header['error_rate']
+
+    def cardinality(self):
+        return self._cardinality
+
+    def __len__(self):
+        return round(self._cardinality)
+
+
+class FrozenKLLSketch(FrozenSketch):
+    """A read-only KLL sketch storing its items sorted with their cumulative
+    weights."""
+
+    def __init__(self, header, data, offset=0):
+        super(FrozenKLLSketch, self).__init__(header, data, offset)
+        self.k = header['k']
+        self.count = header['count']
+        self.min = header['min']
+        self.max = header['max']
+        n = header['items']
+        self._items = list(struct.unpack_from('<%dd' % n, data, offset))
+        self._cumulative = list(struct.unpack_from('<%dq' % n, data,
+                                                   offset + 8 * n))
+
+    def rank(self, value):
+        """Return the estimated fraction of numbers less than or equal to
+        `value`."""
+        if not self.count:
+            raise ValueError('The sketch is empty')
+        i = bisect_right(self._items, value)
+        cumulative = self._cumulative
+        return cumulative[i - 1] / cumulative[-1] if i else 0.0
+
+    def quantile(self, q):
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        """Return the estimated quantiles for all fractions in `qs`."""
+        if not self.count:
+            raise ValueError('The sketch is empty')
+        items, cumulative = self._items, self._cumulative
+        result = []
+        for q in qs:
+            if not 0 <= q <= 1:
+                raise ValueError('q must be between 0 and 1')
+            if q == 0:
+                result.append(self.min)
+            elif q == 1:
+                result.append(self.max)
+            else:
+                i = bisect_left(cumulative, q * cumulative[-1])
+                result.append(items[min(i, len(items) - 1)])
+        return result
+
+    def __len__(self):
+        return self.count
+
+
+class FrozenMinHash(FrozenSketch):
+    """A read-only MinHash storing its densified signature."""
+
+    def __init__(self, header, data, offset=0):
+        super(FrozenMinHash, self).__init__(header, data, offset)
+        self.num_perm = header['num_perm']
+        self.seeds = header['seeds']
+        self._signature = struct.unpack_from('<%dQ' % self.num_perm, data,
+                                             offset)
+
+    def digest(self):
+        """Return the signature as a tuple of `num_perm` integers."""
+        return self._signature
+
+    def is_empty(self):
+        return self._header['empty']
+
+    def _check_compatible(self, other):
+        if self.num_perm != other.num_perm or \
+                list(self.seeds) != list(other.seeds):
+            raise ValueError("Can't compare MinHashes with different "
+                             "num_perm or seeds.")
+
+    def jaccard(self, other):
+        """Return the estimated Jaccard similarity with a `MinHash` or
+        another frozen one."""
+        self._check_compatible(other)
+        return sum(1 for a, b in zip(self._signature, other.digest())
+                   if a == b) / self.num_perm
+
+    def jaccard_many(self, others):
+        """Return the estimated Jaccard similarities with all MinHashes in
+        `others`."""
+        others = list(others)
+        for other in others:
+            self._check_compatible(other)
+        if numpy is None:
+            return [self.jaccard(other) for other in others]
+        signature = self._numpy('<u8', self.num_perm)
+        signatures = numpy.array([other.digest() for other in others],
+                                 dtype=numpy.uint64).reshape(-1,
+                                                             self.num_perm)
+        return ((signatures == signature).sum(axis=1) /
+                self.num_perm).tolist()
+
+
+_TYPES = dict((cls.__name__, cls) for cls in (
+    FrozenBloomFilter, FrozenCuckooFilter, FrozenCountMinSketch,
+    FrozenDyadicCountMinSketch, FrozenHyperLogLog, FrozenKLLSketch,
+    FrozenMinHash))
+
+
+def loads(data):
+    """Return the frozen sketch stored in the buffer `data`, which is not
+    copied."""
+    magic, length = _PREFIX.unpack_from(data, 0)
+    if magic != _MAGIC:
+        raise ValueError('Not a frozen sketch')
+    name, header = pickle.loads(
+        bytes(data[_PREFIX.size:_PREFIX.size + length]))
+    return _TYPES[name](header, data, _align(_PREFIX.size + length))
+
+
+def load(path):
+    """Map the snapshot saved to `path` into memory and return it."""
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return loads(data)
+
+
+def pack_counters(rows):
+    """Return the counters of all rows as little endian 64 bit integers."""
+    return b''.join(struct.pack('<%dq' % len(row), *row) for row in rows)
+
+
+def pack_fingerprints(fingerprints, fingerprint_bits):
+    """Return the fingerprints as little endian integers of the smallest
+    unsigned type holding `fingerprint_bits` bits."""
+    return struct.pack('<%d%s' % (len(fingerprints),
+                                  _fingerprint_type(fingerprint_bits)),
+                       *fingerprints)
+
+
+def pack_signature(signature):
+    """Return a MinHash signature as little endian 64 bit integers."""
+    return struct.pack('<%dQ' % len(signature), *signature)
+
+
+def pack_weighted(items, cumulative):
+    """Return the items as doubles followed by their cumulative weights."""
+    return struct.pack('<%dd%dq' % (len(items), len(cumulative)),
+                       *(list(items) + list(cumulative)))
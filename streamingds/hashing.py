@@ -2,10 +2,82 @@
 from __future__ import (absolute_import, division, print_function,
                         with_statement)
 
+from collections import namedtuple
 import random
 
-from cytoolz import juxt
-from pyhashxx import hashxx
+from streamingds.kernels import hash_indices
+from streamingds.memory import sizeof
+
+
+def generate_seeds(num_hash_fns, random_state=None):
+    """Return a list of `num_hash_fns` seeds for the hash functions.
+
+    Pass the same `random_state` (anything `random.Random` accepts as a seed)
+    to get the same seeds, and thus the same hash family, in different
+    processes.
+    """
+    rnd = random.Random(random_state) if random_state is not None else random
+    return [rnd.randint(0, 2 ** 32) for _ in range(num_hash_fns)]
+
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class HashCache(object):
+    """A bounded cache of hash values evicting keys with the CLOCK algorithm.
+
+    CLOCK approximates LRU without reordering entries on every hit: a hit only
+    sets the reference bit of the key's slot. To make room for a new key the
+    clock hand sweeps over the slots, clearing reference bits, and evicts the
+    first key that has not been referenced since the last sweep. New keys
+    start unreferenced, so keys seen only once are evicted first.
+
+    The cache may be shared by threads. Concurrent updates may evict the
+    wrong key or lose a hit or miss count, but never return wrong values.
+    """
+
+    def __init__(self, maxsize):
+        if maxsize < 1 or maxsize != int(maxsize):
+            raise ValueError('maxsize must be a positive integer')
+        self.maxsize = maxsize
+        self.clear()
+
+    def clear(self):
+        """Remove all keys and reset the statistics."""
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._slots = [None] * self.maxsize
+        self._referenced = bytearray(self.maxsize)
+        self._hand = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """Return the cached value of `key` or `None`."""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._referenced[entry[1]] = 1
+        return entry[0]
+
+    def put(self, key, value):
+        """Cache `value` for `key`, evicting another key if necessary."""
+        referenced = self._referenced
+        hand = self._hand
+        while referenced[hand]:
+            referenced[hand] = 0
+            hand = (hand + 1) % self.maxsize
+        self._hand = (hand + 1) % self.maxsize
+        self._entries.pop(self._slots[hand], None)
+        self._slots[hand] = key
+        self._entries[key] = (value, hand)
+
+    def info(self):
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self))
 
 
 class Hashing(object):
@@ -13,10 +85,24 @@ class Hashing(object):
     count-min sketch or bloomfilters.
     """
 
-    def __init__(self, num_hash_fns, bits):
-        """Initialize the array of `hashfunctions`."""
+    _cache = None
+
+    def __init__(self, num_hash_fns, bits, seeds=None, cache_size=0):
+        """Initialize the array of `hashfunctions`.
+
+        If `seeds` is given, it must contain one seed per hash function.
+        Sketches sharing `bits`, `num_hash_fns` and `seeds` hash every key to
+        the same positions and can therefore be merged.
+
+        With a `cache_size` the hash values of the most recently used keys
+        are cached, which pays off for skewed streams where a few keys make
+        up most of the updates and queries.
+        """
         self.bits = bits
         self.num_hash_fns = num_hash_fns
+        if seeds is not None:
+            self.seeds = seeds
+        self.cache_size = cache_size
 
     @property
     def bits(self):
@@ -25,6 +111,7 @@ class Hashing(object):
     @bits.setter
     def bits(self, value):
         self._bits = value
+        self.clear_cache()
 
     @property
     def num_hash_fns(self):
@@ -37,21 +124,67 @@ class Hashing(object):
     @property
     def seeds(self):
         if not hasattr(self, '_seeds'):
-            self._seeds = [random.randint(0, 2 ** 32)
-                           for _ in range(self.num_hash_fns)]
+            self._seeds = generate_seeds(self.num_hash_fns)
         return self._seeds
 
-    def _gen_hash_fn(self, seed, num_hash_fns):
-        return lambda x: hashxx(str(x), seed=seed) % self.bits
+    @seeds.setter
+    def seeds(self, value):
+        value = [int(seed) for seed in value]
+        if len(value) != self.num_hash_fns:
+            raise ValueError('expected %d seeds, got %d' % (
+                self.num_hash_fns, len(value)))
+        self._seeds = value
+        self.clear_cache()
 
     @property
-    def hash_functions(self):
-        if not hasattr(self, '_hash_functions'):
-            self._hash_functions = [
-                self._gen_hash_fn(s, self.num_hash_fns)
-                for s in self.seeds]
-        return self._hash_functions
+    def cache_size(self):
+        """The maximum number of keys whose hash values are cached, `0`
+        disables the cache."""
+        return self._cache.maxsize if self._cache is not None else 0
+
+    @cache_size.setter
+    def cache_size(self, value):
+        self._cache = HashCache(value) if value else None
+
+    def cache_info(self):
+        """Return the hits, misses, maximum and current size of the hash
+        cache, or `None` if it is disabled."""
+        return self._cache.info() if self._cache is not None else None
+
+    def clear_cache(self):
+        if self._cache is not None:
+            self._cache.clear()
 
     def hash_values(self, key):
         """Return the hashes for the given key."""
-        return juxt(self.hash_functions)(key)
+        key = str(key)
+        cache = self._cache
+        if cache is None:
+            return hash_indices(key, self.seeds, self.bits)
+        values = cache.get(key)
+        if values is None:
+            values = tuple(hash_indices(key, self.seeds, self.bits))
+            cache.put(key, values)
+        return values
+
+    def __getstate__(self):
+        # the hash cache is pickled empty
+        state = self.__dict__.copy()
+        if state.get('_cache') is not None:
+            state['_cache'] = HashCache(self._cache.maxsize)
+        return state
+
+    def memory_usage(self):
+        """Return the number of bytes used by this sketch, see
+        `streamingds.memory.sizeof`."""
+        return sizeof(self)
+
+    def _check_compatible(self, other):
+        """Raise a `ValueError` if `other` cannot be merged into `self`."""
+        if not isinstance(other, Hashing):
+            raise ValueError("Can't merge with %r." % type(other).__name__)
+        if (self.bits != other.bits or
+                self.num_hash_fns != other.num_hash_fns):
+            raise ValueError("Can't merge sketches with different sizes.")
+        if list(self.seeds) != list(other.seeds):
+            raise ValueError("Can't merge sketches with different seeds.")
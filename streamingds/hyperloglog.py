@@ -4,6 +4,10 @@ from __future__ import (absolute_import, division, print_function,
 import math
 from hashlib import sha1
 
+from streamingds.frozen import FrozenHyperLogLog
+from streamingds.kernels import hll_sums, hll_update
+from streamingds.memory import sizeof
+
 _ALPHA_VALUES = {
     4 : 0.673,
     5 : 0.697,
@@ -33,26 +37,55 @@ class HyperLogLog(object):
         self._p = p
         self._alpha = get_alpha(p)
         self._m = 1 << self._p
-        self._registers = [0] * self._m
+        self._registers = bytearray(self._m)
 
         self._max_bits = 64
 
+    @classmethod
+    def for_memory(cls, nbytes):
+        """
+            Returns the most accurate counter using at most `nbytes` bytes.
+        """
+        for p in range(16, 3, -1):
+            hll = cls(p)
+            if hll.memory_usage() <= nbytes:
+                return hll
+        raise ValueError('%d bytes are not enough' % nbytes)
+
     def add(self, *elements):
         """
             Adds all elements to the counter.
         """
+        self.add_many(elements)
+
+    def add_many(self, elements):
+        """
+            Adds all elements of the iterable to the counter.
+        """
+        self._add_hashes([self._hash(e) for e in elements])
 
-        for element in elements:
-            # convert to bytes, hash it, convert hash object to hexadecimal
-            # convert from hexadecimal to 64bit long.
-            x = long(sha1(bytes(element)).hexdigest()[:16], 16)
+    def _add_hashes(self, hashes):
+        """
+            Adds the elements with the given 64 bit hashes to the counter.
+        """
+        hll_update(self._registers, hashes, self._p)
 
-            j = x & (self._m - 1)
-            w = x >> self._p
+    def _hash(self, element):
+        """
+            Return the 64 bit hash of the element.
+        """
+        # convert to bytes, hash it, convert hash object to hexadecimal
+        # convert from hexadecimal to 64bit long.
+        return long(sha1(bytes(element)).hexdigest()[:16], 16)
 
-            # update the register if applicable
-            self._registers[j] = max(self._registers[j],
-                                     get_rho(w, self._max_bits - self._p))
+    def _register(self, x):
+        """
+            Return the register index and the value to store for the 64 bit
+            hash x.
+        """
+        j = x & (self._m - 1)
+        w = x >> self._p
+        return j, get_rho(w, self._max_bits - self._p)
 
     def merge(self, other):
         """
@@ -62,19 +95,18 @@ class HyperLogLog(object):
         if self._m != other._m:
             raise ValueError("Can't merge HLLs with different precisions.")
         else:
-            self._registers = [max(*x) for x in zip(self._registers,
-                                                    other._registers)]
+            self._registers[:] = bytearray(
+                max(*x) for x in zip(self._registers, other._registers))
 
     def cardinality(self):
         """
             Return the estimated number of unique elements the counter
             has seen so far.
         """
-        estimate = self._alpha * math.pow(self._m, 2) / sum(math.pow(2, -x) for x in self._registers)
+        total, empty_registers = hll_sums(self._registers)
+        estimate = self._alpha * math.pow(self._m, 2) / total
 
         if estimate <= 2.5 * self._m:
-            # get number of registers equal to zero
-            empty_registers = self._registers.count(0)
             if empty_registers != 0:
                 return self._linear_count(empty_registers)
             else:
@@ -112,5 +144,17 @@ class HyperLogLog(object):
     def __ne__(self, other):
         return not self.__eq__(other)
 
+    def freeze(self):
+        """Return a read-only snapshot with the cardinality computed once, see
+        `streamingds.frozen`."""
+        header = {'p': self._p, 'cardinality': self.cardinality(),
+                  'error_rate': self.error_rate}
+        return FrozenHyperLogLog(header, bytes(self._registers))
+
+    def memory_usage(self):
+        """Return the number of bytes used by this counter, see
+        `streamingds.memory.sizeof`."""
+        return sizeof(self)
+
     def __len__(self):
         return round(self.cardinality())
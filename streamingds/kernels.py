@@ -0,0 +1,28 @@
+# vim: set fileencoding=utf-8 :
+"""The inner loops of the sketches.
+
+The functions are implemented in Cython in `streamingds._speedups`. If the
+extension has not been built, e.g. on PyPy or without a compiler, the pure
+Python implementations in `streamingds._kernels` are used instead. Both
+return identical results, `COMPILED` tells which one is in use.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+try:
+    from streamingds._speedups import (add_to_rows, clear_bits, count_bits,
+                                       double_hash_indices, hash_indices,
+                                       hll_sums, hll_update, set_bits,
+                                       test_bits)
+    COMPILED = True
+except ImportError:
+    from streamingds._kernels import (add_to_rows, clear_bits, count_bits,
+                                      double_hash_indices, hash_indices,
+                                      hll_sums, hll_update, set_bits,
+                                      test_bits)
+    COMPILED = False
+
+
+__all__ = ['COMPILED', 'add_to_rows', 'clear_bits', 'count_bits',
+           'double_hash_indices', 'hash_indices', 'hll_sums', 'hll_update',
+           'set_bits', 'test_bits']
@@ -0,0 +1,231 @@
+# vim: set fileencoding=utf-8 :
+"""The KLL quantile sketch of Karnin, Lang and Liberty 2016.
+
+https://arxiv.org/abs/1603.05346
+
+The sketch keeps a hierarchy of compactors. Level `h` holds items that each
+represent `2 ** h` items of the stream. When the sketch is full, the first
+level exceeding its capacity is sorted and every other item, starting at a
+random offset, is promoted to the next level, the rest are discarded. The
+capacities shrink by a factor of 2/3 towards the lower levels, so the
+sketch keeps about `3 * k` items no matter how long the stream is.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from array import array
+from bisect import bisect_left, bisect_right
+import math
+import random
+
+from streamingds.frozen import FrozenKLLSketch, pack_weighted
+from streamingds.memory import sizeof
+
+
+class KLLSketch(object):
+    """A mergeable sketch estimating quantiles of a stream of numbers.
+
+    The rank error of a quantile is about 1.7% for the default `k` and
+    shrinks linearly with `k`.
+    """
+
+    def __init__(self, k=200, seed=None):
+        """Setup a new sketch.
+
+        :param k: the capacity of the top level, i.e. the accuracy of the
+                  sketch
+        :type k: int
+        :param seed: optional seed of the random number generator choosing
+                     which items are discarded
+        """
+        if k < 8 or k != int(k):
+            raise ValueError('k must be an integer of at least 8')
+        self.k = int(k)
+        self._random = random.Random(seed)
+        self._levels = [[]]
+        self._size = 0
+        self._max_size = self._capacity(0)
+        self.count = 0
+        self.min = None
+        self.max = None
+
+    def _capacity(self, h):
+        depth = len(self._levels) - h - 1
+        return int(math.ceil(self.k * (2 / 3) ** depth)) + 1
+
+    def _grow(self):
+        self._levels.append([])
+        self._max_size = sum(self._capacity(h)
+                             for h in range(len(self._levels)))
+
+    def add(self, value):
+        """Add a number to the sketch."""
+        self.add_many((value,))
+
+    def add_many(self, values):
+        """Add all numbers of an iterable or a NumPy array to the sketch."""
+        if hasattr(values, 'ravel'):
+            values = values.ravel().tolist()
+        values = [float(v) for v in values]
+        if not values:
+            return
+        self.count += len(values)
+        low, high = min(values), max(values)
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+
+        start = 0
+        while start < len(values):
+            room = max(1, self._max_size - self._size)
+            chunk = values[start:start + room]
+            self._levels[0].extend(chunk)
+            self._size += len(chunk)
+            start += len(chunk)
+            self._compress()
+
+    def _compress(self):
+        h = 0
+        while self._size >= self._max_size and h < len(self._levels):
+            if len(self._levels[h]) >= self._capacity(h):
+                if h + 1 == len(self._levels):
+                    self._grow()
+                self._compact(h)
+            h += 1
+
+    def _compact(self, h):
+        """Promote every other item of level `h` to level `h + 1`."""
+        level = self._levels[h]
+        level.sort()
+        keep = [level.pop()] if len(level) % 2 else []
+        promoted = level[self._random.randint(0, 1)::2]
+        self._levels[h] = keep
+        self._levels[h + 1].extend(promoted)
+        self._size -= len(level) - len(promoted)
+
+    def merge(self, other):
+        """Merge the other sketch into this one.
+
+        Both sketches must have been created with the same `k`.
+        """
+        if not isinstance(other, KLLSketch) or self.k != other.k:
+            raise ValueError("Can't merge sketches with different k.")
+        if not other.count:
+            return
+        while len(self._levels) < len(other._levels):
+            self._grow()
+        for h, level in enumerate(other._levels):
+            self._levels[h].extend(level)
+        self._size = sum(len(level) for level in self._levels)
+        self.count += other.count
+        self.min = (other.min if self.min is None
+                    else min(self.min, other.min))
+        self.max = (other.max if self.max is None
+                    else max(self.max, other.max))
+        self._compress()
+
+    def copy(self):
+        """Return a copy of this sketch."""
+        sketch = KLLSketch(self.k)
+        sketch.__setstate__(self.__getstate__())
+        return sketch
+
+    def __or__(self, other):
+        sketch = self.copy()
+        sketch.merge(other)
+        return sketch
+
+    def _weighted(self):
+        """Return the sorted items and their cumulative weights."""
+        items = sorted((item, 1 << h) for h, level in enumerate(self._levels)
+                       for item in level)
+        cumulative = []
+        total = 0
+        for _, weight in items:
+            total += weight
+            cumulative.append(total)
+        return [item for item, _ in items], cumulative
+
+    def rank(self, value):
+        """Return the estimated fraction of numbers less than or equal to
+        `value`."""
+        if not self.count:
+            raise ValueError('The sketch is empty')
+        items, cumulative = self._weighted()
+        i = bisect_right(items, value)
+        return cumulative[i - 1] / cumulative[-1] if i else 0.0
+
+    def quantile(self, q):
+        """Return the estimated `q`-quantile, e.g. `quantile(0.99)` is the
+        99th percentile."""
+        return self.quantiles([q])[0]
+
+    def quantiles(self, qs):
+        """Return the estimated quantiles for all fractions in `qs`."""
+        if not self.count:
+            raise ValueError('The sketch is empty')
+        items, cumulative = self._weighted()
+        result = []
+        for q in qs:
+            if not 0 <= q <= 1:
+                raise ValueError('q must be between 0 and 1')
+            if q == 0:
+                result.append(self.min)
+            elif q == 1:
+                result.append(self.max)
+            else:
+                i = bisect_left(cumulative, q * cumulative[-1])
+                result.append(items[min(i, len(items) - 1)])
+        return result
+
+    def __len__(self):
+        """Get the number of numbers added to the sketch."""
+        return self.count
+
+    def freeze(self):
+        """Return a read-only snapshot keeping the items sorted with their
+        cumulative weights, see `streamingds.frozen`."""
+        items, cumulative = self._weighted()
+        header = {'k': self.k, 'count': self.count, 'min': self.min,
+                  'max': self.max, 'items': len(items)}
+        return FrozenKLLSketch(header, pack_weighted(items, cumulative))
+
+    def memory_usage(self):
+        """Return the number of bytes used by this sketch, see
+        `streamingds.memory.sizeof`."""
+        return sizeof(self)
+
+    def __getstate__(self):
+        # store the items as packed doubles, about 8 bytes per item
+        return {
+            'k': self.k,
+            'count': self.count,
+            'min': self.min,
+            'max': self.max,
+            'levels': [_pack(level) for level in self._levels],
+        }
+
+    def __setstate__(self, state):
+        self.k = state['k']
+        self._random = random.Random()
+        self._levels = [_unpack(level) for level in state['levels']]
+        self._size = sum(len(level) for level in self._levels)
+        self._max_size = sum(self._capacity(h)
+                             for h in range(len(self._levels)))
+        self.count = state['count']
+        self.min = state['min']
+        self.max = state['max']
+
+
+def _pack(level):
+    packed = array('d', level)
+    return packed.tobytes() if hasattr(packed, 'tobytes') else \
+        packed.tostring()
+
+
+def _unpack(data):
+    level = array('d')
+    if hasattr(level, 'frombytes'):
+        level.frombytes(data)
+    else:
+        level.fromstring(data)
+    return level.tolist()
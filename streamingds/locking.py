@@ -0,0 +1,113 @@
+# vim: set fileencoding=utf-8 :
+"""Lock striping for concurrently updated sketches.
+
+Instead of one lock around a whole sketch, every slot of the underlying array
+(a counter or a byte of bits) is guarded by one of a fixed number of locks.
+Updates touching different stripes do not contend with each other.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from collections import defaultdict
+from contextlib import contextmanager
+
+
+class StripedLock(object):
+    """A fixed number of locks guarding the slots of an array.
+
+    Slot `i` is guarded by lock `i % stripes`. `lock_factory` creates the
+    locks, e.g. `threading.Lock` or `multiprocessing.Lock`.
+    """
+
+    def __init__(self, stripes, lock_factory):
+        if stripes < 1:
+            raise ValueError('stripes must be a positive integer')
+        self._locks = [lock_factory() for _ in range(stripes)]
+
+    def __len__(self):
+        return len(self._locks)
+
+    def __getitem__(self, index):
+        """Return the lock guarding slot `index`."""
+        return self._locks[index % len(self._locks)]
+
+    def group(self, indices, shift=0):
+        """Group `indices` by stripe.
+
+        Returns a list of `(lock, indices)` pairs ordered by stripe, so a
+        batch can acquire every lock once and always in the same order. With
+        `shift` the indices are mapped to slots by `index >> shift` first,
+        e.g. `shift=3` guards bit indices by the byte containing them.
+        """
+        stripes = len(self._locks)
+        groups = defaultdict(list)
+        for index in indices:
+            groups[(index >> shift) % stripes].append(index)
+        return [(self._locks[stripe], groups[stripe])
+                for stripe in sorted(groups)]
+
+    @contextmanager
+    def all(self):
+        """Hold every lock, e.g. while reading or replacing the whole
+        array."""
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            yield
+        finally:
+            for lock in reversed(self._locks):
+                lock.release()
+
+
+class StripedCountersMixin(object):
+    """Count-min sketch updates guarded by the `StripedLock` in `_locks`.
+
+    Counter `count[i][h]` is slot `i * bits + h` of the lock. If `_locks` is
+    `None` the counters are updated without locking.
+    """
+
+    def _increment(self, hashes, increment):
+        """Increment the counters at `hashes` and return the new
+        estimate."""
+        count = self.count
+        width = self.bits
+        locks = self._locks
+        est = None
+        for i, h in enumerate(hashes):
+            row = count[i]
+            if locks is None:
+                row[h] += increment
+            else:
+                with locks[i * width + h]:
+                    row[h] += increment
+            est = row[h] if est is None else min(est, row[h])
+        return est
+
+    def _increment_many(self, increments):
+        """Increment the counters of every key in the `increments` mapping
+        by its value acquiring every stripe at most once."""
+        width = self.bits
+        cells = defaultdict(int)
+        for key, increment in increments.items():
+            for i, h in enumerate(self.hash_values(key)):
+                cells[i * width + h] += increment
+
+        if self._locks is None:
+            self._add_cells(cells, cells)
+            return
+        for lock, group in self._locks.group(cells):
+            with lock:
+                self._add_cells(cells, group)
+
+    def _add_cells(self, cells, group):
+        count = self.count
+        width = self.bits
+        for cell in group:
+            count[cell // width][cell % width] += cells[cell]
+
+    def merge(self, other):
+        if self._locks is None:
+            super(StripedCountersMixin, self).merge(other)
+            return
+        with self._locks.all():
+            super(StripedCountersMixin, self).merge(other)
@@ -0,0 +1,74 @@
+# vim: set fileencoding=utf-8 :
+"""Measure the memory used by sketches and size them to a memory budget.
+
+`sizeof` adds up `sys.getsizeof` of an object and of everything it refers
+to: the attributes of instances and the items of lists, tuples, dicts and
+sets. Objects shared by the whole interpreter, like small integers, `None`
+and the attribute names of instances, are not counted, and objects reached
+several times are counted once. Buffers of `ctypes` arrays, e.g. shared
+memory, are counted with their full size.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import ctypes
+import math
+import sys
+import types
+
+
+# objects the interpreter shares with everybody
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType,
+                 types.BuiltinFunctionType, type(None), bool)
+
+
+def sizeof(obj, *exclude):
+    """Return the number of bytes used by `obj` and the objects it refers
+    to, without the objects in `exclude` and the objects they refer to."""
+    seen = set(id(o) for o in exclude)
+    total = 0
+    stack = [obj]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED_TYPES):
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, int) and -5 <= obj <= 256:
+            continue
+        if isinstance(obj, ctypes.Array):
+            total += ctypes.sizeof(obj)
+        total += sys.getsizeof(obj)
+
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, (list, tuple, set, frozenset)):
+            stack.extend(obj)
+        elif hasattr(obj, '__dict__'):
+            # attribute names are interned and shared with the class
+            seen.add(id(obj.__dict__))
+            total += sys.getsizeof(obj.__dict__)
+            stack.extend(obj.__dict__.values())
+    return total
+
+
+def smallest_fitting(nbytes, make, low, high):
+    """Return the smallest parameter `x` between `low` and `high` for which
+    `make(x).memory_usage()` fits into `nbytes`.
+
+    The memory used must not grow with `x`, e.g. the error rate of a bloom
+    filter. The parameter is searched on a log scale. Raises a `ValueError`
+    if `make(high)` does not fit.
+    """
+    if make(high).memory_usage() > nbytes:
+        raise ValueError('%d bytes are not enough' % nbytes)
+    if make(low).memory_usage() <= nbytes:
+        return low
+    low, high = math.log(low), math.log(high)
+    for _ in range(40):
+        middle = (low + high) / 2
+        if make(math.exp(middle)).memory_usage() <= nbytes:
+            high = middle
+        else:
+            low = middle
+    return math.exp(high)
@@ -0,0 +1,278 @@
+# vim: set fileencoding=utf-8 :
+"""Optional instrumentation of the sketches' hot paths.
+
+Instrumentation is switched on for the whole process with `enable(sink)`. It
+wraps the methods of the sketch classes with timers and counters and reports
+every measurement to the sink, a callable receiving `(kind, name, value)`
+where `kind` is one of `'timing'` (seconds), `'counter'` or `'gauge'`:
+
+    >>> registry = Registry()
+    >>> enable(registry)
+    >>> cms.update('www.google.com')
+    >>> registry.snapshot()['timings']['CountMinSketch.update']['count']
+    1
+    >>> disable()
+
+`disable()` restores the original methods, so disabled instrumentation costs
+nothing at all. Timings are named `<class>.<method>` after the class of the
+instance, e.g. `RedisBloomFilter.add`. Subclasses overriding a measured
+method, e.g. the thread-safe and Redis backed sketches, are instrumented as
+well if they are imported when `enable` is called. A method calling the
+method it overrides is measured once. Measured are
+
+* hashing (`<class>.hash_values`),
+* updates and queries of bloom and cuckoo filters, count-min sketches,
+  HyperLogLogs and KLL sketches,
+* the churn of the count-min sketch's top k heap (`Heap.push`,
+  `Heap.pushpop` and `Heap.remove` counters),
+* Redis round trips (`redis.commands` and `redis.pipelines` counters and the
+  `redis.pipeline_size` gauge). These patch the `redis` client and hence
+  count the commands of every Redis client in the process.
+
+Gauges describing the state of a sketch, e.g. the fill ratio of a bloom
+filter or the hit count of the hash cache, are reported on demand with
+`report(sketch, name, sink)`.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from functools import wraps
+from importlib import import_module
+import socket
+import threading
+from timeit import default_timer
+
+
+TIMED = [
+    ('streamingds.hashing', 'Hashing', ['hash_values']),
+    ('streamingds.bloomfilter', 'BloomFilter',
+     ['add', 'add_many', '__contains__', 'merge']),
+    ('streamingds.countingbloomfilter', 'CountingBloomFilter', ['remove']),
+    ('streamingds.cuckoofilter', 'CuckooFilter',
+     ['add', 'add_many', '__contains__', 'remove']),
+    ('streamingds.countminsketch', 'CountMinSketch',
+     ['update', 'update_many', 'get', 'update_heap', 'merge']),
+    ('streamingds.hyperloglog', 'HyperLogLog',
+     ['add_many', 'cardinality', 'merge']),
+    ('streamingds.kll', 'KLLSketch', ['add_many', 'quantiles', 'merge']),
+    ('streamingds.minhash', 'MinHash', ['add_many', 'digest']),
+    ('streamingds.minhash', 'MinHashLSH', ['insert', 'query']),
+]
+
+COUNTED = [
+    ('streamingds.heap', 'Heap', ['push', 'pushpop', 'remove']),
+]
+
+_lock = threading.Lock()
+_patched = []
+# the methods being measured by each thread, so overridden methods called
+# with `super` are not measured again
+_running = threading.local()
+
+
+def _outermost(self, name):
+    """Return the key of a measured call of `self.name` or `None` if the
+    call is nested in one of the same method."""
+    running = _running.__dict__.setdefault('calls', set())
+    key = (id(self), name)
+    if key in running:
+        return None
+    running.add(key)
+    return key
+
+
+def _timed(method, sink):
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = _outermost(self, name)
+        if key is None:
+            return method(self, *args, **kwargs)
+        start = default_timer()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _running.calls.discard(key)
+            sink('timing', '%s.%s' % (type(self).__name__, name),
+                 default_timer() - start)
+    return wrapper
+
+
+def _counted(method, sink):
+    name = method.__name__
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = _outermost(self, name)
+        if key is None:
+            return method(self, *args, **kwargs)
+        sink('counter', '%s.%s' % (type(self).__name__, name), 1)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _running.calls.discard(key)
+    return wrapper
+
+
+def _redis_command(method, sink):
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        sink('counter', 'redis.commands', 1)
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _redis_pipeline(method, sink):
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        sink('counter', 'redis.pipelines', 1)
+        sink('gauge', 'redis.pipeline_size', len(self.command_stack))
+        return method(self, *args, **kwargs)
+    return wrapper
+
+
+def _subclasses(cls):
+    """Return `cls` and all its imported subclasses."""
+    classes = [cls]
+    for subclass in cls.__subclasses__():
+        classes.extend(c for c in _subclasses(subclass) if c not in classes)
+    return classes
+
+
+def _targets():
+    for targets, wrap in ((TIMED, _timed), (COUNTED, _counted)):
+        seen = set()
+        for module, cls, methods in targets:
+            classes = _subclasses(getattr(import_module(module), cls))
+            for method in methods:
+                for cls in classes:
+                    if method in cls.__dict__ and (cls, method) not in seen:
+                        seen.add((cls, method))
+                        yield cls, method, wrap
+
+    try:
+        from redis import client
+    except ImportError:
+        return
+    pipeline = getattr(client, 'BasePipeline', client.Pipeline)
+    yield client.StrictRedis, 'execute_command', _redis_command
+    yield pipeline, 'execute', _redis_pipeline
+
+
+def enable(sink):
+    """Report measurements of all sketches to `sink`."""
+    with _lock:
+        _disable()
+        for cls, method, wrap in _targets():
+            original = cls.__dict__[method]
+            _patched.append((cls, method, original))
+            setattr(cls, method, wrap(original, sink))
+
+
+def disable():
+    """Restore the uninstrumented methods."""
+    with _lock:
+        _disable()
+
+
+def _disable():
+    while _patched:
+        cls, method, original = _patched.pop()
+        setattr(cls, method, original)
+
+
+def is_enabled():
+    return bool(_patched)
+
+
+def report(sketch, name, sink):
+    """Report gauges describing the state of `sketch` as `<name>.<gauge>`."""
+    gauges = {}
+    if hasattr(sketch, 'fill_ratio'):
+        gauges['fill_ratio'] = sketch.fill_ratio()
+        gauges['estimated_error_rate'] = sketch.estimated_error_rate()
+    if hasattr(sketch, 'top_est'):
+        gauges['heap_size'] = len(sketch.heap)
+        gauges['top_keys'] = len(sketch.known_keys)
+    if hasattr(sketch, 'cardinality'):
+        gauges['cardinality'] = sketch.cardinality()
+    cache_info = getattr(sketch, 'cache_info', lambda: None)()
+    if cache_info is not None:
+        gauges['hash_cache_hits'] = cache_info.hits
+        gauges['hash_cache_misses'] = cache_info.misses
+        gauges['hash_cache_size'] = cache_info.currsize
+    for gauge, value in sorted(gauges.items()):
+        sink('gauge', '%s.%s' % (name, gauge), value)
+
+
+class Registry(object):
+    """A sink aggregating all measurements in memory.
+
+    Counters are summed up, timings are aggregated to count, total, minimum
+    and maximum and gauges keep their last value.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._counters = {}
+            self._timings = {}
+            self._gauges = {}
+
+    def __call__(self, kind, name, value):
+        with self._lock:
+            if kind == 'counter':
+                self._counters[name] = self._counters.get(name, 0) + value
+            elif kind == 'timing':
+                timing = self._timings.get(name)
+                if timing is None:
+                    self._timings[name] = [1, value, value, value]
+                else:
+                    timing[0] += 1
+                    timing[1] += value
+                    timing[2] = min(timing[2], value)
+                    timing[3] = max(timing[3], value)
+            else:
+                self._gauges[name] = value
+
+    def snapshot(self):
+        """Return a copy of all aggregated measurements."""
+        with self._lock:
+            timings = dict((name, {'count': count, 'total': total,
+                                   'min': low, 'max': high,
+                                   'mean': total / count})
+                           for name, (count, total, low, high)
+                           in self._timings.items())
+            return {'counters': dict(self._counters),
+                    'timings': timings,
+                    'gauges': dict(self._gauges)}
+
+
+class StatsdSink(object):
+    """A sink sending every measurement to a StatsD server via UDP.
+
+    Timings are sent in milliseconds. Packets are sent without waiting for
+    an answer, lost packets are not reported.
+    """
+
+    _TYPES = {'counter': 'c', 'timing': 'ms', 'gauge': 'g'}
+
+    def __init__(self, host='localhost', port=8125, prefix='streamingds'):
+        self._address = (host, port)
+        self._prefix = prefix + '.' if prefix else ''
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def __call__(self, kind, name, value):
+        if kind == 'timing':
+            value *= 1000
+        line = '%s%s:%s|%s' % (self._prefix, name, value, self._TYPES[kind])
+        try:
+            self._socket.sendto(line.encode('ascii'), self._address)
+        except socket.error:
+            pass
@@ -0,0 +1,297 @@
+# vim: set fileencoding=utf-8 :
+"""MinHash signatures with one permutation hashing and an LSH index.
+
+A `MinHash` estimates the Jaccard similarity of sets, e.g. of the shingles
+of two documents, by comparing short signatures. Classic MinHash hashes every
+element with `num_perm` hash functions. One permutation hashing (Li, Owen and
+Zhang 2012) hashes every element only once: the hash selects one of
+`num_perm` bins and the bin keeps the minimum of the remaining hash bits.
+Bins that stay empty, which happens for small sets, are filled by optimal
+densification (Shrivastava 2017): an empty bin copies the value of a bin
+chosen by a hash of its index, rehashing until a non-empty bin is found.
+The bins probed by every empty bin only depend on the seeds and `num_perm`,
+so they are computed once and shared by all MinHashes using them, and the
+signature is kept until the next change.
+
+`add_many` hashes every element once and, with NumPy installed, reduces
+large batches into the bins in one step.
+
+`MinHashLSH` indexes signatures by bands of `rows` values each, so near
+duplicates of a signature are found without comparing it to every other
+signature:
+
+    >>> lsh = MinHashLSH(threshold=0.8, num_perm=128)
+    >>> for url, shingles in pages:
+    ...     lsh.insert(url, MinHash.of(shingles, seeds=SEEDS))
+    >>> lsh.query(MinHash.of(new_shingles, seeds=SEEDS))
+    set(['http://example.com/a'])
+
+All signatures compared or indexed together must use the same `num_perm`
+and seeds.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from collections import defaultdict
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from streamingds.frozen import FrozenMinHash, pack_signature
+from streamingds.hashing import HashCache, Hashing
+from streamingds.kernels import hash_indices
+from streamingds.memory import sizeof
+
+
+# larger than every bin value, marks empty bins
+_EMPTY = 2 ** 32
+
+# batches of at least this size are reduced with numpy
+_NUMPY_BATCH = 64
+
+# the densification probes of the most recently used seeds and num_perm
+_PROBES = HashCache(32)
+
+
+def _probes(seeds, num_perm):
+    """Return the lists of bins probed to fill each empty bin, extended by
+    `MinHash._densify` as needed."""
+    key = (tuple(seeds), num_perm)
+    probes = _PROBES.get(key)
+    if probes is None:
+        probes = [[] for _ in range(num_perm)]
+        _PROBES.put(key, probes)
+    return probes
+
+
+class MinHash(Hashing):
+    """A one permutation MinHash of a set of elements."""
+
+    # the signature returned by `digest` until the bins change
+    _digest = None
+
+    def __init__(self, num_perm=128, seeds=None, cache_size=0):
+        """Setup an empty MinHash.
+
+        :param num_perm: the number of bins, i.e. the length of the
+                         signature. The standard error of the Jaccard
+                         estimate is about `1 / sqrt(num_perm)`
+        :type num_perm: int
+        :param seeds: optional seed of the hash function, a list with one
+                      element
+        :type seeds: list
+        :param cache_size: number of elements whose hash values are cached,
+                           see `Hashing`
+        :type cache_size: int
+        """
+        if num_perm < 1 or num_perm != int(num_perm):
+            raise ValueError('num_perm must be a positive integer')
+        self.num_perm = int(num_perm)
+        self._bins = [_EMPTY] * self.num_perm
+        super(MinHash, self).__init__(1, 2 ** 32, seeds, cache_size)
+
+    @classmethod
+    def of(cls, elements, num_perm=128, seeds=None):
+        """Return the MinHash of all `elements`."""
+        minhash = cls(num_perm, seeds)
+        minhash.add_many(elements)
+        return minhash
+
+    @classmethod
+    def bulk(cls, sets, num_perm=128, seeds=None):
+        """Return the MinHashes of all sets of elements in `sets`, hashed
+        with the same seeds."""
+        if seeds is None:
+            seeds = cls(num_perm).seeds
+        return [cls.of(elements, num_perm, seeds) for elements in sets]
+
+    def add(self, element):
+        """Add an element to the set."""
+        h = self.hash_values(element)[0]
+        k = self.num_perm
+        self._digest = None
+        value = h // k
+        if value < self._bins[h % k]:
+            self._bins[h % k] = value
+
+    def add_many(self, elements):
+        """Add all elements to the set hashing each of them once."""
+        hash_values = self.hash_values
+        hashes = [hash_values(element)[0] for element in elements]
+        k = self.num_perm
+        self._digest = None
+        if numpy is not None and len(hashes) >= _NUMPY_BATCH:
+            hashes = numpy.array(hashes, dtype=numpy.uint64)
+            width = numpy.uint64(k)
+            bins = numpy.array(self._bins, dtype=numpy.uint64)
+            numpy.minimum.at(bins, (hashes % width).astype(numpy.intp),
+                             hashes // width)
+            self._bins = [int(b) for b in bins]
+            return
+        bins = self._bins
+        for h in hashes:
+            value = h // k
+            if value < bins[h % k]:
+                bins[h % k] = value
+
+    def _densify(self, i, probes):
+        """Return the value of empty bin `i`."""
+        bins = self._bins
+        sequence = probes[i]
+        attempt = 0
+        while True:
+            if attempt == len(sequence):
+                # replaced rather than appended to, so concurrent readers
+                # never see a partial sequence
+                sequence = sequence + [
+                    hash_indices('%d:%d' % (i, a), self.seeds,
+                                 self.num_perm)[0]
+                    for a in range(attempt, 2 * attempt + 8)]
+                probes[i] = sequence
+            j = sequence[attempt]
+            if bins[j] != _EMPTY:
+                return bins[j]
+            attempt += 1
+
+    def digest(self):
+        """Return the signature as a tuple of `num_perm` integers."""
+        if self._digest is None:
+            bins = self._bins
+            if self.is_empty():
+                self._digest = tuple(bins)
+            else:
+                probes = _probes(self.seeds, self.num_perm)
+                self._digest = tuple(
+                    b if b != _EMPTY else self._densify(i, probes)
+                    for i, b in enumerate(bins))
+        return self._digest
+
+    def is_empty(self):
+        return all(b == _EMPTY for b in self._bins)
+
+    def jaccard(self, other):
+        """Return the estimated Jaccard similarity of both sets."""
+        self._check_compatible(other)
+        return jaccard(self.digest(), other.digest())
+
+    def merge(self, other):
+        """Merge the other MinHash into this one, i.e. build the MinHash of
+        the union of both sets."""
+        self._check_compatible(other)
+        self._bins = [min(a, b) for a, b in zip(self._bins, other._bins)]
+        self._digest = None
+
+    def freeze(self):
+        """Return a read-only snapshot of the densified signature, see
+        `streamingds.frozen`."""
+        header = {'num_perm': self.num_perm, 'seeds': list(self.seeds),
+                  'empty': self.is_empty()}
+        return FrozenMinHash(header, pack_signature(self.digest()))
+
+    def copy(self):
+        minhash = MinHash(self.num_perm, seeds=self.seeds,
+                          cache_size=self.cache_size)
+        minhash._bins = list(self._bins)
+        return minhash
+
+    def __or__(self, other):
+        minhash = self.copy()
+        minhash.merge(other)
+        return minhash
+
+    def _check_compatible(self, other):
+        super(MinHash, self)._check_compatible(other)
+        if self.num_perm != other.num_perm:
+            raise ValueError("Can't compare MinHashes with different "
+                             "num_perm.")
+
+
+def jaccard(signature, other):
+    """Return the fraction of equal values of two signatures."""
+    if len(signature) != len(other):
+        raise ValueError("Can't compare signatures of different lengths.")
+    return sum(1 for a, b in zip(signature, other) if a == b) / len(signature)
+
+
+def optimal_bands(threshold, num_perm):
+    """Return the `(bands, rows)` with `bands * rows <= num_perm` whose
+    similarity threshold `(1 / bands) ** (1 / rows)` is closest to
+    `threshold`."""
+    candidates = [(b, num_perm // b) for b in range(1, num_perm + 1)]
+    return min(candidates,
+               key=lambda c: abs((1 / c[0]) ** (1 / c[1]) - threshold))
+
+
+class MinHashLSH(object):
+    """An index returning the keys of signatures similar to a query.
+
+    The signatures are split into `bands` bands of `rows` values. Two
+    signatures become candidates if all values of at least one band agree,
+    which happens with probability `1 - (1 - s ** rows) ** bands` for sets
+    with Jaccard similarity `s`. By default `bands` and `rows` are chosen so
+    this probability rises steepest at about `threshold`.
+    """
+
+    def __init__(self, threshold=0.8, num_perm=128, bands=None, rows=None):
+        if not 0 < threshold < 1:
+            raise ValueError('threshold must be between 0 and 1')
+        if bands is None or rows is None:
+            bands, rows = optimal_bands(threshold, num_perm)
+        if bands * rows > num_perm:
+            raise ValueError('bands * rows must not exceed num_perm')
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = rows
+        self._tables = [defaultdict(set) for _ in range(bands)]
+        self._keys = {}
+
+    def _bands(self, minhash):
+        signature = (minhash.digest()
+                     if isinstance(minhash, (MinHash, FrozenMinHash))
+                     else tuple(minhash))
+        if len(signature) != self.num_perm:
+            raise ValueError('expected a signature of length %d' %
+                             self.num_perm)
+        rows = self.rows
+        return [signature[i * rows:(i + 1) * rows]
+                for i in range(self.bands)]
+
+    def insert(self, key, minhash):
+        """Index the MinHash or signature under `key`."""
+        if key in self._keys:
+            raise ValueError('key %r already exists' % (key, ))
+        bands = self._bands(minhash)
+        for table, band in zip(self._tables, bands):
+            table[band].add(key)
+        self._keys[key] = bands
+
+    def query(self, minhash):
+        """Return the keys of all candidates similar to the MinHash or
+        signature."""
+        candidates = set()
+        for table, band in zip(self._tables, self._bands(minhash)):
+            candidates.update(table.get(band, ()))
+        return candidates
+
+    def remove(self, key):
+        """Remove `key` from the index."""
+        bands = self._keys.pop(key)
+        for table, band in zip(self._tables, bands):
+            keys = table[band]
+            keys.discard(key)
+            if not keys:
+                del table[band]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def memory_usage(self):
+        """Return the number of bytes used by this index, see
+        `streamingds.memory.sizeof`."""
+        return sizeof(self)
+
+    def __len__(self):
+        return len(self._keys)
@@ -0,0 +1,248 @@
+# vim: set fileencoding=utf-8 :
+"""Feed large inputs into sketches using a pool of processes.
+
+Every worker process builds its own sketch by calling a `factory` and feeds
+its share of the input into it using the sketch's batch method. The partial
+sketches are sent back to the parent and merged into the final result, so
+the factory has to create mergeable sketches, i.e. sketches sharing the same
+parameters and seeds:
+
+    >>> from functools import partial
+    >>> from streamingds.countminsketch import CountMinSketch
+    >>> from streamingds.hashing import generate_seeds
+    >>> seeds = generate_seeds(17, random_state=42)
+    >>> factory = partial(CountMinSketch, 10 ** -7, 0.005, 50, seeds=seeds)
+    >>> cms = ingest_file(factory, '/var/log/access.log', processes=8)
+
+The factory, the `key` function and the records must be picklable, i.e. use
+module level functions or `functools.partial` objects instead of lambdas.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from itertools import islice
+import multiprocessing
+import os
+import traceback
+
+try:
+    from Queue import Empty, Full
+except ImportError:
+    from queue import Empty, Full
+
+
+# seconds between checks whether the workers are still alive
+_POLL_INTERVAL = 0.1
+
+
+def batch_method(sketch):
+    """Return the method feeding a batch of items into `sketch`."""
+    for name in ('update_many', 'add_many'):
+        method = getattr(sketch, name, None)
+        if method is not None:
+            return method
+    raise TypeError('%s has no batch method' % type(sketch).__name__)
+
+
+def chunks(iterable, chunk_size):
+    """Split `iterable` into lists of at most `chunk_size` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def merge_all(sketches):
+    """Merge all `sketches` into the first one and return it."""
+    sketches = iter(sketches)
+    result = next(sketches)
+    for sketch in sketches:
+        result.merge(sketch)
+    return result
+
+
+def _feed(sketch, items, key, expand=None):
+    if expand is not None:
+        items = [k for item in items for k in expand(item)]
+    elif key is not None:
+        items = [key(i) for i in items]
+    batch_method(sketch)(items)
+
+
+def _consume_queue(factory, key, tasks, results, expand=None):
+    """Worker feeding all chunks from `tasks` into a new sketch."""
+    error = None
+    try:
+        sketch = factory()
+    except Exception:
+        error = traceback.format_exc()
+    for chunk in iter(tasks.get, None):
+        if error is not None:
+            # keep draining the queue so the producer does not block
+            continue
+        try:
+            _feed(sketch, chunk, key, expand)
+        except Exception:
+            error = traceback.format_exc()
+    results.put((error, sketch if error is None else None))
+
+
+def _check_workers(workers):
+    """Raise if a worker died without sending its result, e.g. when it was
+    killed. Workers exit normally only after sending their result."""
+    for worker in workers:
+        if worker.exitcode not in (None, 0):
+            raise RuntimeError('Worker died with exit code %d' %
+                               worker.exitcode)
+
+
+def _put(tasks, item, workers):
+    while True:
+        try:
+            tasks.put(item, timeout=_POLL_INTERVAL)
+            return
+        except Full:
+            _check_workers(workers)
+
+
+def _get(results, workers):
+    while True:
+        try:
+            return results.get(timeout=_POLL_INTERVAL)
+        except Empty:
+            _check_workers(workers)
+
+
+def _start_workers(target, args_list):
+    """Start one daemonic worker process per tuple of arguments."""
+    workers = [multiprocessing.Process(target=target, args=args)
+               for args in args_list]
+    for worker in workers:
+        worker.daemon = True
+        worker.start()
+    return workers
+
+
+def _collect(results, workers):
+    """Wait for the partial sketches of all workers and return them merged.
+    """
+    partials = [_get(results, workers) for _ in workers]
+    for error, _ in partials:
+        if error is not None:
+            raise RuntimeError('Worker failed:\n%s' % error)
+    return merge_all(sketch for _, sketch in partials)
+
+
+def _stop_workers(workers):
+    for worker in workers:
+        worker.join(1)
+        if worker.is_alive():
+            worker.terminate()
+
+
+def ingest(factory, iterable, processes=None, chunk_size=10000, key=None,
+           expand=None):
+    """Feed all items of `iterable` into sketches created by `factory`.
+
+    The parent process reads the iterable and sends chunks of `chunk_size`
+    items to `processes` workers through a bounded queue, so a slow pool
+    blocks the reader instead of buffering the whole input in memory. A
+    `RuntimeError` is raised if a worker fails or dies.
+
+    :param factory: picklable callable returning an empty sketch
+    :param iterable: the items to add
+    :param processes: number of worker processes, defaults to the number of
+                      CPUs
+    :param chunk_size: number of items sent to a worker at once
+    :param key: optional picklable function extracting the key from an item
+    :param expand: optional picklable function returning all keys of an
+                   item, e.g. of a block of lines, run by the workers instead
+                   of `key`
+    :returns: the merged sketch
+    """
+    processes = processes or multiprocessing.cpu_count()
+    tasks = multiprocessing.Queue(maxsize=2 * processes)
+    results = multiprocessing.Queue()
+    workers = _start_workers(
+        _consume_queue,
+        [(factory, key, tasks, results, expand)] * processes)
+    try:
+        for chunk in chunks(iterable, chunk_size):
+            _put(tasks, chunk, workers)
+        for _ in workers:
+            _put(tasks, None, workers)
+        return _collect(results, workers)
+    finally:
+        _stop_workers(workers)
+
+
+def split_file(path, parts):
+    """Split the file at `path` into `parts` byte ranges of similar size."""
+    size = os.path.getsize(path)
+    step = max(1, -(-size // parts))
+    return [(start, min(start + step, size))
+            for start in range(0, size, step)] or [(0, 0)]
+
+
+def read_lines(path, start, end, buffer_size=1 << 20):
+    """Yield the lines of the file that start within `[start, end)`.
+
+    Line endings are stripped. Reading the neighbouring ranges yields every
+    line of the file exactly once.
+    """
+    with open(path, 'rb', buffer_size) as f:
+        pos = start
+        if start > 0:
+            # a line starting right at `start` is preceded by a newline
+            f.seek(start - 1)
+            pos += len(f.readline()) - 1
+        while pos < end:
+            line = f.readline()
+            if not line:
+                break
+            pos += len(line)
+            yield line.rstrip(b'\r\n')
+
+
+def _consume_range(factory, path, start, end, key, chunk_size, results):
+    """Worker feeding one byte range of a file into a new sketch."""
+    try:
+        sketch = factory()
+        for chunk in chunks(read_lines(path, start, end), chunk_size):
+            _feed(sketch, chunk, key)
+    except Exception:
+        results.put((traceback.format_exc(), None))
+    else:
+        results.put((None, sketch))
+
+
+def ingest_file(factory, path, processes=None, chunk_size=10000, key=None):
+    """Feed every line of the file at `path` into sketches created by
+    `factory`.
+
+    The file is split into one byte range per process and every worker reads
+    its range directly from disk, so the parent does not touch the data at
+    all. This only works for uncompressed files, use `ingest` with a
+    streaming reader for anything else. A `RuntimeError` is raised if a
+    worker fails or dies.
+
+    :param factory: picklable callable returning an empty sketch
+    :param path: path of the file, lines are added without line endings
+    :param processes: number of worker processes, defaults to the number of
+                      CPUs
+    :param chunk_size: number of lines fed into the sketch at once
+    :param key: optional picklable function extracting the key from a line
+    :returns: the merged sketch
+    """
+    processes = processes or multiprocessing.cpu_count()
+    results = multiprocessing.Queue()
+    workers = _start_workers(
+        _consume_range,
+        [(factory, path, start, end, key, chunk_size, results)
+         for start, end in split_file(path, processes)])
+    try:
+        return _collect(results, workers)
+    finally:
+        _stop_workers(workers)
@@ -0,0 +1,178 @@
+# vim: set fileencoding=utf-8 :
+"""Feed a stream of records into several sketches.
+
+A `Pipeline` consumes an iterable of records, e.g. a generator reading from a
+socket or a message queue, groups the records into batches and hands every
+batch to the batch method of each registered sketch:
+
+    >>> pipeline = Pipeline(batch_size=5000, flush_interval=1.0)
+    >>> pipeline.register(bloomfilter, key=lambda record: record['url'])
+    >>> pipeline.register(cms, key=lambda record: record['url'])
+    >>> pipeline.register(hll, key=lambda record: record['user'])
+    >>> pipeline.run(records)
+
+The records are read by a background thread, so a batch is flushed when it
+holds `batch_size` records or when its first record is older than
+`flush_interval` seconds, even while the iterable blocks waiting for the
+next record.
+
+Every sketch is fed by a thread of its own, so different sketches and
+subsequent batches are flushed concurrently, e.g. while a Redis backed sketch
+waits for the server. Every sketch receives one batch at a time and in
+order, so sketches that are not thread-safe can be registered as well. At
+most `max_pending` batches wait for a sketch; once that limit is reached the
+pipeline stops reading, which propagates backpressure to the producer of the
+records.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import threading
+from timeit import default_timer
+
+try:
+    from Queue import Empty, Queue
+except ImportError:
+    from queue import Empty, Queue
+
+from streamingds.parallel import batch_method
+
+
+_END = object()
+
+
+class _Sink(object):
+    """Feed the batches of a queue into one batch method in a thread of its
+    own."""
+
+    def __init__(self, method, key, max_pending):
+        self.method = method
+        self.key = key
+        self.queue = Queue(max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self._run,
+                                       name='streamingds-pipeline')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _run(self):
+        for batch in iter(self.queue.get, None):
+            if self.error is not None:
+                # keep draining the queue so the pipeline does not block
+                continue
+            try:
+                keys = (batch if self.key is None
+                        else [self.key(record) for record in batch])
+                self.method(keys)
+            except Exception as e:
+                self.error = e
+
+    def close(self):
+        """Wait until all batches are fed into the sketch."""
+        self.queue.put(None)
+        self.thread.join()
+
+
+def _read(records, queue, errors):
+    try:
+        for record in records:
+            queue.put(record)
+    except Exception as e:
+        errors.append(e)
+    queue.put(_END)
+
+
+class Pipeline(object):
+    """Batch records from an iterable into the registered sketches.
+
+    :param batch_size: maximum number of records per batch
+    :param flush_interval: maximum age in seconds of a batch before it is
+                           flushed, `None` only flushes full batches
+    :param max_pending: maximum number of batches waiting for a sketch
+    """
+
+    def __init__(self, batch_size=1000, flush_interval=1.0, max_pending=4):
+        if batch_size < 1:
+            raise ValueError('batch_size must be a positive integer')
+        if max_pending < 1:
+            raise ValueError('max_pending must be a positive integer')
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._sinks = []
+
+    def register(self, sketch, key=None, method=None):
+        """Feed every batch into `sketch` and return the sketch.
+
+        :param key: optional function extracting the sketch's key from a
+                    record
+        :param method: the method receiving the list of keys, defaults to the
+                       sketch's `update_many` or `add_many` method
+        """
+        if method is None:
+            method = batch_method(sketch)
+        self._sinks.append((method, key))
+        return sketch
+
+    def run(self, records):
+        """Consume the iterable `records` and return the number of records
+        fed into the sketches.
+
+        Returns once all batches are fed into the sketches. The first error
+        raised by reading the records or by a batch method is raised again.
+        """
+        queue = Queue(self.batch_size)
+        errors = []
+        reader = threading.Thread(target=_read, args=(records, queue, errors),
+                                  name='streamingds-pipeline-reader')
+        # the reader is left blocked if a sketch fails
+        reader.daemon = True
+        reader.start()
+
+        sinks = [_Sink(method, key, self.max_pending)
+                 for method, key in self._sinks]
+        count = 0
+        try:
+            done = False
+            while not done:
+                batch, done = self._next_batch(queue)
+                if not batch:
+                    continue
+                count += len(batch)
+                for sink in sinks:
+                    self._raise_failed(sinks)
+                    sink.queue.put(batch)
+        finally:
+            for sink in sinks:
+                sink.close()
+        if errors:
+            raise errors[0]
+        self._raise_failed(sinks)
+        return count
+
+    def _next_batch(self, queue):
+        """Return the next batch and whether the input is exhausted."""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if deadline is None:
+                record = queue.get()
+            else:
+                timeout = deadline - default_timer()
+                if timeout <= 0:
+                    break
+                try:
+                    record = queue.get(timeout=timeout)
+                except Empty:
+                    break
+            if record is _END:
+                return batch, True
+            if deadline is None and self.flush_interval is not None:
+                deadline = default_timer() + self.flush_interval
+            batch.append(record)
+        return batch, False
+
+    def _raise_failed(self, sinks):
+        for sink in sinks:
+            if sink.error is not None:
+                raise sink.error
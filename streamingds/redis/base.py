@@ -24,6 +24,8 @@ except ImportError:
     print('Cannot import redis. Not using persistance.')
     raise
 
+from streamingds.memory import sizeof
+
 
 class BaseRedis(object):
     """Base class for dealing with redis communication."""
@@ -40,6 +42,11 @@ class BaseRedis(object):
             self._redis = StrictRedis(self._redis_host, self._redis_port)
         return self._redis
 
+    def memory_usage(self):
+        """Return the number of bytes used by the local Python objects, the
+        data in redis is not included."""
+        return sizeof(self, self.redis)
+
     def _redis_key(self, key):
         """Return the computed redis key for the internal key.
 
@@ -74,10 +81,12 @@ class RedisTwoDimensionalArray(object):
 
 
 class RedisList(object):
+    """A row of integer counters stored in a redis list."""
 
     def __init__(self, redis, prefix, length):
         self._redis = redis
         self._prefix = prefix
+        self._length = length
 
         if not self._redis.exists(prefix):
             pipeline = self._redis.pipeline()
@@ -85,8 +94,26 @@ class RedisList(object):
                 pipeline.lpush(prefix, 0)
             pipeline.execute()
 
+    def __len__(self):
+        return self._length
+
+    def __iter__(self):
+        return iter([int(value) for value in
+                     self._redis.lrange(self._prefix, 0, -1)])
+
     def __getitem__(self, idx):
         return int(self._redis.lrange(self._prefix, idx, idx)[0])
 
     def __setitem__(self, idx, value):
-        self._redis.lset(self._prefix, idx, value)
+        if isinstance(idx, slice):
+            # only whole rows are replaced, e.g. by `merge`
+            values = list(value)
+            if idx.indices(self._length) != (0, self._length, 1) or \
+                    len(values) != self._length:
+                raise ValueError('Only whole rows can be assigned')
+            pipeline = self._redis.pipeline()
+            for i, v in enumerate(values):
+                pipeline.lset(self._prefix, i, v)
+            pipeline.execute()
+        else:
+            self._redis.lset(self._prefix, idx, value)
@@ -26,17 +26,17 @@ class RedisBloomFilter(RedisHashing, BloomFilter):
     """Version of the bloomfilter that persists stuff in redis."""
 
     def __init__(self, capacity, error_rate=0.001, redis_host='localhost',
-                 redis_port=6379, redis_prefix='bloomfilter'):
+                 redis_port=6379, redis_prefix='bloomfilter', seeds=None):
 
         RedisHashing.__init__(self, redis_host, redis_port, redis_prefix)
-        BloomFilter.__init__(self, capacity, error_rate)
+        BloomFilter.__init__(self, capacity, error_rate, seeds)
 
     @property
     def bitarray(self):
         if not hasattr(self, '_bitarray'):
             self._bitarray = RedisBitArray(self.redis,
                                            self._redis_key('bitarray'),
-                                           self.slices)
+                                           self.bits)
         return self._bitarray
 
 
@@ -67,3 +67,18 @@ class RedisBitArray(object):
 
     def count(self, value):
         return self._redis.bitcount(self._key)
+
+    def tobytes(self):
+        return self._redis.get(self._key)
+
+    def _bitop(self, op, other):
+        if not isinstance(other, RedisBitArray):
+            raise TypeError('Can only combine with another RedisBitArray')
+        self._redis.bitop(op, self._key, self._key, other._key)
+        return self
+
+    def __ior__(self, other):
+        return self._bitop('OR', other)
+
+    def __iand__(self, other):
+        return self._bitop('AND', other)
@@ -0,0 +1,128 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""A counting bloom filter storing its counters in Redis.
+
+The 4 bit counters are stored in one Redis string and updated with
+`BITFIELD`, which requires Redis 3.2 or later. Adding a key increments its
+counters in one command, removing it checks and decrements them in a Lua
+script, so concurrent clients never see a partially removed key.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from streamingds.countingbloomfilter import (CountingBloomFilter,
+                                             NibbleArray)
+from streamingds.redis.hashing import RedisHashing
+
+
+# Decrement the counters at ARGV if none of them is zero, leaving saturated
+# counters alone. Returns 1 if the counters were decremented.
+_DECREMENT = """
+for _, index in ipairs(ARGV) do
+    if redis.call('BITFIELD', KEYS[1], 'GET', 'u4', '#' .. index)[1] == 0 then
+        return 0
+    end
+end
+for _, index in ipairs(ARGV) do
+    local value = redis.call('BITFIELD', KEYS[1], 'GET', 'u4', '#' .. index)[1]
+    if value > 0 and value < 15 then
+        redis.call('BITFIELD', KEYS[1], 'INCRBY', 'u4', '#' .. index, -1)
+    end
+end
+return 1
+"""
+
+
+class RedisCountingBloomFilter(RedisHashing, CountingBloomFilter):
+    """Version of the counting bloom filter that persists its counters in
+    redis."""
+
+    def __init__(self, capacity, error_rate=0.001, redis_host='localhost',
+                 redis_port=6379, redis_prefix='countingbloomfilter',
+                 seeds=None):
+        RedisHashing.__init__(self, redis_host, redis_port, redis_prefix)
+        CountingBloomFilter.__init__(self, capacity, error_rate, seeds)
+
+    @property
+    def counters(self):
+        if not hasattr(self, '_counters'):
+            self._counters = RedisNibbleArray(self.redis,
+                                              self._redis_key('counters'),
+                                              self.bits)
+        return self._counters
+
+
+class RedisNibbleArray(object):
+    """Maps the methods of `NibbleArray` to redis commands."""
+
+    def __init__(self, redis, key, length):
+        self._redis = redis
+        self._key = key
+        self.length = length
+        self._decrement = redis.register_script(_DECREMENT)
+
+    def __len__(self):
+        return self.length
+
+    def _bitfield(self, *args):
+        return self._redis.execute_command('BITFIELD', self._key, *args)
+
+    def increment(self, indices):
+        args = ['OVERFLOW', 'SAT']
+        for index in indices:
+            args.extend(['INCRBY', 'u4', '#%d' % index, 1])
+        if len(args) > 2:
+            self._bitfield(*args)
+
+    def decrement(self, indices):
+        return bool(self._decrement(keys=[self._key], args=list(indices)))
+
+    def all(self, indices):
+        args = []
+        for index in indices:
+            args.extend(['GET', 'u4', '#%d' % index])
+        return all(self._bitfield(*args))
+
+    def _array(self, data):
+        data = bytearray(data or b'')
+        size = (self.length + 1) // 2
+        return NibbleArray(self.length, data + bytearray(size - len(data)))
+
+    def count(self):
+        return self._array(self._redis.get(self._key)).count()
+
+    def tobytes(self):
+        return self._array(self._redis.get(self._key)).tobytes()
+
+    def _combine(self, other, method):
+        other_bytes = other.tobytes()
+
+        def combine(pipeline):
+            array = self._array(pipeline.get(self._key))
+            getattr(array, method)(NibbleArray(self.length,
+                                               bytearray(other_bytes)))
+            pipeline.multi()
+            pipeline.set(self._key, array.tobytes())
+
+        self._redis.transaction(combine, self._key)
+        return self
+
+    def add(self, other):
+        return self._combine(other, 'add')
+
+    def minimum(self, other):
+        return self._combine(other, 'minimum')
@@ -19,6 +19,7 @@ from __future__ import (absolute_import, division, print_function,
                         with_statement)
 
 from streamingds.countminsketch import CountMinSketch
+from streamingds.dyadic import DyadicCountMinSketch
 from streamingds.redis.base import RedisTwoDimensionalArray
 from streamingds.redis.hashing import RedisHashing
 
@@ -27,9 +28,9 @@ class RedisCountMinSketch(RedisHashing, CountMinSketch):
     """Redis backed count-min sketch"""
 
     def __init__(self, delta, epsilon, k, redis_host='localhost',
-                 redis_port=6379, redis_prefix='countminsketch'):
+                 redis_port=6379, redis_prefix='countminsketch', seeds=None):
         RedisHashing.__init__(self, redis_host, redis_port, redis_prefix)
-        CountMinSketch.__init__(self, delta, epsilon, k)
+        CountMinSketch.__init__(self, delta, epsilon, k, seeds)
 
     @property
     def count(self):
@@ -39,6 +40,30 @@ class RedisCountMinSketch(RedisHashing, CountMinSketch):
         if not hasattr(self, '_count'):
             self._count = RedisTwoDimensionalArray(self.redis,
                                                    self._redis_prefix,
-                                                   self.slices,
-                                                   self.bits_per_slice)
+                                                   self.bits,
+                                                   self.num_hash_fns)
         return self._count
+
+
+class RedisDyadicCountMinSketch(RedisHashing, DyadicCountMinSketch):
+    """Redis backed dyadic count-min sketch
+
+    The counters are stored as integers in redis lists, so `counter_type`
+    must be `'int'`.
+    """
+
+    def __init__(self, delta, epsilon, universe_bits=32,
+                 redis_host='localhost', redis_port=6379,
+                 redis_prefix='dyadiccountminsketch', seeds=None,
+                 cache_size=0, counter_type='int'):
+        if counter_type != 'int':
+            raise ValueError('Redis stores integer counters, counter_type '
+                             'must be int')
+        RedisHashing.__init__(self, redis_host, redis_port, redis_prefix)
+        DyadicCountMinSketch.__init__(self, delta, epsilon, universe_bits,
+                                      seeds, cache_size)
+
+    def _matrix(self, level, width, depth):
+        return RedisTwoDimensionalArray(self.redis,
+                                        '%s:%d' % (self._redis_prefix, level),
+                                        width, depth)
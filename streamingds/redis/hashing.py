@@ -18,9 +18,7 @@
 from __future__ import (absolute_import, division, print_function,
                         with_statement)
 
-import random
-
-from streamingds.hashing import Hashing
+from streamingds.hashing import Hashing, generate_seeds
 from streamingds.redis.base import BaseRedis
 
 
@@ -46,12 +44,29 @@ class RedisHashing(BaseRedis, Hashing):
     def slices(self, value):
         self.redis.set(self._redis_key('slices'), value)
 
+    def _stored_seeds(self):
+        # concurrent writers may both push their seeds, the first ones win
+        k = self._redis_key('seeds')
+        return [int(seed)
+                for seed in self.redis.lrange(k, 0, self.num_hash_fns - 1)]
+
     @property
     def seeds(self):
-        k = self._redis_key('seeds')
-        l = self.redis.llen(k)
-        if l == 0:
-            s = [random.randint(0, 2 ** 32)
-                 for _ in range(self.bits_per_slice)]
-            self.redis.lpush(k, *s)
-        return [int(seed) for seed in self.redis.lrange(k, 0, l)]
+        if not hasattr(self, '_seeds'):
+            seeds = self._stored_seeds()
+            if not seeds:
+                self.redis.rpush(self._redis_key('seeds'),
+                                 *generate_seeds(self.num_hash_fns))
+                seeds = self._stored_seeds()
+            self._seeds = seeds
+        return self._seeds
+
+    @seeds.setter
+    def seeds(self, value):
+        Hashing.seeds.fset(self, value)
+        stored = self._stored_seeds()
+        if not stored:
+            self.redis.rpush(self._redis_key('seeds'), *self._seeds)
+            stored = self._stored_seeds()
+        if stored != self._seeds:
+            raise ValueError('Sketch already exists with different seeds')
@@ -0,0 +1,254 @@
+# vim: set fileencoding=utf-8 :
+#
+# Copyright (c) 2013 Daniel Truemper <truemped at googlemail.com>
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+#
+"""A bloom filter splitting its bits over several Redis keys and nodes.
+
+A `RedisBloomFilter` stores all bits in one Redis string, which limits it to
+`2 ** 32` bits (512 MB) on a single node. A `ShardedRedisBloomFilter` splits
+the bits into `num_shards` contiguous ranges of equal size, stored in the
+keys `<prefix>:bitarray:<shard>`, and shard `i` lives on node
+`i % len(nodes)`. As the bits of a key are already uniformly distributed by
+the hash functions, every shard receives the same share of the load.
+
+The bits of a key or of a batch of keys are grouped by node and sent in one
+pipeline per node, and the pipelines of different nodes run in parallel
+threads. The number of shards is stored on the first node, a filter can
+only be reopened with the same number of shards and nodes in the same
+order.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from collections import defaultdict
+import threading
+
+from redis import StrictRedis
+
+from streamingds.bitarray import BitArray
+from streamingds.bloomfilter import BloomFilter
+from streamingds.memory import sizeof
+from streamingds.redis.hashing import RedisHashing
+
+
+# the maximum number of bits of a Redis string
+_MAX_SHARD_BITS = 2 ** 32
+
+
+class ShardedRedisBitArray(object):
+    """A bit array split into shards of `shard_bits` bits, every shard
+    being a `(redis, key)` pair."""
+
+    def __init__(self, shards, length):
+        self._shards = shards
+        self.length = length
+        # whole bytes per shard, so the shards can be concatenated
+        self.shard_bits = -(-length // (8 * len(shards))) * 8
+        if self.shard_bits > _MAX_SHARD_BITS:
+            raise ValueError('Shards are limited to 2 ** 32 bits, use more '
+                             'shards')
+
+        nodes = []
+        self._node_of_shard = []
+        for redis, _ in shards:
+            if not any(redis is node for node in nodes):
+                nodes.append(redis)
+            self._node_of_shard.append(
+                next(i for i, node in enumerate(nodes) if node is redis))
+        self._nodes = nodes
+
+    def __len__(self):
+        return self.length
+
+    def _route(self, bits):
+        """Return the `(key, offset)` pairs of `bits` grouped by node."""
+        shard_bits = self.shard_bits
+        by_node = defaultdict(list)
+        for bit in bits:
+            shard = bit // shard_bits
+            by_node[self._node_of_shard[shard]].append(
+                (self._shards[shard][1], bit - shard * shard_bits))
+        return by_node
+
+    def _execute(self, commands):
+        """Run the commands of every node in one pipeline per node, the
+        pipelines of different nodes in parallel.
+
+        `commands` maps node indices to functions adding the commands to a
+        pipeline. Returns a dict mapping the node indices to the results.
+        """
+        results = {}
+        errors = []
+
+        def run(node, add_commands):
+            try:
+                pipeline = self._nodes[node].pipeline(transaction=False)
+                add_commands(pipeline)
+                results[node] = pipeline.execute()
+            except Exception as e:
+                errors.append(e)
+
+        items = list(commands.items())
+        threads = [threading.Thread(target=run, args=item)
+                   for item in items[1:]]
+        for thread in threads:
+            thread.start()
+        if items:
+            run(*items[0])
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        return results
+
+    def set(self, value, bits):
+        def commands(offsets):
+            def add_commands(pipeline):
+                for key, offset in offsets:
+                    pipeline.setbit(key, offset, value)
+            return add_commands
+
+        self._execute(dict((node, commands(offsets))
+                           for node, offsets in self._route(bits).items()))
+
+    def all(self, value, bits):
+        def commands(offsets):
+            def add_commands(pipeline):
+                for key, offset in offsets:
+                    pipeline.getbit(key, offset)
+            return add_commands
+
+        results = self._execute(
+            dict((node, commands(offsets))
+                 for node, offsets in self._route(bits).items()))
+        return all(bit == value
+                   for result in results.values() for bit in result)
+
+    def _per_node(self, command):
+        """Run `command(pipeline, shard, redis, key)` for every shard and
+        return the results in shard order."""
+        def commands(node):
+            def add_commands(pipeline):
+                for shard, (redis, key) in enumerate(self._shards):
+                    if self._node_of_shard[shard] == node:
+                        command(pipeline, shard, redis, key)
+            return add_commands
+
+        results = self._execute(dict((node, commands(node))
+                                     for node in range(len(self._nodes))))
+        # the results of every node are in shard order
+        results = dict((node, iter(result))
+                       for node, result in results.items())
+        return [next(results[node]) for node in self._node_of_shard]
+
+    def count(self, value):
+        ones = sum(self._per_node(
+            lambda pipeline, shard, redis, key: pipeline.bitcount(key)))
+        return ones if value else self.length - ones
+
+    def tobytes(self):
+        shard_bytes = self.shard_bits // 8
+        data = b''.join(
+            (value or b'').ljust(shard_bytes, b'\0')
+            for value in self._per_node(
+                lambda pipeline, shard, redis, key: pipeline.get(key)))
+        return data[:(self.length + 7) // 8]
+
+    def _bitop(self, op, other):
+        if not isinstance(other, ShardedRedisBitArray) or \
+                len(other._shards) != len(self._shards):
+            raise TypeError('Can only combine with another '
+                            'ShardedRedisBitArray with the same shards')
+        for (redis, key), (other_redis, other_key) in zip(self._shards,
+                                                          other._shards):
+            if other_redis is redis:
+                redis.bitop(op, key, key, other_key)
+                continue
+            # copy the shard of the other node next to ours first
+            tmp = key + ':tmp'
+            pipeline = redis.pipeline()
+            pipeline.set(tmp, other_redis.get(other_key) or b'')
+            pipeline.bitop(op, key, key, tmp)
+            pipeline.delete(tmp)
+            pipeline.execute()
+        return self
+
+    def __ior__(self, other):
+        return self._bitop('OR', other)
+
+    def __iand__(self, other):
+        return self._bitop('AND', other)
+
+
+class ShardedRedisBloomFilter(RedisHashing, BloomFilter):
+    """A bloom filter storing its bits in `num_shards` Redis keys spread over
+    several Redis nodes."""
+
+    def __init__(self, capacity, error_rate=0.001, nodes=None,
+                 num_shards=None, redis_prefix='bloomfilter', seeds=None):
+        """Initialize the filter.
+
+        :param nodes: the Redis nodes as `(host, port)` pairs or `StrictRedis`
+                      instances, by default the local Redis. The seeds and
+                      the number of shards are stored on the first node
+        :type nodes: list
+        :param num_shards: the number of keys the bits are split into,
+                           defaults to one key per node
+        :type num_shards: int
+        """
+        if nodes is None:
+            nodes = [('localhost', 6379)]
+        if not nodes:
+            raise ValueError('At least one redis node is required')
+        nodes = [node if isinstance(node, StrictRedis)
+                 else StrictRedis(*node) for node in nodes]
+        if num_shards is None:
+            num_shards = len(nodes)
+        if num_shards < len(nodes) or num_shards != int(num_shards):
+            raise ValueError('num_shards must be an integer of at least the '
+                             'number of nodes')
+
+        RedisHashing.__init__(self, None, None, redis_prefix)
+        self._redis = nodes[0]
+        self._nodes = nodes
+        self.num_shards = int(num_shards)
+
+        # only the first filter using the prefix stores its number of shards
+        key = self._redis_key('shards')
+        self.redis.setnx(key, self.num_shards)
+        if int(self.redis.get(key)) != self.num_shards:
+            raise ValueError('Sketch already exists with a different number '
+                             'of shards')
+
+        BloomFilter.__init__(self, capacity, error_rate, seeds)
+
+    @property
+    def bitarray(self):
+        if not hasattr(self, '_bitarray'):
+            shards = [(self._nodes[i % len(self._nodes)],
+                       self._redis_key('bitarray:%d' % i))
+                      for i in range(self.num_shards)]
+            self._bitarray = ShardedRedisBitArray(shards, self.bits)
+        return self._bitarray
+
+    def memory_usage(self):
+        return sizeof(self, *self._nodes)
+
+    def copy(self):
+        """Return an in-memory copy of this filter."""
+        bf = BloomFilter(self._capacity, self._error_rate, seeds=self.seeds)
+        bf._bitarray = BitArray(self.bits,
+                                bytearray(self.bitarray.tobytes()))
+        return bf
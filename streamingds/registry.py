@@ -0,0 +1,214 @@
+# vim: set fileencoding=utf-8 :
+"""A registry of many named sketches sharing a memory budget.
+
+Keeping one sketch per customer and hour quickly means hundreds of thousands
+of sketches, most of which are rarely touched. A `SketchRegistry` creates
+sketches lazily with a factory, keeps the recently used ones in memory and
+spills the least recently used ones to disk once the resident sketches
+exceed the memory budget. Spilled sketches are reloaded transparently:
+
+    >>> from functools import partial
+    >>> from streamingds.hyperloglog import HyperLogLog
+    >>> registry = SketchRegistry(partial(HyperLogLog, 12),
+    ...                           memory_budget=64 * 2 ** 20,
+    ...                           spill_dir='/var/tmp/sketches')
+    >>> registry['customer-1:2016-05-01T10'].add('user-1')
+    >>> registry.rollup('customer-1:2016-05-01T*').cardinality()
+    1.0001220901843502
+
+Sketches are spilled as pickles, one file per sketch. The budget counts the
+bytes reported by the `memory_usage()` of the sketches. As sketches grow
+while they are used, the sizes of the sketches accessed since the last check
+are measured again every `check_interval` accesses and whenever a sketch is
+created or reloaded, only then the budget is enforced.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from collections import OrderedDict
+import fnmatch
+import os
+import pickle
+import tempfile
+
+try:
+    from urllib import quote, unquote
+except ImportError:
+    from urllib.parse import quote, unquote
+
+from streamingds.memory import sizeof
+from streamingds.parallel import merge_all
+
+
+_SUFFIX = '.pickle'
+
+
+def _memory_usage(sketch):
+    memory_usage = getattr(sketch, 'memory_usage', None)
+    return memory_usage() if memory_usage is not None else sizeof(sketch)
+
+
+class SketchRegistry(object):
+    """Named sketches created by a common factory, keeping at most
+    `memory_budget` bytes of them in memory."""
+
+    def __init__(self, factory, memory_budget, spill_dir=None,
+                 check_interval=1000):
+        """Setup an empty registry.
+
+        :param factory: called without arguments to create a new sketch. All
+                        sketches must share their parameters and seeds for
+                        `rollup` to merge them
+        :param memory_budget: the number of bytes of resident sketches
+        :type memory_budget: int
+        :param spill_dir: the directory of spilled sketches, by default a new
+                          temporary directory. Sketches already spilled to it
+                          are part of the registry
+        :type spill_dir: str
+        :param check_interval: the number of accesses after which the sizes
+                               of the accessed sketches are measured again
+        :type check_interval: int
+        """
+        if memory_budget <= 0:
+            raise ValueError('memory_budget must be positive')
+        if check_interval < 1:
+            raise ValueError('check_interval must be positive')
+        self.factory = factory
+        self.memory_budget = memory_budget
+        self.check_interval = check_interval
+        if spill_dir is None:
+            spill_dir = tempfile.mkdtemp(prefix='streamingds-')
+        elif not os.path.isdir(spill_dir):
+            os.makedirs(spill_dir)
+        self.spill_dir = spill_dir
+
+        # resident sketches, least recently used first
+        self._sketches = OrderedDict()
+        self._sizes = {}
+        self._accessed = set()
+        self._accesses = 0
+        self.resident_bytes = 0
+        self.spills = 0
+        self.loads = 0
+
+    def _path(self, name):
+        return os.path.join(self.spill_dir, quote(name, safe='') + _SUFFIX)
+
+    def _spilled(self):
+        for filename in os.listdir(self.spill_dir):
+            if filename.endswith(_SUFFIX):
+                yield unquote(filename[:-len(_SUFFIX)])
+
+    def _load(self, name):
+        """Return the spilled sketch `name` or `None`."""
+        try:
+            with open(self._path(name), 'rb') as f:
+                return pickle.load(f)
+        except IOError:
+            return None
+
+    def __getitem__(self, name):
+        """Return the sketch `name`, reloading or creating it if
+        necessary."""
+        sketch = self._sketches.pop(name, None)
+        if sketch is None:
+            path = self._path(name)
+            sketch = self._load(name)
+            if sketch is not None:
+                os.remove(path)
+                self.loads += 1
+            else:
+                sketch = self.factory()
+            size = _memory_usage(sketch)
+            self._sizes[name] = size
+            self.resident_bytes += size
+            check = True
+        else:
+            self._accesses += 1
+            check = self._accesses >= self.check_interval
+        self._sketches[name] = sketch
+        if check:
+            self._check()
+        # the caller may change the sketch, measure it at the next check
+        self._accessed.add(name)
+        return sketch
+
+    def _check(self):
+        """Measure the accessed sketches again and spill the least recently
+        used ones until the resident sketches fit into the budget."""
+        for name in self._accessed:
+            if name in self._sketches:
+                size = _memory_usage(self._sketches[name])
+                self.resident_bytes += size - self._sizes[name]
+                self._sizes[name] = size
+        self._accessed.clear()
+        self._accesses = 0
+
+        # the most recently used sketch always stays in memory
+        while self.resident_bytes > self.memory_budget and \
+                len(self._sketches) > 1:
+            self.spill(next(iter(self._sketches)))
+
+    def spill(self, name):
+        """Write the resident sketch `name` to disk and release it."""
+        sketch = self._sketches.pop(name)
+        path = self._path(name)
+        with open(path + '.tmp', 'wb') as f:
+            pickle.dump(sketch, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(path + '.tmp', path)
+        self.resident_bytes -= self._sizes.pop(name)
+        self._accessed.discard(name)
+        self.spills += 1
+
+    def flush(self):
+        """Spill all resident sketches, e.g. before shutting down."""
+        for name in list(self._sketches):
+            self.spill(name)
+
+    def __contains__(self, name):
+        return name in self._sketches or os.path.exists(self._path(name))
+
+    def __delitem__(self, name):
+        if name in self._sketches:
+            del self._sketches[name]
+            self.resident_bytes -= self._sizes.pop(name)
+            self._accessed.discard(name)
+        elif name in self:
+            os.remove(self._path(name))
+        else:
+            raise KeyError(name)
+
+    def names(self):
+        """Return the names of all resident and spilled sketches."""
+        return sorted(set(self._sketches) | set(self._spilled()))
+
+    def __len__(self):
+        return len(self.names())
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def rollup(self, pattern):
+        """Return a new sketch merging all sketches whose names match the
+        shell-style `pattern`, e.g. `'customer-1:2016-05-01T*'`.
+
+        Spilled sketches are read from disk without making them resident.
+        Raises a `KeyError` if no name matches.
+        """
+        names = fnmatch.filter(self.names(), pattern)
+        if not names:
+            raise KeyError(pattern)
+
+        def sketches():
+            # start with a copy, the registered sketches stay untouched
+            for i, name in enumerate(names):
+                sketch = self._sketches.get(name)
+                if sketch is None:
+                    yield self._load(name)
+                elif i == 0:
+                    yield pickle.loads(pickle.dumps(
+                        sketch, pickle.HIGHEST_PROTOCOL))
+                else:
+                    yield sketch
+
+        return merge_all(sketches())
@@ -0,0 +1,100 @@
+# vim: set fileencoding=utf-8 :
+"""Sketches whose storage lives in shared memory.
+
+The bits of a `SharedBloomFilter` and the counters of a
+`SharedCountMinSketch` are allocated with `multiprocessing.sharedctypes`, so
+every process forked after the sketch was created updates and queries the
+same memory. Create the sketch in the parent, e.g. at module level of an
+application preloaded by gunicorn's master process, and use it in the
+workers:
+
+    >>> cms = SharedCountMinSketch(10 ** -7, 0.005)
+    >>> # fork workers, every worker calls cms.update(key) and cms.get(key)
+
+The seeds are fixed when the sketch is created, so all processes hash keys
+the same way.
+
+Concurrency and accuracy
+------------------------
+
+Updates are read-modify-write operations on single bytes or counters. With
+`lock=True` (the default) every slot is guarded by one of `stripes` process
+shared locks. Updates touching different stripes run in parallel and no
+update is ever lost, so the usual error bounds hold.
+
+With `lock=False` no locks are taken at all. Concurrent updates of the same
+byte or counter may then overwrite each other:
+
+* a `SharedBloomFilter` may lose a bit set by another process, which causes
+  false negatives for the affected keys.
+* a `SharedCountMinSketch` may lose increments, so estimates can be lower
+  than the true count and the one-sided error guarantee no longer holds.
+
+The probability of a lost update grows with the number of writers and shrinks
+with the size of the sketch, so unlocked sketches are only an option if such
+errors are acceptable.
+
+Queries never take locks. They may observe an update of another process only
+partially, e.g. some but not all of the bits of a key, which is equivalent to
+querying just before the update completed.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from collections import defaultdict
+import ctypes
+import multiprocessing
+from multiprocessing.sharedctypes import RawArray
+
+from streamingds.bitarray import BitArray
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.locking import StripedCountersMixin, StripedLock
+
+
+class SharedBloomFilter(BloomFilter):
+    """A bloom filter whose bits live in shared memory.
+
+    See the module documentation for the meaning of `stripes` and `lock`.
+    """
+
+    def __init__(self, capacity, error_rate=0.001, seeds=None, stripes=64,
+                 lock=True):
+        super(SharedBloomFilter, self).__init__(capacity, error_rate, seeds)
+        # fix the seeds before the processes are forked
+        self.seeds
+        locks = StripedLock(stripes, multiprocessing.Lock) if lock else None
+        self._bitarray = BitArray(
+            self.bits, RawArray(ctypes.c_ubyte, (self.bits + 7) // 8), locks)
+
+
+class SharedCountMinSketch(StripedCountersMixin, CountMinSketch):
+    """A count-min sketch whose counters live in shared memory.
+
+    The top k items are not tracked, as the heap would have to be shared and
+    locked as a whole. See the module documentation for the meaning of
+    `stripes` and `lock`.
+    """
+
+    def __init__(self, delta, epsilon, seeds=None, stripes=64, lock=True):
+        super(SharedCountMinSketch, self).__init__(delta, epsilon, 1, seeds)
+        # fix the seeds before the processes are forked
+        self.seeds
+        self._count = [RawArray(ctypes.c_longlong, self.bits)
+                       for _ in range(self.num_hash_fns)]
+        self._locks = (StripedLock(stripes, multiprocessing.Lock)
+                       if lock else None)
+
+    def _update(self, key, hashes, increment):
+        self._increment(hashes, increment)
+
+    def update_many(self, keys, increment=1):
+        """Update the sketch for all keys acquiring every stripe at most
+        once."""
+        counts = defaultdict(int)
+        for key in keys:
+            counts[key] += increment
+        self._increment_many(counts)
+
+    def update_heap(self, key, est):
+        """The top k items are not tracked in shared memory."""
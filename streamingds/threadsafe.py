@@ -0,0 +1,99 @@
+# vim: set fileencoding=utf-8 :
+"""Sketches that can be shared by the threads of one process.
+
+The plain sketches set up their state lazily and update it with unguarded
+read-modify-write operations, so concurrent threads may lose updates. The
+variants in this module set up all state in the constructor and guard every
+counter, register or byte of bits with one of `stripes` locks, so threads
+updating different parts of a sketch do not wait for each other.
+
+Batch methods hash all keys before taking any lock and then acquire every
+stripe only once. Queries read without locking.
+"""
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from collections import defaultdict
+import threading
+
+from streamingds.bitarray import BitArray
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.locking import StripedCountersMixin, StripedLock
+
+
+class ThreadSafeBloomFilter(BloomFilter):
+    """A bloom filter that can be updated by several threads."""
+
+    def __init__(self, capacity, error_rate=0.001, seeds=None, stripes=64):
+        super(ThreadSafeBloomFilter, self).__init__(capacity, error_rate,
+                                                    seeds)
+        # set up all lazy state before the filter is shared
+        self.seeds
+        self._bitarray = BitArray(self.bits,
+                                  locks=StripedLock(stripes, threading.Lock))
+
+
+class ThreadSafeCountMinSketch(StripedCountersMixin, CountMinSketch):
+    """A count-min sketch that can be updated by several threads.
+
+    The counters are guarded by striped locks, the top k heap by one lock of
+    its own.
+    """
+
+    def __init__(self, delta, epsilon, k, seeds=None, stripes=64):
+        super(ThreadSafeCountMinSketch, self).__init__(delta, epsilon, k,
+                                                       seeds)
+        # set up all lazy state before the sketch is shared
+        self.seeds
+        self.count
+        self.heap
+        self._locks = StripedLock(stripes, threading.Lock)
+        self._heap_lock = threading.Lock()
+
+    def _update(self, key, hashes, increment):
+        self._increment(hashes, increment)
+        with self._heap_lock:
+            # read the estimate again, other threads may have incremented
+            # the key since and already pushed a larger one
+            self.update_heap(key, self._get(hashes))
+
+    def update_many(self, keys, increment=1):
+        counts = defaultdict(int)
+        for key in keys:
+            counts[key] += increment
+        self._increment_many(counts)
+        with self._heap_lock:
+            for key in counts:
+                self.update_heap(key, self.get(key))
+
+    def merge(self, other):
+        with self._heap_lock:
+            super(ThreadSafeCountMinSketch, self).merge(other)
+
+
+class ThreadSafeHyperLogLog(HyperLogLog):
+    """A HyperLogLog counter that can be updated by several threads."""
+
+    def __init__(self, p, stripes=64):
+        super(ThreadSafeHyperLogLog, self).__init__(p)
+        self._locks = StripedLock(min(stripes, self._m), threading.Lock)
+
+    def _add_hashes(self, hashes):
+        updates = defaultdict(int)
+        for x in hashes:
+            j, rho = self._register(x)
+            if rho > updates[j]:
+                updates[j] = rho
+
+        registers = self._registers
+        for lock, group in self._locks.group(updates):
+            with lock:
+                for j in group:
+                    if updates[j] > registers[j]:
+                        registers[j] = updates[j]
+
+    def merge(self, other):
+        with self._locks.all():
+            super(ThreadSafeHyperLogLog, self).merge(other)
@@ -0,0 +1,23 @@
+# vim: set fileencoding=utf-8 :
+import uuid
+
+import pytest
+
+
+@pytest.yield_fixture
+def redis_prefix(request):
+    """Return a unique key prefix on the local redis server and delete all
+    keys with it afterwards. The prefix starts with the name of the test
+    module unless another one is given by indirect parametrization."""
+    redis = pytest.importorskip('redis')
+    client = redis.StrictRedis()
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        pytest.skip('redis is not running')
+    name = getattr(request, 'param',
+                   request.module.__name__.rpartition('.')[2])
+    prefix = '%s-%s' % (name, uuid.uuid4())
+    yield prefix
+    for key in client.scan_iter(match=prefix + '*'):
+        client.delete(key)
@@ -45,6 +45,35 @@ def test_bloom_filter(capacity, max_keys):
     assert actual <= 0.01
 
 
+def test_merge_bloomfilters():
+    bf1 = BloomFilter(1000, 0.01)
+    bf2 = BloomFilter(1000, 0.01, seeds=bf1.seeds)
+    bf1.add('left')
+    bf2.add('right')
+    bf2.add('both')
+    bf1.add('both')
+
+    union = bf1 | bf2
+    assert 'left' in union and 'right' in union and 'both' in union
+    assert 'right' not in bf1
+
+    intersection = bf1 & bf2
+    assert 'both' in intersection
+    assert 'left' not in intersection
+    assert 'right' not in intersection
+
+    bf1.merge(bf2)
+    assert 'right' in bf1
+
+
+def test_merge_incompatible_bloomfilters():
+    bf = BloomFilter(1000, 0.01)
+    with pytest.raises(ValueError):
+        bf.merge(BloomFilter(1000, 0.01))
+    with pytest.raises(ValueError):
+        bf.merge(BloomFilter(2000, 0.01))
+
+
 def gethash(key):
     return sha224(str(key)).hexdigest()
 
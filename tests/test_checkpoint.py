@@ -0,0 +1,122 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import os
+import pickle
+import threading
+import time
+
+import pytest
+
+from streamingds.bloomfilter import BloomFilter
+from streamingds.checkpoint import Checkpointer, restore
+from streamingds.countingbloomfilter import CountingBloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.kll import KLLSketch
+
+
+def _files(tmpdir):
+    return sorted(os.listdir(str(tmpdir)))
+
+
+def test_deltas_only_hold_dirty_blocks(tmpdir):
+    bf = BloomFilter(100000, 0.01)
+    checkpointer = Checkpointer(bf, str(tmpdir), block_size=1024)
+    bf.add('a')
+    assert checkpointer.checkpoint().endswith('0000000001.base')
+    base_size = checkpointer.bytes_written
+    assert base_size > bf.bits // 8
+
+    # nothing changed, nothing written
+    assert checkpointer.checkpoint() is None
+
+    bf.add('b')
+    assert checkpointer.checkpoint().endswith('0000000002.delta')
+    assert checkpointer.bytes_written - base_size < \
+        bf.num_hash_fns * 1024 + 1000
+    with open(str(tmpdir.join('0000000002.delta')), 'rb') as f:
+        delta = pickle.load(f)
+    dirty = sum(bin(byte).count('1') for byte in bytearray(delta['dirty']))
+    assert 0 < dirty <= bf.num_hash_fns
+    assert len(delta['blocks']) == dirty * 1024
+
+    restored = restore(str(tmpdir))
+    assert restored.bitarray.tobytes() == bf.bitarray.tobytes()
+    assert 'a' in restored and 'b' in restored
+
+
+def test_new_base_after_max_deltas(tmpdir):
+    hll = HyperLogLog(12)
+    checkpointer = Checkpointer(hll, str(tmpdir), block_size=512,
+                                max_deltas=2)
+    for i in range(5):
+        hll.add_many(range(i * 100, (i + 1) * 100))
+        checkpointer.checkpoint()
+    assert _files(tmpdir) == ['0000000004.base', '0000000005.delta']
+    assert restore(str(tmpdir)) == hll
+
+    # a new checkpointer continues with a new base
+    hll.add('more')
+    Checkpointer(hll, str(tmpdir)).checkpoint()
+    assert _files(tmpdir) == ['0000000006.base']
+    assert restore(str(tmpdir)).cardinality() == hll.cardinality()
+
+
+@pytest.mark.parametrize('counter_type', ['int', 'uint8', 'morris'])
+def test_count_min_sketch(tmpdir, counter_type):
+    cms = CountMinSketch(0.01, 0.01, 3, counter_type=counter_type)
+    checkpointer = Checkpointer(cms, str(tmpdir), block_size=256)
+    cms.update('a', 3)
+    checkpointer.checkpoint()
+    cms.update('b', 300)
+    cms.update('c', 7)
+    checkpointer.checkpoint()
+
+    restored = restore(str(tmpdir))
+    assert restored.counter_type == counter_type
+    assert [list(row) for row in restored.count] == \
+        [list(row) for row in cms.count]
+    assert restored.get_ranking() == cms.get_ranking()
+    restored.update('d')
+    assert restored.get('d') >= 1
+
+
+def test_counting_bloom_filter(tmpdir):
+    cbf = CountingBloomFilter(1000, 0.01)
+    checkpointer = Checkpointer(cbf, str(tmpdir))
+    cbf.add_many(['a', 'b'])
+    checkpointer.checkpoint()
+    cbf.remove('a')
+    checkpointer.checkpoint()
+    restored = restore(str(tmpdir))
+    assert 'a' not in restored and 'b' in restored
+
+
+def test_background_thread(tmpdir):
+    bf = BloomFilter(1000, 0.01)
+    lock = threading.Lock()
+    with Checkpointer(bf, str(tmpdir), interval=0.01,
+                      lock=lock) as checkpointer:
+        for i in range(20):
+            with lock:
+                bf.add(str(i))
+            time.sleep(0.005)
+    assert checkpointer.checkpoints > 1
+    assert checkpointer.error is None
+    assert all(str(i) in restore(str(tmpdir)) for i in range(20))
+
+
+def test_invalid(tmpdir):
+    with pytest.raises(ValueError):
+        restore(str(tmpdir))
+    with pytest.raises(ValueError):
+        Checkpointer(KLLSketch(), str(tmpdir))
+    with pytest.raises(ValueError):
+        Checkpointer(HyperLogLog(8), str(tmpdir), interval=0)
+    checkpointer = Checkpointer(HyperLogLog(8), str(tmpdir))
+    checkpointer.start()
+    with pytest.raises(ValueError):
+        checkpointer.start()
+    checkpointer.stop()
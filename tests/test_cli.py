@@ -0,0 +1,110 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import bz2
+import gzip
+import io
+import json
+import pickle
+
+import pytest
+
+from streamingds import cli, frozen
+
+
+LOG = b''.join(b'10.0.0.%d - GET /page/%d 200\n' % (i % 50, i % 7)
+               for i in range(1000))
+
+
+@pytest.fixture
+def log_file(tmpdir):
+    path = tmpdir.join('access.log')
+    path.write_binary(LOG)
+    return str(path)
+
+
+def _main(capsys, *argv):
+    cli.main(['--progress-interval', '0'] + list(argv))
+    return json.loads(capsys.readouterr()[0])
+
+
+def test_read_blocks():
+    f = io.BytesIO(b'a\r\nbb\nccc\nd')
+    blocks = list(cli.read_blocks(f, block_size=4))
+    assert blocks == [b'a\r\n', b'bb\n', b'ccc\n', b'd\n']
+    assert list(cli.read_blocks(io.BytesIO(b'a\nb\n'), 100)) == [b'a\nb\n']
+
+
+def test_field_extractor():
+    block = b'a b c\r\nd\n1,2,3\n'
+    assert cli.FieldExtractor()(b'a\nb\n') in (['a', 'b'], [b'a', b'b'])
+    assert cli.FieldExtractor(2)(block) == ['b']
+    assert cli.FieldExtractor(3, ',')(block) == ['3']
+    assert cli.FieldExtractor(2, ',', numeric=True)(block) == [2.0]
+    with pytest.raises(ValueError):
+        cli.FieldExtractor(0)
+
+
+def test_count_min_sketch(capsys, log_file, tmpdir):
+    output = str(tmpdir.join('cms.pickle'))
+    path = str(tmpdir.join('cms.frozen'))
+    summary = _main(capsys, 'countmin', log_file, '--field', '4', '--top',
+                    '3', '--epsilon', '0.01', '--output', output,
+                    '--frozen', path)
+    assert summary['lines'] == 1000
+    assert summary['bytes'] == len(LOG)
+    # pages 0 to 5 are requested 143 times, page 6 142 times
+    est, keys = summary['top'][0]
+    assert est == 143
+    assert set(keys) <= set('/page/%d' % i for i in range(6))
+
+    with open(output, 'rb') as f:
+        cms = pickle.load(f)
+    assert cms.get(b'/page/0') == 143
+    assert frozen.load(path).get(b'/page/0') == 143
+
+
+@pytest.mark.parametrize('suffix,compress', [
+    ('.gz', gzip.compress if hasattr(gzip, 'compress') else None),
+    ('.bz2', bz2.compress),
+])
+def test_compressed_files_and_processes(capsys, tmpdir, suffix, compress):
+    path = tmpdir.join('access.log' + suffix)
+    if compress is None:
+        with gzip.GzipFile(str(path), 'wb') as f:
+            f.write(LOG)
+    else:
+        path.write_binary(compress(LOG))
+    summary = _main(capsys, 'hyperloglog', str(path), '-f', '1',
+                    '--processes', '2', '--block-size', '1000')
+    assert summary['lines'] == 1000
+    assert round(summary['cardinality']) == 50
+
+
+def test_bloom_filter_and_kll(capsys, log_file, tmpdir):
+    summary = _main(capsys, 'bloom', log_file, log_file, '--capacity',
+                    '1000', '-f', '1')
+    assert summary['lines'] == 2000
+    assert abs(summary['estimated_keys'] - 50) < 3
+
+    numbers = tmpdir.join('numbers.txt')
+    numbers.write_binary(b''.join(b'%d\n' % i for i in range(101)) +
+                         b'not a number\n')
+    summary = _main(capsys, 'kll', str(numbers))
+    assert summary['count'] == 101
+    assert summary['lines'] == 102
+    assert summary['quantiles']['0.5'] == 50
+    assert summary['quantiles']['1'] == 100
+
+
+def test_empty_and_missing_files(capsys, tmpdir):
+    empty = tmpdir.join('empty.log')
+    empty.write_binary(b'')
+    assert _main(capsys, 'hyperloglog', str(empty))['lines'] == 0
+
+    with pytest.raises(SystemExit) as e:
+        cli.main(['bloom', str(tmpdir.join('missing.log'))])
+    assert e.value.code == 1
+    with pytest.raises(SystemExit):
+        cli.main(['bloom', '--processes', '0'])
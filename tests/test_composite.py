@@ -0,0 +1,101 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from collections import Counter
+from random import Random
+
+import pytest
+
+from streamingds import composite
+from streamingds.bloomfilter import BloomFilter
+from streamingds.composite import CompositeSketch
+from streamingds.countminsketch import CountMinSketch
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.threadsafe import (ThreadSafeBloomFilter,
+                                    ThreadSafeCountMinSketch,
+                                    ThreadSafeHyperLogLog)
+
+
+def _keys(n=5000):
+    rnd = Random(0)
+    return ['key-%d' % int(rnd.paretovariate(1.2)) for _ in range(n)]
+
+
+def _composite():
+    return CompositeSketch(BloomFilter(1000, 0.01),
+                           CountMinSketch(10 ** -3, 0.01, 5),
+                           HyperLogLog(10))
+
+
+def test_composite_sketch():
+    keys = _keys()
+    counts = Counter(keys)
+    sketch = _composite()
+    for key in keys:
+        sketch.add(key)
+
+    for key, count in counts.items():
+        assert key in sketch
+        assert sketch.get(key) >= count
+    assert sum(1 for i in range(1000) if 'absent-%d' % i in sketch) < 50
+    assert abs(sketch.cardinality() - len(counts)) < 0.1 * len(counts)
+
+    top = max(counts, key=counts.get)
+    assert top in sketch.countminsketch.get_ranking()[0][1]
+
+
+def test_add_many():
+    keys = _keys()
+    sketch = _composite()
+    batched = _composite()
+    for key in keys:
+        sketch.add(key)
+    batched.add_many(keys[:1000])
+    batched.add_many(keys[1000:])
+
+    assert batched.bloomfilter.bitarray.tobytes() == \
+        sketch.bloomfilter.bitarray.tobytes()
+    assert batched.countminsketch.count == sketch.countminsketch.count
+    assert batched.hyperloglog == sketch.hyperloglog
+
+
+def test_hashes_once(monkeypatch):
+    digests = []
+
+    def digest(key):
+        digests.append(key)
+        return (1, 2)
+
+    monkeypatch.setattr(composite, '_digest', digest)
+    sketch = _composite()
+    sketch.add('a')
+    assert digests == ['a']
+    sketch.add_many(['b', 'c', 'b'])
+    assert sorted(digests) == ['a', 'b', 'c']
+
+
+def test_thread_safe_sketches():
+    keys = _keys()
+    sketch = CompositeSketch(ThreadSafeBloomFilter(1000, 0.01),
+                             ThreadSafeCountMinSketch(10 ** -3, 0.01, 5),
+                             ThreadSafeHyperLogLog(10))
+    expected = _composite()
+    sketch.add_many(keys)
+    expected.add_many(keys)
+    for key in set(keys):
+        assert key in sketch
+        assert sketch.get(key) == expected.get(key)
+    assert sketch.cardinality() == expected.cardinality()
+
+
+def test_partial_composite():
+    sketch = CompositeSketch(hyperloglog=HyperLogLog(10))
+    sketch.add_many(['a', 'b'])
+    assert round(sketch.cardinality()) == 2
+    with pytest.raises(ValueError):
+        'a' in sketch
+    with pytest.raises(ValueError):
+        sketch.get('a')
+    with pytest.raises(ValueError):
+        CompositeSketch()
@@ -0,0 +1,103 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import pickle
+import random
+
+import pytest
+
+from streamingds.counters import CompactRow, MorrisRow
+from streamingds.countminsketch import CountMinSketch
+
+
+def test_compact_row_escalates_to_overflow():
+    row = CompactRow(10)
+    row[3] = 254
+    assert row[3] == 254
+    assert not row._overflow
+
+    row[3] = 1000
+    assert row[3] == 1000
+    assert row._overflow == {3: 1000}
+
+    row[-7] += 1
+    assert row[3] == 1001
+
+    row[3] = 7
+    assert row[3] == 7
+    assert not row._overflow
+
+
+def test_compact_row_rejects_negative_counts():
+    row = CompactRow(10, 'H')
+    with pytest.raises(ValueError):
+        row[0] = -1
+
+
+def test_compact_row_assigns_whole_rows_only():
+    row = CompactRow(4)
+    row[:] = [1, 2, 300, 4]
+    assert list(row) == [1, 2, 300, 4]
+    assert len(row) == 4
+
+    with pytest.raises(ValueError):
+        row[:] = [1, 2]
+    with pytest.raises(ValueError):
+        row[1:3] = [1, 2]
+
+
+@pytest.mark.parametrize('counter_type', ['uint8', 'uint16'])
+def test_compact_counters_are_exact(counter_type):
+    seeds = [random.randint(0, 2 ** 31) for _ in range(7)]
+    exact = CountMinSketch(10 ** -3, 0.01, 10, seeds=seeds)
+    compact = CountMinSketch(10 ** -3, 0.01, 10, seeds=seeds,
+                             counter_type=counter_type)
+    for i in range(5000):
+        key = 'key-%d' % min(int(random.paretovariate(1)), 1000)
+        exact.update(key)
+        compact.update(key)
+
+    assert [list(row) for row in compact.count] == exact.count
+    assert compact.get_ranking() == exact.get_ranking()
+
+    restored = pickle.loads(pickle.dumps(compact))
+    assert [list(row) for row in restored.count] == exact.count
+
+    merged = compact | compact.copy()
+    assert merged.counter_type == counter_type
+    assert merged.get('key-1') == 2 * exact.get('key-1')
+
+
+def test_morris_row_is_unbiased():
+    values = []
+    for _ in range(2000):
+        row = MorrisRow(1)
+        for _ in range(100):
+            row[0] += 10
+        values.append(row[0])
+
+    mean = sum(values) / len(values)
+    assert 950 < mean < 1050
+    assert max(values) < 2500
+
+
+def test_morris_row_saturates():
+    row = MorrisRow(1)
+    row[0] = 10 ** 12
+    assert row[0] == MorrisRow._LEVELS[-1]
+    row[0] = 0
+    assert row[0] == 0
+
+
+def test_morris_count_min_sketch():
+    cms = CountMinSketch(10 ** -3, 0.01, 10, counter_type='morris')
+    cms.update('www.google.de', 10000)
+    cms.update('www.bing.com', 3)
+    assert 8000 < cms.get('www.google.de') < 12000
+    assert cms.get('www.bing.com') == 3
+
+
+def test_unknown_counter_type():
+    with pytest.raises(ValueError):
+        CountMinSketch(10 ** -3, 0.01, 10, counter_type='float')
@@ -0,0 +1,96 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import pickle
+
+import pytest
+
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countingbloomfilter import CountingBloomFilter, NibbleArray
+
+
+def test_nibble_array():
+    counters = NibbleArray(5)
+    assert len(counters._bytes) == 3
+    counters.increment([0, 1, 1, 4])
+    assert [counters[i] for i in range(5)] == [1, 2, 0, 0, 1]
+    assert counters.count() == 3
+    assert counters.tobytes() == b'\x12\x00\x10'
+
+    assert not counters.decrement([0, 2])
+    assert counters.decrement([0, 1])
+    assert [counters[i] for i in range(5)] == [0, 1, 0, 0, 1]
+
+
+def test_saturation():
+    counters = NibbleArray(2)
+    counters.increment([0] * 20)
+    assert counters[0] == 15
+    assert counters.decrement([0])
+    assert counters[0] == 15
+    assert counters[1] == 0
+
+
+def _filter_tests(cbf):
+    keys = ['key-%d' % i for i in range(1000)]
+    cbf.add_many(keys)
+    assert all(key in cbf for key in keys)
+    assert 950 < len(cbf) < 1050
+
+    for key in keys[::2]:
+        assert cbf.remove(key)
+    assert all(key in cbf for key in keys[1::2])
+    assert sum(1 for key in keys[::2] if key in cbf) < 10
+    assert not cbf.remove('absent')
+
+
+def test_counting_bloom_filter():
+    cbf = CountingBloomFilter(1000, 0.01)
+    bf = BloomFilter(1000, 0.01)
+    assert (cbf.bits, cbf.num_hash_fns) == (bf.bits, bf.num_hash_fns)
+    assert len(cbf.counters.tobytes()) == (bf.bits + 1) // 2
+    _filter_tests(cbf)
+
+
+def test_merge_and_pickle():
+    cbf1 = CountingBloomFilter(100, 0.01)
+    cbf2 = CountingBloomFilter(100, 0.01, seeds=cbf1.seeds)
+    cbf1.add('a')
+    cbf2.add('a')
+    cbf2.add('b')
+
+    union = cbf1 | cbf2
+    assert union.remove('a')
+    assert 'a' in union and 'b' in union
+    assert 'b' not in cbf1
+
+    both = cbf1 & cbf2
+    assert 'a' in both and 'b' not in both
+
+    restored = pickle.loads(pickle.dumps(union))
+    assert restored.counters.tobytes() == union.counters.tobytes()
+    assert 'b' in restored
+
+    with pytest.raises(ValueError):
+        cbf1.merge(CountingBloomFilter(100, 0.01))
+
+
+def test_redis_counting_bloom_filter(redis_prefix):
+    from streamingds.redis.countingbloomfilter import (
+        RedisCountingBloomFilter)
+
+    cbf = RedisCountingBloomFilter(1000, 0.01, redis_prefix=redis_prefix)
+    _filter_tests(cbf)
+
+    # the same counters as the in-memory filter
+    local = CountingBloomFilter(1000, 0.01, seeds=cbf.seeds)
+    local.add_many('key-%d' % i for i in range(1, 1000, 2))
+    assert cbf.counters.tobytes() == local.counters.tobytes()
+
+    other = RedisCountingBloomFilter(1000, 0.01, seeds=cbf.seeds,
+                                     redis_prefix=redis_prefix + '-other')
+    other.add('new')
+    cbf.merge(other)
+    assert 'new' in cbf
+    assert cbf.copy().counters.tobytes() == cbf.counters.tobytes()
@@ -46,6 +46,74 @@ def test_simple_count_min_sketch():
     assert c.get_ranking() == exp
 
 
+def test_hash_cache():
+    cached = CountMinSketch(10 ** -3, 0.01, 5, cache_size=20)
+    c = CountMinSketch(10 ** -3, 0.01, 5, seeds=cached.seeds)
+    keys = ['key-%d' % (i % 50) for i in range(500)]
+    cached.update_many(keys)
+    c.update_many(keys)
+    for key in set(keys):
+        cached.update(key)
+        c.update(key)
+        assert cached.get(key) == c.get(key)
+    assert cached.count == c.count
+    assert cached.get_ranking() == c.get_ranking()
+    assert cached.cache_info().hits > 0
+    assert cached.copy().cache_size == 20
+
+
+def test_merge_count_min_sketches():
+    c1 = CountMinSketch(10 ** -7, 0.01, 2)
+    c2 = CountMinSketch(10 ** -7, 0.01, 2, seeds=c1.seeds)
+
+    c1.update('www.google.de', 10)
+    c1.update('www.bing.com', 3)
+    c2.update('www.google.de', 2)
+    c2.update('www.yahoo.com', 12)
+
+    merged = c1 | c2
+    assert merged.get('www.google.de') == 12
+    assert merged.get('www.yahoo.com') == 12
+    ranking = merged.get_ranking()
+    assert ranking[0][0] == 12
+    assert sorted(ranking[0][1]) == ['www.google.de', 'www.yahoo.com']
+    assert ranking[1] == (3, ['www.bing.com'])
+    assert c1.get('www.google.de') == 10
+
+    c1.merge(c2)
+    assert c1.get('www.google.de') == 12
+    assert c1.get('www.bing.com') == 3
+
+    with pytest.raises(ValueError):
+        c1.merge(CountMinSketch(10 ** -7, 0.01, 2))
+
+
+def test_merge_redis_count_min_sketches(redis_prefix):
+    from streamingds.redis.countminsketch import RedisCountMinSketch
+
+    c1 = RedisCountMinSketch(0.01, 0.01, 2, redis_prefix=redis_prefix)
+    c2 = RedisCountMinSketch(0.01, 0.01, 2, seeds=c1.seeds,
+                             redis_prefix=redis_prefix + ':other')
+    local = CountMinSketch(0.01, 0.01, 2, seeds=c1.seeds)
+    c1.update('www.google.de', 10)
+    c2.update('www.google.de', 2)
+    c2.update('www.yahoo.com', 12)
+    local.update('www.bing.com', 3)
+
+    c1.merge(c2)
+    c1.merge(local)
+    assert c1.get('www.google.de') == 12
+    assert c1.get('www.yahoo.com') == 12
+    assert c1.get('www.bing.com') == 3
+    assert c2.get('www.google.de') == 2
+    assert sorted(c1.get_ranking()[0][1]) == ['www.google.de',
+                                              'www.yahoo.com']
+
+    merged = local | c1
+    assert merged.get('www.bing.com') == 6
+    assert merged.get('www.yahoo.com') == 12
+
+
 @pytest.mark.parametrize("k,amount_keys,replays",
                          [(randint(10, 50),
                            randint(80, 100),
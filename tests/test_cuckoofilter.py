@@ -0,0 +1,97 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import pickle
+
+import pytest
+
+from streamingds.bloomfilter import BloomFilter
+from streamingds.cuckoofilter import CuckooFilter, _get_field, _set_field
+
+
+def test_fields():
+    data = bytearray(4)
+    _set_field(data, 3, 13, 0x1abc)
+    _set_field(data, 16, 5, 0x1f)
+    assert _get_field(data, 3, 13) == 0x1abc
+    assert _get_field(data, 16, 5) == 0x1f
+    _set_field(data, 3, 13, 0)
+    assert data == bytearray([0, 0, 0xf8, 0])
+
+
+@pytest.mark.parametrize('capacity,error_rate', [
+    (1000, 0.01), (5000, 0.001), (2000, 0.0001)])
+def test_cuckoo_filter(capacity, error_rate):
+    cf = CuckooFilter(capacity, error_rate)
+    keys = ['key-%d' % i for i in range(capacity)]
+    cf.add_many(keys)
+    assert len(cf) == capacity
+    assert all(key in cf for key in keys)
+
+    absent = ['absent-%d' % i for i in range(20000)]
+    false_positives = sum(1 for key in absent if key in cf)
+    assert false_positives / len(absent) < 2 * error_rate + 0.001
+
+
+def test_remove():
+    cf = CuckooFilter(1000, 0.001)
+    cf.add_many(str(i) for i in range(1000))
+    for i in range(0, 1000, 2):
+        assert cf.remove(str(i))
+    assert len(cf) == 500
+    assert all(str(i) in cf for i in range(1, 1000, 2))
+    assert sum(1 for i in range(0, 1000, 2) if str(i) in cf) < 5
+    assert not cf.remove('absent')
+
+    cf.add('a')
+    cf.add('a')
+    assert cf.remove('a')
+    assert 'a' in cf
+    assert cf.remove('a')
+    assert 'a' not in cf
+
+
+def test_full_filter():
+    cf = CuckooFilter(50, 0.01, max_kicks=50)
+    added = []
+    with pytest.raises(ValueError):
+        for i in range(1000):
+            cf.add(str(i))
+            added.append(str(i))
+    assert len(added) >= 50
+    assert len(cf) == len(added)
+    assert all(key in cf for key in added)
+
+    # removing keys makes room for the evicted fingerprint
+    for key in added[:10]:
+        assert cf.remove(key)
+    assert all(key in cf for key in added[10:])
+    cf.add('new')
+    assert 'new' in cf
+
+
+def test_smaller_than_bloomfilter():
+    cf = CuckooFilter(10000, 0.001)
+    bf = BloomFilter(10000, 0.001)
+    assert len(cf._data) * 8 < bf.bits
+
+
+def test_pickle():
+    cf = CuckooFilter(100, 0.01, cache_size=10)
+    cf.add_many(['a', 'b'])
+    restored = pickle.loads(pickle.dumps(cf))
+    assert 'a' in restored and 'b' in restored
+    assert len(restored) == 2
+    assert restored.seeds == cf.seeds
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        CuckooFilter(0)
+    with pytest.raises(ValueError):
+        CuckooFilter(100, 1.5)
+    with pytest.raises(ValueError):
+        CuckooFilter(100, bucket_size=0)
+    with pytest.raises(ValueError):
+        CuckooFilter(100, 10 ** -12)
@@ -0,0 +1,127 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from collections import Counter
+import pickle
+import random
+
+import pytest
+
+from streamingds.dyadic import DyadicCountMinSketch
+
+
+def _stream(n=20000, universe_bits=16):
+    random.seed(42)
+    heavy = [7, 1000, 65535]
+    keys = [random.choice(heavy) for _ in range(n // 4)]
+    keys += [random.randint(0, 2 ** universe_bits - 1)
+             for _ in range(n - len(keys))]
+    return keys
+
+
+def test_point_and_range_queries():
+    keys = _stream()
+    counts = Counter(keys)
+    sketch = DyadicCountMinSketch(10 ** -3, 0.01, universe_bits=16)
+    sketch.update_many(keys)
+
+    assert sketch.total == len(keys)
+    assert sketch.range_count(0, 2 ** 16 - 1) == len(keys)
+    assert sketch.range_count(-10, 2 ** 20) == len(keys)
+    assert sketch.range_count(10, 5) == 0
+
+    bound = 2 * 16 * 0.01 * len(keys)
+    for lo, hi in [(0, 0), (7, 7), (3, 1000), (1001, 30000),
+                   (12345, 65535), (5, 6)]:
+        exact = sum(count for key, count in counts.items()
+                    if lo <= key <= hi)
+        estimate = sketch.range_count(lo, hi)
+        assert exact <= estimate <= exact + bound
+
+    for key in (7, 1000, 65535, 12):
+        assert counts[key] <= sketch.get(key) <= counts[key] + \
+            0.01 * len(keys)
+
+
+def test_heavy_hitters():
+    keys = _stream()
+    counts = Counter(keys)
+    sketch = DyadicCountMinSketch(10 ** -3, 0.01, universe_bits=16)
+    sketch.update_many(keys)
+
+    heavy = sketch.heavy_hitters(0.05)
+    assert set(key for key, _ in heavy) == set([7, 1000, 65535])
+    assert all(est >= counts[key] for key, est in heavy)
+    assert DyadicCountMinSketch(0.01, 0.01).heavy_hitters(0.1) == []
+
+    with pytest.raises(ValueError):
+        sketch.heavy_hitters(0)
+
+
+def test_invalid_keys():
+    sketch = DyadicCountMinSketch(0.01, 0.01, universe_bits=8)
+    for key in (-1, 256, 1.5):
+        with pytest.raises(ValueError):
+            sketch.update(key)
+    with pytest.raises(ValueError):
+        DyadicCountMinSketch(0.01, 0.01, universe_bits=0)
+
+
+def test_merge_copy_and_pickle():
+    seeds = [1, 2, 3, 4, 5]
+    a = DyadicCountMinSketch(0.01, 0.01, universe_bits=20, seeds=seeds,
+                             counter_type='uint8')
+    b = DyadicCountMinSketch(0.01, 0.01, universe_bits=20, seeds=seeds,
+                             counter_type='uint8')
+    a.update_many(range(1000))
+    b.update_many(range(500, 1500))
+
+    merged = a | b
+    assert merged.total == 2000
+    assert merged.range_count(500, 999) >= 1000
+    assert a.total == 1000
+
+    restored = pickle.loads(pickle.dumps(merged))
+    assert restored.range_count(0, 2 ** 20) == 2000
+    assert restored.get(600) == merged.get(600)
+
+    with pytest.raises(ValueError):
+        a.merge(DyadicCountMinSketch(0.01, 0.01, universe_bits=16,
+                                     seeds=seeds))
+
+
+def test_redis_dyadic_count_min_sketch(redis_prefix):
+    from streamingds.redis.countminsketch import RedisDyadicCountMinSketch
+
+    sketch = RedisDyadicCountMinSketch(0.1, 0.1, universe_bits=10,
+                                       redis_prefix=redis_prefix)
+    local = DyadicCountMinSketch(0.1, 0.1, universe_bits=10,
+                                 seeds=sketch.seeds)
+    keys = [3, 3, 3, 500, 501, 1023]
+    sketch.update_many(keys)
+    local.update_many(keys)
+
+    assert sketch.total == 6
+    assert sketch.range_count(0, 499) == local.range_count(0, 499)
+    assert sketch.range_count(500, 1023) == local.range_count(500, 1023)
+    assert sketch.heavy_hitters(0.4) == local.heavy_hitters(0.4)
+
+    other = RedisDyadicCountMinSketch(0.1, 0.1, universe_bits=10,
+                                      redis_prefix=redis_prefix + ':other',
+                                      seeds=sketch.seeds, cache_size=10)
+    other.update_many([3, 700])
+    sketch.merge(other)
+    sketch.merge(local)
+    assert sketch.total == 14
+    assert sketch.get(3) == 7
+    assert sketch.range_count(600, 799) == 1
+    assert other.total == 2
+
+    merged = local | sketch
+    assert merged.get(3) == 10
+    assert merged.range_count(0, 1023) == 20
+
+    with pytest.raises(ValueError):
+        RedisDyadicCountMinSketch(0.1, 0.1, redis_prefix=redis_prefix,
+                                  counter_type='uint8')
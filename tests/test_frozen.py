@@ -0,0 +1,226 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import multiprocessing
+import pickle
+
+import pytest
+
+from streamingds import frozen
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countingbloomfilter import CountingBloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.cuckoofilter import CuckooFilter
+from streamingds.dyadic import DyadicCountMinSketch
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.kll import KLLSketch
+from streamingds.minhash import MinHash, MinHashLSH
+
+
+@pytest.fixture(params=[True, False], ids=['numpy', 'python'])
+def with_numpy(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(frozen, 'numpy', None)
+    elif frozen.numpy is None:
+        pytest.skip('NumPy is not installed')
+
+
+def _reload(sketch, tmpdir):
+    path = str(tmpdir.join('sketch.frozen'))
+    sketch.save(path)
+    return frozen.load(path)
+
+
+def test_bloom_filter(tmpdir, with_numpy):
+    bf = BloomFilter(1000, 0.01)
+    bf.add_many(str(i) for i in range(500))
+    keys = [str(i) for i in range(0, 1000, 7)]
+
+    for fbf in (bf.freeze(), _reload(bf.freeze(), tmpdir)):
+        assert isinstance(fbf, frozen.FrozenBloomFilter)
+        assert fbf.contains_many(keys) == [key in bf for key in keys]
+        assert all(str(i) in fbf for i in range(500))
+        assert fbf.fill_ratio() == bf.fill_ratio()
+        assert abs(len(fbf) - len(bf)) < 1e-6
+    assert fbf.contains_many([]) == []
+
+    # the snapshot does not change with the filter
+    fbf = bf.freeze()
+    bf.add('new')
+    assert 'new' in bf
+    assert 'new' not in fbf
+
+
+def test_counting_bloom_filter():
+    cbf = CountingBloomFilter(1000, 0.01)
+    cbf.add_many(['a', 'b', 'c'])
+    cbf.remove('b')
+    fbf = cbf.freeze()
+    assert fbf.contains_many(['a', 'b', 'c']) == [True, False, True]
+    assert fbf.fill_ratio() == cbf.fill_ratio()
+
+
+@pytest.mark.parametrize('error_rate', [0.03, 0.001, 1e-6])
+def test_cuckoo_filter(tmpdir, with_numpy, error_rate):
+    cf = CuckooFilter(1000, error_rate)
+    cf.add_many(str(i) for i in range(900))
+    cf.remove('7')
+    keys = [str(i) for i in range(0, 2000, 3)]
+
+    for fcf in (cf.freeze(), _reload(cf.freeze(), tmpdir)):
+        assert isinstance(fcf, frozen.FrozenCuckooFilter)
+        assert fcf.contains_many(keys) == [key in cf for key in keys]
+        assert all(str(i) in fcf for i in range(8, 900))
+        assert len(fcf) == len(cf) == 899
+        assert fcf.load_factor() == cf.load_factor()
+    assert fcf.contains_many([]) == []
+
+
+def test_cuckoo_filter_victim(with_numpy):
+    cf = CuckooFilter(8, 0.1, bucket_size=1, max_kicks=0)
+    added = []
+    with pytest.raises(ValueError):
+        for i in range(100):
+            cf.add(str(i))
+            added.append(str(i))
+    fcf = cf.freeze()
+    # the key that filled the filter is kept as the victim
+    assert fcf.contains_many(added) == [True] * len(added)
+    assert all(key in fcf for key in added)
+
+
+def test_count_min_sketch(tmpdir, with_numpy):
+    cms = CountMinSketch(0.01, 0.01, 3)
+    for i in range(1, 50):
+        cms.update('key-%d' % i, i)
+    keys = ['key-%d' % i for i in range(60)]
+
+    for fcms in (cms.freeze(), _reload(cms.freeze(), tmpdir)):
+        assert isinstance(fcms, frozen.FrozenCountMinSketch)
+        assert fcms.get_many(keys) == [cms.get(key) for key in keys]
+        assert fcms.get('key-10') == cms.get('key-10')
+        assert fcms.get_ranking() == cms.get_ranking()
+        assert fcms.top[0] == (49, ['key-49'])
+        assert fcms.nbytes == 8 * cms.bits * cms.num_hash_fns
+
+
+def test_compact_count_min_sketch():
+    cms = CountMinSketch(0.01, 0.01, 3, counter_type='uint8')
+    cms.update('big', 1000)
+    cms.update('small', 3)
+    assert cms.freeze().get_many(['big', 'small']) == [1000, 3]
+
+
+@pytest.mark.parametrize('universe_bits', [4, 16])
+def test_dyadic_count_min_sketch(tmpdir, with_numpy, universe_bits):
+    sketch = DyadicCountMinSketch(0.01, 0.01, universe_bits)
+    for key in range(0, 2 ** universe_bits, 3):
+        sketch.update(key, key % 7 + 1)
+    sketch.update(5, 100000)
+    keys = list(range(2 ** min(universe_bits, 8)))
+
+    for fds in (sketch.freeze(), _reload(sketch.freeze(), tmpdir)):
+        assert isinstance(fds, frozen.FrozenDyadicCountMinSketch)
+        assert fds.get_many(keys) == [sketch.get(key) for key in keys]
+        assert fds.get(5) == sketch.get(5)
+        assert fds.total == sketch.total
+        for lo, hi in [(0, 2 ** universe_bits), (3, 12), (5, 5)]:
+            assert fds.range_count(lo, hi) == sketch.range_count(lo, hi)
+        assert fds.heavy_hitters(0.1) == sketch.heavy_hitters(0.1)
+        assert fds.heavy_hitters(0.1)[0][0] == 5
+    with pytest.raises(ValueError):
+        fds.get(2 ** universe_bits)
+
+
+def test_minhash(tmpdir, with_numpy):
+    seeds = MinHash().seeds
+    a = MinHash.of(range(100), seeds=seeds)
+    b = MinHash.of(range(50, 150), seeds=seeds)
+    small = MinHash.of(range(3), seeds=seeds)
+
+    for fa in (a.freeze(), _reload(a.freeze(), tmpdir)):
+        assert isinstance(fa, frozen.FrozenMinHash)
+        assert fa.digest() == a.digest()
+        assert fa.jaccard(b) == a.jaccard(b)
+        assert fa.jaccard(b.freeze()) == a.jaccard(b)
+        assert fa.jaccard_many([a, b, small.freeze()]) == [
+            1.0, a.jaccard(b), a.jaccard(small)]
+        assert not fa.is_empty()
+    assert small.freeze().digest() == small.digest()
+    assert MinHash(seeds=seeds).freeze().is_empty()
+    with pytest.raises(ValueError):
+        fa.jaccard(MinHash.of(range(100)))
+
+    lsh = MinHashLSH(0.5)
+    lsh.insert('a', fa)
+    assert lsh.query(a) == set(['a'])
+
+
+def test_hyperloglog_and_kll(tmpdir):
+    hll = HyperLogLog(10)
+    hll.add_many(range(1000))
+    fhll = _reload(hll.freeze(), tmpdir)
+    assert fhll.cardinality() == hll.cardinality()
+    assert len(fhll) == len(hll)
+    assert fhll.nbytes == 2 ** 10
+
+    kll = KLLSketch(100)
+    kll.add_many(range(10000))
+    fkll = _reload(kll.freeze(), tmpdir)
+    qs = [0, 0.1, 0.5, 0.99, 1]
+    assert fkll.quantiles(qs) == kll.quantiles(qs)
+    assert fkll.rank(5000) == kll.rank(5000)
+    assert len(fkll) == 10000
+
+    with pytest.raises(ValueError):
+        KLLSketch().freeze().quantile(0.5)
+
+
+def test_pickle_and_invalid_data():
+    cms = CountMinSketch(0.01, 0.01, 3)
+    cms.update('a', 5)
+    copy = pickle.loads(pickle.dumps(cms.freeze(), pickle.HIGHEST_PROTOCOL))
+    assert copy.get('a') == 5
+
+    with pytest.raises(ValueError):
+        frozen.loads(b'\0' * 64)
+
+
+def _query(path):
+    return frozen.load(path).get('shared')
+
+
+def test_shared_between_processes(tmpdir):
+    cms = CountMinSketch(0.01, 0.01, 3)
+    cms.update('shared', 42)
+    path = str(tmpdir.join('cms.frozen'))
+    cms.freeze().save(path)
+
+    pool = multiprocessing.Pool(2)
+    try:
+        assert pool.map(_query, [path] * 4) == [42] * 4
+    finally:
+        pool.close()
+        pool.join()
+
+
+def test_redis_bloom_filter(redis_prefix):
+    from streamingds.redis.bloomfilter import RedisBloomFilter
+
+    bf = RedisBloomFilter(1000, 0.01, redis_prefix=redis_prefix)
+    bf.add_many(['a', 'b'])
+    fbf = bf.freeze()
+    assert fbf.contains_many(['a', 'b', 'c']) == [True, True, 'c' in bf]
+    assert fbf.seeds == list(bf.seeds)
+
+
+def test_redis_dyadic_count_min_sketch(redis_prefix):
+    from streamingds.redis.countminsketch import RedisDyadicCountMinSketch
+
+    sketch = RedisDyadicCountMinSketch(0.01, 0.01, 8,
+                                       redis_prefix=redis_prefix)
+    sketch.update_many([3, 3, 200])
+    fds = sketch.freeze()
+    assert fds.get_many([3, 200, 4]) == [2, 1, sketch.get(4)]
+    assert fds.range_count(0, 100) == sketch.range_count(0, 100)
@@ -6,7 +6,7 @@ from random import randint, sample
 
 import pytest
 
-from streamingds.hashing import Hashing
+from streamingds.hashing import HashCache, Hashing, generate_seeds
 
 
 _WORDS = """Lorem ipsum dolor sit amet, consetetur sadipscing elitr, sed diam
@@ -36,3 +36,59 @@ def test_simple_hashing(slices, bits_ps, key_counter):
 
     for key in keys:
         assert list(h.hash_values(key)) == list(h.hash_values(key))
+
+
+def test_explicit_seeds():
+    seeds = generate_seeds(4, random_state=42)
+    assert seeds == generate_seeds(4, random_state=42)
+
+    h1 = Hashing(4, 1000, seeds)
+    h2 = Hashing(4, 1000, seeds)
+    for word in _WORDS:
+        assert list(h1.hash_values(word)) == list(h2.hash_values(word))
+
+    with pytest.raises(ValueError):
+        Hashing(3, 1000, seeds)
+
+
+def test_hash_cache():
+    h = Hashing(4, 1000, cache_size=10)
+    uncached = Hashing(4, 1000, h.seeds)
+    assert h.cache_info() == (0, 0, 10, 0)
+    assert uncached.cache_info() is None
+
+    for word in _WORDS * 2:
+        assert list(h.hash_values(word)) == uncached.hash_values(word)
+    info = h.cache_info()
+    assert info.hits + info.misses == 2 * len(_WORDS)
+    assert info.currsize == 10
+
+    h.cache_size = 0
+    assert h.cache_info() is None
+    assert h.hash_values('key') == uncached.hash_values('key')
+
+
+def test_hash_cache_keeps_hot_keys():
+    cache = HashCache(3)
+    cache.put('hot', 1)
+    for i in range(10):
+        assert cache.get('hot') == 1
+        cache.put(i, i)
+    assert len(cache) == 3
+    assert cache.get(9) == 9
+    assert cache.get(0) is None
+    assert cache.info() == (11, 1, 3, 3)
+
+    cache.clear()
+    assert cache.info() == (0, 0, 3, 0)
+
+
+def test_hash_cache_cleared_on_new_seeds():
+    h = Hashing(4, 1000, cache_size=10)
+    before = h.hash_values('key')
+    h.seeds = generate_seeds(4, random_state=1)
+    assert h.cache_info().currsize == 0
+    assert h.hash_values('key') != before
+
+    with pytest.raises(ValueError):
+        HashCache(0)
@@ -0,0 +1,108 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import ctypes
+from multiprocessing.sharedctypes import RawArray
+import random
+
+import pytest
+from pyhashxx import hashxx
+
+from streamingds import _kernels
+from streamingds.hashing import generate_seeds
+
+
+_RANDOM = random.Random(42)
+
+_KEYS = [b'', b'a', b'abc', b'abcd', b'0123456789abcde',
+         b'0123456789abcdef', b'0123456789abcdef0'] + [
+    bytes(bytearray(_RANDOM.randint(0, 255)
+                    for _ in range(_RANDOM.randint(0, 100))))
+    for _ in range(200)]
+
+_SEEDS = generate_seeds(8, random_state=0) + [0, 1, 2 ** 32 - 1, 2 ** 32]
+
+_HASHES = [_RANDOM.getrandbits(64) for _ in range(5000)] + [
+    0, 1, 2 ** 64 - 1, 2 ** 63]
+
+
+@pytest.fixture(params=['python', 'compiled'])
+def kernels(request):
+    if request.param == 'compiled':
+        return pytest.importorskip('streamingds._speedups')
+    return _kernels
+
+
+def test_hash_indices_matches_hashxx():
+    for key in _KEYS:
+        assert _kernels.hash_indices(key, _SEEDS, 1009) == [
+            hashxx(key, seed=seed) % 1009 for seed in _SEEDS]
+
+
+@pytest.mark.parametrize('bits', [1, 7, 1009, 2 ** 32])
+def test_hash_indices(kernels, bits):
+    for key in _KEYS:
+        assert (kernels.hash_indices(key, _SEEDS, bits) ==
+                _kernels.hash_indices(key, _SEEDS, bits))
+
+
+def test_double_hash_indices(kernels):
+    for h1, h2 in zip(_HASHES, reversed(_HASHES)):
+        for bits in (7, 1009, 2 ** 40):
+            assert (kernels.double_hash_indices(h1, h2, 10, bits) ==
+                    _kernels.double_hash_indices(h1, h2, 10, bits))
+    assert kernels.double_hash_indices(3, 5, 4, 7) == [3, 1, 6, 4]
+
+
+def test_bits(kernels):
+    indices = _RANDOM.sample(range(1000), 300)
+    expected = bytearray(125)
+    _kernels.set_bits(expected, indices)
+
+    for data in (bytearray(125), RawArray(ctypes.c_ubyte, 125)):
+        kernels.set_bits(data, indices)
+        assert bytearray(data) == expected
+        assert kernels.count_bits(data) == 300
+        assert kernels.test_bits(data, indices)
+        assert not kernels.test_bits(
+            data, [i for i in range(1000) if i not in indices][:1])
+
+        kernels.clear_bits(data, indices[:100])
+        assert kernels.count_bits(data) == 200
+        assert not kernels.test_bits(data, indices[:1])
+        assert kernels.test_bits(data, indices[100:])
+
+
+def test_bit_order(kernels):
+    data = bytearray(2)
+    kernels.set_bits(data, [0, 9, 15])
+    assert data == bytearray([0x80, 0x41])
+
+
+def test_add_to_rows(kernels):
+    rows = [[0] * 10 for _ in range(3)]
+    assert kernels.add_to_rows(rows, [1, 2, 3], 5) == 5
+    assert kernels.add_to_rows(rows, [1, 4, 3], 2) == 2
+    assert rows[0][1] == 7
+    assert rows[1][2] == 5
+    assert rows[1][4] == 2
+    assert rows[2][3] == 7
+
+
+@pytest.mark.parametrize('p', [4, 10, 16])
+def test_hll(kernels, p):
+    expected = bytearray(1 << p)
+    _kernels.hll_update(expected, _HASHES, p)
+    assert max(expected) == 64 - p + 1
+
+    registers = bytearray(1 << p)
+    kernels.hll_update(registers, _HASHES, p)
+    assert registers == expected
+    assert kernels.hll_sums(registers) == _kernels.hll_sums(expected)
+
+
+def test_hll_sums(kernels):
+    total, zeros = kernels.hll_sums(bytearray([0, 0, 1, 2, 61]))
+    assert total == 2.0 + 0.5 + 0.25 + 2.0 ** -61
+    assert zeros == 2
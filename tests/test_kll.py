@@ -0,0 +1,101 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import pickle
+import random
+
+import pytest
+
+from streamingds.kll import KLLSketch
+
+
+def _rank_error(sketch, values):
+    values = sorted(values)
+    n = len(values)
+    errors = []
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.99):
+        estimate = sketch.quantile(q)
+        true_rank = sum(1 for v in values if v <= estimate) / n
+        errors.append(abs(true_rank - q))
+    return max(errors)
+
+
+def _latencies(n, seed=0):
+    rnd = random.Random(seed)
+    return [rnd.lognormvariate(3, 1) for _ in range(n)]
+
+
+def test_quantiles():
+    values = _latencies(100000)
+    sketch = KLLSketch(seed=0)
+    for value in values[:1000]:
+        sketch.add(value)
+    sketch.add_many(values[1000:])
+
+    assert len(sketch) == len(values)
+    assert sketch.quantile(0) == min(values)
+    assert sketch.quantile(1) == max(values)
+    assert _rank_error(sketch, values) < 0.02
+    assert sum(len(level) for level in sketch._levels) < 3 * sketch.k + 20
+
+    median = sketch.quantile(0.5)
+    assert abs(sketch.rank(median) - 0.5) < 0.02
+    assert sketch.rank(min(values) - 1) == 0
+    assert sketch.rank(max(values)) == 1
+
+
+def test_small_streams_are_exact():
+    sketch = KLLSketch()
+    sketch.add_many(range(1, 101))
+    assert sketch.quantile(0.5) == 50
+    assert sketch.quantiles([0.1, 0.99]) == [10, 99]
+    assert sketch.rank(25) == 0.25
+
+
+def test_merge():
+    values = _latencies(60000)
+    sketches = [KLLSketch(seed=i) for i in range(3)]
+    for i, sketch in enumerate(sketches):
+        sketch.add_many(values[i * 20000:(i + 1) * 20000])
+
+    merged = sketches[0] | sketches[1]
+    merged.merge(sketches[2])
+    assert len(merged) == 60000
+    assert len(sketches[0]) == 20000
+    assert _rank_error(merged, values) < 0.02
+
+    with pytest.raises(ValueError):
+        merged.merge(KLLSketch(100))
+
+
+def test_numpy():
+    np = pytest.importorskip('numpy')
+    values = np.random.RandomState(0).exponential(10, size=(200, 100))
+    sketch = KLLSketch()
+    sketch.add_many(values)
+    assert len(sketch) == 20000
+    assert abs(sketch.quantile(0.9) - np.percentile(values, 90)) < 1
+
+
+def test_pickle():
+    sketch = KLLSketch(seed=0)
+    sketch.add_many(_latencies(50000))
+    data = pickle.dumps(sketch, pickle.HIGHEST_PROTOCOL)
+    assert len(data) < 12 * 3 * sketch.k + 500
+
+    restored = pickle.loads(data)
+    assert restored.quantiles([0.5, 0.99]) == sketch.quantiles([0.5, 0.99])
+    restored.add_many(_latencies(1000, seed=1))
+    assert len(restored) == 51000
+
+
+def test_invalid():
+    with pytest.raises(ValueError):
+        KLLSketch(4)
+    with pytest.raises(ValueError):
+        KLLSketch().quantile(0.5)
+    sketch = KLLSketch()
+    sketch.add(1)
+    with pytest.raises(ValueError):
+        sketch.quantile(1.5)
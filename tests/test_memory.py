@@ -0,0 +1,121 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import ctypes
+import sys
+
+import pytest
+
+from streamingds.bloomfilter import BloomFilter
+from streamingds.composite import CompositeSketch
+from streamingds.countingbloomfilter import CountingBloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.cuckoofilter import CuckooFilter
+from streamingds.dyadic import DyadicCountMinSketch
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.kll import KLLSketch
+from streamingds.memory import sizeof
+from streamingds.minhash import MinHash, MinHashLSH
+
+
+def test_sizeof():
+    small = [1, 2, 3]
+    assert sizeof(small) == sys.getsizeof(small)
+
+    large = [10 ** 6 + i for i in range(3)]
+    assert sizeof(large) == sys.getsizeof(large) + sum(
+        sys.getsizeof(i) for i in large)
+
+    shared = bytearray(1000)
+    assert sizeof([shared, shared]) == sys.getsizeof([shared, shared]) + \
+        sys.getsizeof(shared)
+    assert sizeof([shared], shared) == sys.getsizeof([shared])
+
+    buf = (ctypes.c_char * 10000)()
+    assert sizeof(buf) > 10000
+
+
+@pytest.mark.parametrize('small,large', [
+    (BloomFilter(1000, 0.1), BloomFilter(1000, 0.001)),
+    (CountMinSketch(0.1, 0.1, 5), CountMinSketch(0.1, 0.01, 5)),
+    (CuckooFilter(1000, 0.1), CuckooFilter(10000, 0.1)),
+    (DyadicCountMinSketch(0.1, 0.1, 16), DyadicCountMinSketch(0.1, 0.01, 16)),
+    (HyperLogLog(8), HyperLogLog(12)),
+    (KLLSketch(50), KLLSketch(400)),
+    (MinHash(16), MinHash(256)),
+    (MinHashLSH(num_perm=16), MinHashLSH(num_perm=256)),
+])
+def test_memory_usage_grows_with_accuracy(small, large):
+    for sketch in (small, large):
+        for name in ('bitarray', 'count'):
+            getattr(sketch, name, None)
+        if isinstance(sketch, KLLSketch):
+            sketch.add_many(range(10000))
+        if isinstance(sketch, MinHashLSH):
+            sketch.insert('a', [0] * sketch.num_perm)
+    assert 0 < small.memory_usage() < large.memory_usage()
+
+
+def test_memory_usage_counts_the_data():
+    bf = BloomFilter(100000, 0.01)
+    bf.add('test')
+    assert bf.memory_usage() > bf.bits / 8
+
+    hll = HyperLogLog(14)
+    assert hll.memory_usage() > 2 ** 14
+
+    composite = CompositeSketch(bf, hyperloglog=hll)
+    assert composite.memory_usage() >= bf.memory_usage() + \
+        hll.memory_usage() - 1000
+
+
+@pytest.mark.parametrize('nbytes', [10 ** 4, 10 ** 5, 10 ** 6])
+def test_bloom_filter_for_memory(nbytes):
+    bf = BloomFilter.for_memory(nbytes, 10000)
+    assert bf.memory_usage() <= nbytes
+    assert bf._capacity == 10000
+
+    # a slightly lower error rate does not fit anymore
+    if bf._error_rate > 1e-15:
+        more = BloomFilter(10000, bf._error_rate * 0.9)
+        more.bitarray
+        assert more.memory_usage() > nbytes
+
+
+def test_counting_bloom_filter_for_memory():
+    cbf = CountingBloomFilter.for_memory(100000, 10000)
+    assert isinstance(cbf, CountingBloomFilter)
+    assert cbf.memory_usage() <= 100000
+    # four bits per counter leave a higher error rate than a bloom filter
+    assert cbf._error_rate > BloomFilter.for_memory(100000, 10000)._error_rate
+
+
+@pytest.mark.parametrize('counter_type', ['int', 'uint8'])
+def test_count_min_sketch_for_memory(counter_type):
+    cms = CountMinSketch.for_memory(50000, 10, counter_type=counter_type)
+    assert cms.memory_usage() <= 50000
+    assert cms.counter_type == counter_type
+    assert cms.k == 10
+
+    smaller = CountMinSketch.for_memory(20000, 10, counter_type=counter_type)
+    assert smaller._epsilon > cms._epsilon
+
+
+def test_for_memory_with_too_small_budgets():
+    with pytest.raises(ValueError):
+        BloomFilter.for_memory(100, 10000)
+    with pytest.raises(ValueError):
+        CountMinSketch.for_memory(100, 10)
+    with pytest.raises(ValueError):
+        HyperLogLog.for_memory(100)
+
+
+def test_hyperloglog_and_cuckoo_filter_for_memory():
+    hll = HyperLogLog.for_memory(10000)
+    assert hll._p == 13
+    assert hll.memory_usage() <= 10000
+
+    cf = CuckooFilter.for_memory(100000, 10000)
+    assert cf.memory_usage() <= 100000
+    assert cf._error_rate < 0.001
@@ -0,0 +1,89 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import pytest
+
+from streamingds import metrics
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.hashing import Hashing
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.threadsafe import ThreadSafeCountMinSketch
+
+
+@pytest.yield_fixture
+def registry():
+    registry = metrics.Registry()
+    metrics.enable(registry)
+    yield registry
+    metrics.disable()
+
+
+def test_disabled_instrumentation_restores_methods(registry):
+    assert metrics.is_enabled()
+    assert Hashing.hash_values.__name__ == 'hash_values'
+    metrics.disable()
+    assert not metrics.is_enabled()
+    assert Hashing.__dict__['hash_values'].__module__ == 'streamingds.hashing'
+    assert not hasattr(Hashing.__dict__['hash_values'], '__wrapped__')
+
+    BloomFilter(100).add('test')
+    assert registry.snapshot()['timings'] == {}
+
+
+def test_instrumented_sketches(registry):
+    cms = CountMinSketch(10 ** -3, 0.01, 2)
+    cms.update('a')
+    cms.update('b', 2)
+    cms.update('c', 3)
+    cms.get('a')
+
+    bf = BloomFilter(100)
+    bf.add('a')
+    'a' in bf
+
+    hll = HyperLogLog(4)
+    hll.add_many(['a', 'b'])
+
+    snapshot = registry.snapshot()
+    timings = snapshot['timings']
+    assert timings['CountMinSketch.update']['count'] == 3
+    assert timings['CountMinSketch.get']['count'] == 1
+    assert timings['CountMinSketch.update_heap']['count'] == 3
+    assert timings['BloomFilter.add']['count'] == 1
+    assert timings['BloomFilter.__contains__']['count'] == 1
+    assert timings['HyperLogLog.add_many']['count'] == 1
+    assert timings['CountMinSketch.hash_values']['count'] == 4
+    assert timings['BloomFilter.hash_values']['count'] == 2
+    assert snapshot['counters']['Heap.push'] == 2
+    assert snapshot['counters']['Heap.pushpop'] == 1
+
+
+def test_instrumented_subclasses(registry):
+    cms = ThreadSafeCountMinSketch(10 ** -3, 0.01, 2)
+    cms.update_many(['a', 'b', 'a'])
+    cms.update('c')
+    # ThreadSafeCountMinSketch.merge calls CountMinSketch.merge
+    cms.merge(ThreadSafeCountMinSketch(10 ** -3, 0.01, 2, seeds=cms.seeds))
+
+    timings = registry.snapshot()['timings']
+    assert timings['ThreadSafeCountMinSketch.update_many']['count'] == 1
+    assert timings['ThreadSafeCountMinSketch.update']['count'] == 1
+    assert timings['ThreadSafeCountMinSketch.merge']['count'] == 1
+    assert 'CountMinSketch.update_many' not in timings
+
+    metrics.disable()
+    method = ThreadSafeCountMinSketch.__dict__['update_many']
+    assert method.__code__.co_name == 'update_many'
+
+
+def test_report_gauges():
+    registry = metrics.Registry()
+    bf = BloomFilter(100, 0.01)
+    bf.add_many(str(i) for i in range(100))
+    metrics.report(bf, 'dedup', registry)
+
+    gauges = registry.snapshot()['gauges']
+    assert 0.4 < gauges['dedup.fill_ratio'] < 0.6
+    assert 0.005 < gauges['dedup.estimated_error_rate'] < 0.02
@@ -0,0 +1,119 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import pickle
+import random
+
+import pytest
+
+from streamingds import minhash as minhash_module
+from streamingds.hashing import generate_seeds
+from streamingds.minhash import MinHash, MinHashLSH, jaccard, optimal_bands
+
+
+SEEDS = generate_seeds(1, random_state=0)
+
+
+def _sets(similarity, size=2000, seed=0):
+    """Return two sets with the given Jaccard similarity."""
+    rnd = random.Random(seed)
+    shared = int(round(2 * size * similarity / (1 + similarity)))
+    elements = ['e%d' % rnd.getrandbits(40) for _ in range(2 * size - shared)]
+    a = elements[:size]
+    b = elements[:shared] + elements[size:]
+    return a, b
+
+
+@pytest.mark.parametrize('similarity', [0.1, 0.5, 0.9])
+def test_jaccard(similarity):
+    a, b = _sets(similarity)
+    ma, mb = MinHash.bulk([a, b], num_perm=256, seeds=SEEDS)
+    assert abs(ma.jaccard(mb) - similarity) < 0.1
+    assert ma.jaccard(ma) == 1.0
+
+
+def test_small_sets_are_densified():
+    m = MinHash.of(['a', 'b', 'c'], seeds=SEEDS)
+    assert m.digest().count(2 ** 32) == 0
+    assert MinHash.of(['c', 'b', 'a'], seeds=SEEDS).digest() == m.digest()
+    assert MinHash(seeds=SEEDS).is_empty()
+    assert MinHash(seeds=SEEDS).jaccard(MinHash(seeds=SEEDS)) == 1.0
+
+
+def test_numpy_and_python_agree(monkeypatch):
+    pytest.importorskip('numpy')
+    elements = ['e%d' % i for i in range(1000)]
+    with_numpy = MinHash.of(elements, seeds=SEEDS)
+    monkeypatch.setattr(minhash_module, 'numpy', None)
+    without_numpy = MinHash(seeds=SEEDS)
+    for element in elements:
+        without_numpy.add(element)
+    assert with_numpy.digest() == without_numpy.digest()
+    assert with_numpy.digest() == MinHash.of(elements, seeds=SEEDS).digest()
+
+
+def test_merge_and_pickle():
+    a, b = _sets(0.5)
+    union = MinHash.of(a, seeds=SEEDS) | MinHash.of(b, seeds=SEEDS)
+    assert union.digest() == MinHash.of(a + b, seeds=SEEDS).digest()
+
+    restored = pickle.loads(pickle.dumps(union))
+    assert restored.digest() == union.digest()
+
+    with pytest.raises(ValueError):
+        union.merge(MinHash(64, seeds=SEEDS))
+    with pytest.raises(ValueError):
+        union.jaccard(MinHash())
+    with pytest.raises(ValueError):
+        jaccard((1, 2), (1, 2, 3))
+
+
+def test_lsh():
+    bands, rows = optimal_bands(0.8, 128)
+    assert bands * rows <= 128
+    assert abs((1 / bands) ** (1 / rows) - 0.8) < 0.05
+
+    rnd = random.Random(1)
+    base = ['w%d' % rnd.getrandbits(32) for _ in range(300)]
+    lsh = MinHashLSH(threshold=0.8, num_perm=128)
+    near = base[:290] + ['x%d' % i for i in range(10)]
+    lsh.insert('near', MinHash.of(near, seeds=SEEDS))
+    for i in range(50):
+        other = ['d%d-%d' % (i, j) for j in range(300)]
+        lsh.insert('doc-%d' % i, MinHash.of(other, seeds=SEEDS).digest())
+    assert len(lsh) == 51 and 'near' in lsh
+
+    candidates = lsh.query(MinHash.of(base, seeds=SEEDS))
+    assert 'near' in candidates
+    assert len(candidates) < 5
+
+    lsh.remove('near')
+    assert 'near' not in lsh.query(MinHash.of(base, seeds=SEEDS))
+    with pytest.raises(ValueError):
+        lsh.insert('doc-0', MinHash(seeds=SEEDS))
+    with pytest.raises(ValueError):
+        lsh.query(MinHash(64, seeds=SEEDS))
+
+
+def test_digest_is_cached_and_probes_shared():
+    minhash = MinHash.of(['a', 'b', 'c'], seeds=SEEDS)
+    digest = minhash.digest()
+    assert minhash.digest() is digest
+    assert len(set(digest)) <= 3
+
+    # a MinHash with the same seeds reuses the probes of the first one
+    probes = minhash_module._probes(SEEDS, 128)
+    assert all(probes)
+    other = MinHash.of(['a', 'b', 'c'], seeds=SEEDS)
+    assert other.digest() == digest
+
+    minhash_module._PROBES.clear()
+    assert MinHash.of(['a', 'b', 'c'], seeds=SEEDS).digest() == digest
+
+    for change in (lambda m: m.add('d'), lambda m: m.add_many(['d']),
+                   lambda m: m.merge(MinHash.of(['d'], seeds=SEEDS))):
+        changed = minhash.copy()
+        changed.digest()
+        change(changed)
+        assert changed.digest() == MinHash.of('abcd', seeds=SEEDS).digest()
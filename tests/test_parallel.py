@@ -0,0 +1,120 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from functools import partial
+import os
+
+import pytest
+
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.hashing import generate_seeds
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.parallel import ingest, ingest_file, read_lines, split_file
+
+
+def _keys(n):
+    return ['key-%d' % (i % 97) for i in range(n)]
+
+
+def test_ingest_count_min_sketch():
+    factory = partial(CountMinSketch, 10 ** -7, 0.01, 5,
+                      seeds=generate_seeds(17, random_state=1))
+    keys = _keys(5000)
+    cms = ingest(factory, keys, processes=3, chunk_size=100)
+
+    expected = factory()
+    expected.update_many(keys)
+    assert cms.count == expected.count
+    assert cms.get_ranking() == expected.get_ranking()
+
+
+def test_ingest_hyperloglog():
+    keys = _keys(2000)
+    hll = ingest(partial(HyperLogLog, 10), keys, processes=2, chunk_size=64)
+
+    expected = HyperLogLog(10)
+    expected.add_many(keys)
+    assert hll == expected
+
+
+def _split(block):
+    return block.split(',')
+
+
+def test_ingest_expand():
+    keys = _keys(1000)
+    blocks = [','.join(keys[i:i + 100]) for i in range(0, 1000, 100)]
+    hll = ingest(partial(HyperLogLog, 10), blocks, processes=2, chunk_size=1,
+                 expand=_split)
+
+    expected = HyperLogLog(10)
+    expected.add_many(keys)
+    assert hll == expected
+
+
+def _failing_factory():
+    raise ValueError('no sketch')
+
+
+def _exit(item):
+    os._exit(1)
+
+
+def test_ingest_factory_error():
+    with pytest.raises(RuntimeError) as e:
+        ingest(_failing_factory, range(100000), processes=2, chunk_size=100)
+    assert 'no sketch' in str(e.value)
+
+
+def test_ingest_worker_dies():
+    with pytest.raises(RuntimeError):
+        ingest(partial(HyperLogLog, 8), range(100000), processes=2,
+               chunk_size=100, key=_exit)
+
+
+def test_ingest_worker_error():
+    factory = partial(BloomFilter, 1000, seeds=generate_seeds(10))
+    with pytest.raises(RuntimeError):
+        ingest(factory, _keys(100), processes=2, chunk_size=10, key=int)
+
+
+@pytest.mark.parametrize('parts', [1, 2, 3, 7, 50])
+def test_read_lines_covers_file(tmpdir, parts):
+    path = str(tmpdir.join('lines.txt'))
+    lines = [b'line-%d' % i * (i % 5) for i in range(100)]
+    with open(path, 'wb') as f:
+        f.write(b'\n'.join(lines))
+
+    read = []
+    for start, end in split_file(path, parts):
+        read.extend(read_lines(path, start, end))
+    assert read == lines
+
+
+def test_ingest_file(tmpdir):
+    path = str(tmpdir.join('keys.txt'))
+    keys = _keys(3000)
+    with open(path, 'w') as f:
+        f.write('\n'.join(keys) + '\n')
+
+    bf = ingest_file(partial(BloomFilter, 1000, seeds=generate_seeds(10)),
+                     path, processes=4, chunk_size=50)
+    for key in set(keys):
+        assert key in bf
+    assert 'not-a-key' not in bf
+
+
+@pytest.mark.parametrize('factory,key', [
+    (_failing_factory, None),
+    (partial(HyperLogLog, 8), _exit),
+    (partial(HyperLogLog, 8), int),
+])
+def test_ingest_file_errors(tmpdir, factory, key):
+    path = str(tmpdir.join('keys.txt'))
+    with open(path, 'w') as f:
+        f.write('\n'.join(_keys(1000)) + '\n')
+
+    with pytest.raises(RuntimeError):
+        ingest_file(factory, path, processes=2, chunk_size=50, key=key)
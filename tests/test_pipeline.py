@@ -0,0 +1,99 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import threading
+import time
+
+import pytest
+
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.pipeline import Pipeline
+
+
+class RecordingSketch(object):
+
+    def __init__(self, delay=0):
+        self.batches = []
+        self.delay = delay
+        self.threads = set()
+
+    def add_many(self, keys):
+        self.threads.add(threading.current_thread().name)
+        if self.delay:
+            time.sleep(self.delay)
+        self.batches.append(list(keys))
+
+
+def _records(n, delay=0):
+    for i in range(n):
+        if delay:
+            time.sleep(delay)
+        yield {'id': i, 'key': 'key-%d' % (i % 3), 'user': i % 40}
+
+
+def test_pipeline_sketches():
+    bf = BloomFilter(1000, 0.01)
+    cms = CountMinSketch(10 ** -5, 0.01, 3)
+    hll = HyperLogLog(10)
+    pipeline = Pipeline(batch_size=64, flush_interval=None)
+    assert pipeline.register(bf, key=lambda r: r['key']) is bf
+    pipeline.register(cms, key=lambda r: r['key'])
+    pipeline.register(hll, key=lambda r: r['user'])
+
+    assert pipeline.run(_records(300)) == 300
+
+    assert all('key-%d' % i in bf for i in range(3))
+    assert [cms.get('key-%d' % i) for i in range(3)] == [100, 100, 100]
+    assert abs(hll.cardinality() - 40) < 4
+
+
+def test_pipeline_batches_by_size():
+    ids = RecordingSketch()
+    keys = RecordingSketch(delay=0.001)
+    pipeline = Pipeline(batch_size=10, flush_interval=None, max_pending=2)
+    pipeline.register(ids, key=lambda r: r['id'])
+    pipeline.register(keys, key=lambda r: r['key'])
+
+    assert pipeline.run(_records(95)) == 95
+
+    assert [len(b) for b in ids.batches] == [10] * 9 + [5]
+    assert sum(ids.batches, []) == list(range(95))
+    assert sum(keys.batches, []) == ['key-%d' % (i % 3) for i in range(95)]
+    assert threading.current_thread().name not in ids.threads
+
+
+def test_pipeline_batches_by_time():
+    sketch = RecordingSketch()
+    pipeline = Pipeline(batch_size=1000, flush_interval=0.02)
+    pipeline.register(sketch)
+
+    pipeline.run(_records(20, delay=0.005))
+
+    assert 2 <= len(sketch.batches) < 20
+    assert sum(len(b) for b in sketch.batches) == 20
+
+
+def test_pipeline_failing_flush():
+    def fail(keys):
+        raise KeyError('boom')
+
+    pipeline = Pipeline(batch_size=5, max_pending=1)
+    pipeline.register(None, method=fail)
+    with pytest.raises(KeyError):
+        pipeline.run(_records(50))
+
+
+def test_pipeline_failing_records():
+    def records():
+        yield 1
+        raise ValueError('broken input')
+
+    sketch = RecordingSketch()
+    pipeline = Pipeline()
+    pipeline.register(sketch)
+    with pytest.raises(ValueError):
+        pipeline.run(records())
+    assert sketch.batches == [[1]]
@@ -0,0 +1,94 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from functools import partial
+import os
+
+import pytest
+
+from streamingds.countminsketch import CountMinSketch
+from streamingds.hashing import generate_seeds
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.registry import SketchRegistry
+
+
+def test_sketches_are_created_lazily(tmpdir):
+    registry = SketchRegistry(partial(HyperLogLog, 10), 10 ** 6,
+                              spill_dir=str(tmpdir))
+    assert 'a' not in registry
+    registry['a'].add('x')
+    assert registry['a'] is registry['a']
+    assert 'a' in registry
+    assert registry.names() == ['a']
+    assert registry.resident_bytes > 0
+
+
+def test_least_recently_used_sketches_are_spilled(tmpdir):
+    registry = SketchRegistry(partial(HyperLogLog, 10), 3000,
+                              spill_dir=str(tmpdir), check_interval=1)
+    for i in range(10):
+        registry['tenant-%d/hour' % i].add_many(range(i * 100))
+        assert registry.resident_bytes <= 3000 or \
+            len(registry._sketches) == 1
+
+    assert registry.spills > 0
+    assert len(registry) == 10
+    assert 'tenant-0/hour' not in registry._sketches
+    assert os.path.exists(str(tmpdir.join('tenant-0%2Fhour.pickle')))
+
+    # reloaded transparently with its content
+    assert round(registry['tenant-3/hour'].cardinality()) in range(290, 311)
+    assert registry.loads == 1
+    assert 'tenant-3/hour' in registry._sketches
+
+    registry.flush()
+    assert not registry._sketches
+    assert registry.resident_bytes == 0
+
+    reopened = SketchRegistry(partial(HyperLogLog, 10), 3000,
+                              spill_dir=str(tmpdir))
+    assert len(reopened) == 10
+    assert round(reopened['tenant-9/hour'].cardinality()) in range(870, 931)
+
+
+def test_rollup(tmpdir):
+    seeds = generate_seeds(7, random_state=1)
+    factory = partial(CountMinSketch, 10 ** -3, 0.01, 10, seeds=seeds)
+    registry = SketchRegistry(factory, 20000, spill_dir=str(tmpdir),
+                              check_interval=1)
+    for hour in range(24):
+        registry['acme:%02d' % hour].update('login', hour)
+        registry['other:%02d' % hour].update('login', 1)
+
+    assert registry.spills > 0
+    total = registry.rollup('acme:*')
+    assert total.get('login') == sum(range(24))
+    assert registry.rollup('acme:1?').get('login') == sum(range(10, 20))
+    assert registry.rollup('*').get('login') == sum(range(24)) + 24
+
+    # the registered sketches are not modified
+    assert registry['acme:23'].get('login') == 23
+
+    with pytest.raises(KeyError):
+        registry.rollup('nobody:*')
+
+
+def test_delete(tmpdir):
+    registry = SketchRegistry(partial(HyperLogLog, 8), 10 ** 6,
+                              spill_dir=str(tmpdir))
+    registry['a'].add('x')
+    registry['b'].add('y')
+    registry.spill('b')
+    del registry['a']
+    del registry['b']
+    assert len(registry) == 0
+    with pytest.raises(KeyError):
+        del registry['c']
+
+
+def test_invalid_parameters():
+    with pytest.raises(ValueError):
+        SketchRegistry(partial(HyperLogLog, 8), 0)
+    with pytest.raises(ValueError):
+        SketchRegistry(partial(HyperLogLog, 8), 100, check_interval=0)
@@ -0,0 +1,112 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+from distutils.spawn import find_executable
+import socket
+import subprocess
+import time
+
+import pytest
+
+from streamingds.bloomfilter import BloomFilter
+
+redis = pytest.importorskip('redis')
+
+
+def _free_port():
+    sock = socket.socket()
+    sock.bind(('localhost', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+@pytest.fixture
+def redis_nodes():
+    """Start three throwaway redis servers."""
+    executable = find_executable('redis-server')
+    if executable is None:
+        pytest.skip('redis-server is not installed')
+    servers = []
+    nodes = []
+    try:
+        for _ in range(3):
+            port = _free_port()
+            servers.append(subprocess.Popen(
+                [executable, '--port', str(port), '--save', '',
+                 '--appendonly', 'no'],
+                stdout=subprocess.PIPE, stderr=subprocess.STDOUT))
+            client = redis.StrictRedis('localhost', port)
+            for _ in range(100):
+                try:
+                    client.ping()
+                    break
+                except redis.ConnectionError:
+                    time.sleep(0.05)
+            nodes.append(('localhost', port))
+        yield nodes
+    finally:
+        for server in servers:
+            server.terminate()
+            server.wait()
+
+
+def _filter_tests(bf):
+    keys = ['key-%d' % i for i in range(500)]
+    bf.add_many(keys[:250])
+    for key in keys[250:]:
+        bf.add(key)
+    assert all(key in bf for key in keys)
+    assert sum(1 for i in range(1000) if 'other-%d' % i in bf) < 30
+    assert 450 < len(bf) < 550
+
+    # the same bits as an in-memory filter
+    local = BloomFilter(1000, 0.01, seeds=bf.seeds)
+    local.add_many(keys)
+    assert bf.bitarray.tobytes() == local.bitarray.tobytes()
+    assert bf.copy().bitarray.tobytes() == local.bitarray.tobytes()
+
+
+def test_sharded_keys_on_one_node(redis_prefix):
+    from streamingds.redis.shardedbloomfilter import ShardedRedisBloomFilter
+
+    bf = ShardedRedisBloomFilter(1000, 0.01, num_shards=4,
+                                 redis_prefix=redis_prefix)
+    _filter_tests(bf)
+    client = redis.StrictRedis()
+    assert len(list(client.scan_iter(
+        match=redis_prefix + ':bitarray:*'))) == 4
+
+    reopened = ShardedRedisBloomFilter(1000, 0.01, num_shards=4,
+                                       redis_prefix=redis_prefix)
+    assert 'key-1' in reopened
+    with pytest.raises(ValueError):
+        ShardedRedisBloomFilter(1000, 0.01, num_shards=2,
+                                redis_prefix=redis_prefix)
+    # the rejected filter does not overwrite the stored number of shards
+    assert int(client.get(redis_prefix + ':shards')) == 4
+
+
+def test_sharded_over_nodes(redis_nodes):
+    from streamingds.redis.shardedbloomfilter import ShardedRedisBloomFilter
+
+    bf = ShardedRedisBloomFilter(1000, 0.01, nodes=redis_nodes,
+                                 num_shards=6, redis_prefix='bf')
+    _filter_tests(bf)
+    for host, port in redis_nodes:
+        client = redis.StrictRedis(host, port)
+        assert len(list(client.scan_iter(match='bf:bitarray:*'))) == 2
+
+    other = ShardedRedisBloomFilter(1000, 0.01, nodes=redis_nodes,
+                                    num_shards=6, seeds=bf.seeds,
+                                    redis_prefix='other')
+    other.add('new')
+    bf.merge(other)
+    assert 'new' in bf
+    bf.intersect(other)
+    assert 'new' in bf
+    assert 'key-1' not in bf
+
+    with pytest.raises(ValueError):
+        ShardedRedisBloomFilter(1000, 0.01, nodes=redis_nodes, num_shards=2)
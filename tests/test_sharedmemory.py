@@ -0,0 +1,70 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import multiprocessing
+
+from streamingds.bloomfilter import BloomFilter
+from streamingds.countminsketch import CountMinSketch
+from streamingds.sharedmemory import SharedBloomFilter, SharedCountMinSketch
+
+
+def _run_workers(target, *args):
+    workers = [multiprocessing.Process(target=target, args=(i,) + args)
+               for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+        assert worker.exitcode == 0
+
+
+def _update(i, cms):
+    for _ in range(200):
+        cms.update('shared')
+    cms.update_many(['worker-%d' % i] * 100 + ['shared'] * 50)
+
+
+def test_shared_count_min_sketch():
+    cms = SharedCountMinSketch(10 ** -5, 0.01, stripes=4)
+    _run_workers(_update, cms)
+
+    assert cms.get('shared') == 4 * 250
+    for i in range(4):
+        assert cms.get('worker-%d' % i) == 100
+    assert cms.get_ranking() == {}
+
+
+def _add(i, bf):
+    for j in range(250):
+        bf.add('key-%d-%d' % (i, j))
+    bf.add_many(['batch-%d-%d' % (i, j) for j in range(250)])
+
+
+def test_shared_bloomfilter():
+    bf = SharedBloomFilter(5000, 0.01, stripes=4)
+    _run_workers(_add, bf)
+
+    for i in range(4):
+        for j in range(250):
+            assert 'key-%d-%d' % (i, j) in bf
+            assert 'batch-%d-%d' % (i, j) in bf
+    assert 1900 <= len(bf) <= 2100
+
+
+def test_merge_shared_and_local_sketches():
+    bf = SharedBloomFilter(1000, 0.01, lock=False)
+    local = BloomFilter(1000, 0.01, seeds=bf.seeds)
+    local.add('local')
+    bf.add('shared')
+    bf.merge(local)
+    assert 'local' in bf
+    assert 'shared' in bf.copy()
+
+    cms = SharedCountMinSketch(10 ** -5, 0.01)
+    other = CountMinSketch(10 ** -5, 0.01, 5, seeds=cms.seeds)
+    other.update('key', 3)
+    cms.update('key')
+    cms.merge(other)
+    assert cms.get('key') == 4
+    assert (cms | other).get('key') == 7
@@ -0,0 +1,81 @@
+# vim: set fileencoding=utf-8 :
+from __future__ import (absolute_import, division, print_function,
+                        with_statement)
+
+import threading
+
+from streamingds.hyperloglog import HyperLogLog
+from streamingds.threadsafe import (ThreadSafeBloomFilter,
+                                    ThreadSafeCountMinSketch,
+                                    ThreadSafeHyperLogLog)
+
+
+def _run_threads(target):
+    threads = [threading.Thread(target=target, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_threadsafe_count_min_sketch():
+    cms = ThreadSafeCountMinSketch(10 ** -5, 0.01, 5, stripes=4)
+
+    def update(i):
+        for _ in range(500):
+            cms.update('shared')
+        cms.update_many(['thread-%d' % i] * (i + 1) + ['shared'] * 100)
+
+    _run_threads(update)
+
+    assert cms.get('shared') == 8 * 600
+    for i in range(8):
+        assert cms.get('thread-%d' % i) == i + 1
+    ranking = cms.get_ranking()
+    assert ranking[0] == (4800, ['shared'])
+    assert ranking[1] == (8, ['thread-7'])
+
+
+def test_threadsafe_count_min_sketch_stale_estimate():
+    cms = ThreadSafeCountMinSketch(10 ** -5, 0.01, 5, stripes=4)
+    increment = cms._increment
+
+    def interleaved(hashes, value):
+        # another thread increments the key before the heap is updated
+        est = increment(hashes, value)
+        increment(hashes, value)
+        return est
+
+    cms._increment = interleaved
+    cms.update('key')
+    assert cms.get_ranking() == {0: (2, ['key'])}
+
+
+def test_threadsafe_bloomfilter():
+    bf = ThreadSafeBloomFilter(10000, 0.01, stripes=4)
+
+    def add(i):
+        for j in range(500):
+            bf.add('key-%d-%d' % (i, j))
+        bf.add_many(['batch-%d-%d' % (i, j) for j in range(500)])
+
+    _run_threads(add)
+
+    for i in range(8):
+        for j in range(500):
+            assert 'key-%d-%d' % (i, j) in bf
+            assert 'batch-%d-%d' % (i, j) in bf
+
+
+def test_threadsafe_hyperloglog():
+    hll = ThreadSafeHyperLogLog(10, stripes=4)
+
+    def add(i):
+        hll.add_many(range(i * 1000, (i + 1) * 1000))
+        hll.add(*range(i * 10))
+
+    _run_threads(add)
+
+    expected = HyperLogLog(10)
+    expected.add_many(range(8000))
+    assert hll._registers == expected._registers